@@ -3,41 +3,145 @@ AutoDocVision - Aplicación Principal Flask
 Servidor web para detección de documentos vehiculares
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, g, url_for
 import json
 import os
 from datetime import datetime
 import logging
 from functools import wraps
+import atexit
+import threading
 import time
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Crear aplicación Flask
-app = Flask(__name__)
+# Crear aplicación Flask (sin la ruta /static integrada, la reemplaza serve_static)
+app = Flask(__name__, static_folder=None)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB máximo
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tif', 'tiff'}
+# Presupuesto de píxeles (ancho x alto declarado en el encabezado) antes de decodificar
+app.config['MAX_IMAGE_PIXELS'] = int(os.environ.get('MAX_IMAGE_PIXELS', '40000000'))
+# Máximo de páginas clasificadas de un TIFF multipágina o GIF animado
+app.config['MAX_PAGES'] = int(os.environ.get('MAX_PAGES', '20'))
+# Tamaños de lote usados para calentar el modelo antes de aceptar tráfico
+app.config['WARMUP_BATCH_SIZES'] = [
+    int(size) for size in os.environ.get('WARMUP_BATCH_SIZES', '1').split(',') if size.strip()
+]
+# Si /ready acepta el modo simulado (sin pesos reales) como listo
+app.config['ALLOW_SIMULATED_MODEL'] = os.environ.get('ALLOW_SIMULATED_MODEL', 'False').lower() == 'true'
+app.config['MODEL_PATH'] = os.environ.get('MODEL_DIR', 'RECONOCIMIENTO DE DOCUMENTOS')
+# Clasificadores adicionales sobre el mismo backbone (rutas separadas por os.pathsep)
+app.config['EXTRA_MODEL_DIRS'] = [
+    path for path in os.environ.get('EXTRA_MODEL_DIRS', '').split(os.pathsep) if path.strip()
+]
+# Segundos entre revisiones de la carpeta del modelo (0 = no observar)
+app.config['MODEL_WATCH_INTERVAL'] = float(os.environ.get('MODEL_WATCH_INTERVAL', '0'))
+# Motor de inferencia: 'numpy', 'onnxruntime', 'opencv' o 'auto' (el más rápido que coincide)
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'auto').lower()
+# Carpeta de los modelos convertidos a ONNX
+app.config['INFERENCE_BACKEND_CACHE'] = os.environ.get('INFERENCE_BACKEND_CACHE', 'model_cache')
+# Cascada de resolución: primera pasada a este lado (0 = desactivada) y
+# confianza mínima para no re-evaluar al imageSize completo
+app.config['CASCADE_RESOLUTION'] = int(os.environ.get('CASCADE_RESOLUTION', '0'))
+app.config['CASCADE_CONFIDENCE'] = float(os.environ.get('CASCADE_CONFIDENCE', '0.9'))
+# Lado mayor de la entrada al backbone en modo regiones (múltiplo de 32)
+app.config['REGION_LONG_SIDE'] = int(os.environ.get('REGION_LONG_SIDE', '448'))
+# Aumentos de TTA (campo 'tta' de /api/detect) para predicciones de baja confianza
+app.config['TTA_AUGMENTATIONS'] = int(os.environ.get('TTA_AUGMENTATIONS', '8'))
+# Control de admisión: inferencias simultáneas por worker y peticiones en espera
+app.config['ADMISSION_MAX_CONCURRENT'] = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '2'))
+app.config['ADMISSION_MAX_QUEUE'] = int(os.environ.get('ADMISSION_MAX_QUEUE', '16'))
+# Fracción mínima de lugares para cargas masivas cuando hay tráfico de cámara
+app.config['BULK_MIN_SHARE'] = float(os.environ.get('BULK_MIN_SHARE', '0.2'))
+# Plazo por defecto en ms cuando la petición no trae uno (0 = sin plazo)
+app.config['DEFAULT_DEADLINE_MS'] = int(os.environ.get('DEFAULT_DEADLINE_MS', '0'))
+# Inferencia híbrida: el navegador clasifica los cuadros con TF.js y solo envía
+# al servidor los de confianza menor a EDGE_ESCALATION_CONFIDENCE, más una
+# fracción EDGE_AUDIT_RATE de los seguros para auditoría
+app.config['EDGE_INFERENCE'] = os.environ.get('EDGE_INFERENCE', 'False').lower() == 'true'
+app.config['EDGE_ESCALATION_CONFIDENCE'] = float(os.environ.get('EDGE_ESCALATION_CONFIDENCE', '0.85'))
+app.config['EDGE_AUDIT_RATE'] = float(os.environ.get('EDGE_AUDIT_RATE', '0.05'))
+app.config['EDGE_TFJS_URL'] = os.environ.get(
+    'EDGE_TFJS_URL', 'https://cdn.jsdelivr.net/npm/@tensorflow/tfjs@1.7.4/dist/tf.min.js')
+# Token para endpoints de administración (vacío = deshabilitados)
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN', '')
+# Índice de casi duplicados usado por /api/similar
+app.config['SIMILARITY_INDEX_DIR'] = os.environ.get('SIMILARITY_INDEX_DIR', 'similarity_index')
+# Similitud coseno a partir de la cual un documento se reporta como duplicado
+app.config['SIMILARITY_DUPLICATE_THRESHOLD'] = float(
+    os.environ.get('SIMILARITY_DUPLICATE_THRESHOLD', '0.95'))
+# Inserciones en el diario compartido entre consolidaciones de la carpeta del índice
+app.config['SIMILARITY_SAVE_EVERY'] = int(os.environ.get('SIMILARITY_SAVE_EVERY', '50'))
+# Historial de detecciones consultable en /api/detections (vacío = desactivado)
+app.config['DETECTION_DB'] = os.environ.get('DETECTION_DB', 'detections.db')
+# Registros pendientes de escribir antes de descartar nuevos
+app.config['DETECTION_QUEUE'] = int(os.environ.get('DETECTION_QUEUE', '10000'))
+# Muestreo de pilas en /debug/profile: duración máxima y carpeta de resultados en segundo plano
+app.config['PROFILE_MAX_SECONDS'] = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
 
 # Crear carpeta de uploads si no existe
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # Importar módulos de utilidad
-from utils.model_loader import ModelLoader
-from utils.image_processor import ImageProcessor
-from utils.predictor import Predictor
+from utils.model_registry import ModelRegistry, MODEL_FILES
+from utils.similarity_index import SharedSimilarityIndex
+from utils.region_detector import RegionDetector
+from utils.page_reader import PageReader, is_multipage_candidate, summarize_pages
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.inference_scheduler import LANES
+from utils.upload_reader import (ImageTooLarge, decode_upload, upload_buffer,
+                                 current_rss_kb)
+from utils.embedding_store import content_hash
+from utils.detection_store import DetectionStore
+from utils.profiler import ProfilerBusy, profile, profile_in_background
+from utils.static_assets import AssetManifest
 
 # Inicializar componentes
+# Con gunicorn --preload (ver gunicorn.conf.py) esto se ejecuta una sola vez en
+# el proceso maestro y los workers comparten el modelo por copy-on-write
 try:
-    model_loader = ModelLoader()
-    image_processor = ImageProcessor()
-    predictor = Predictor(model_loader)
-    logger.info("Modelo cargado correctamente")
+    model_registry = ModelRegistry(
+        app.config['MODEL_PATH'],
+        warmup_batch_sizes=app.config['WARMUP_BATCH_SIZES'],
+        extra_model_paths=app.config['EXTRA_MODEL_DIRS'],
+        backend=app.config['INFERENCE_BACKEND'],
+        backend_cache_dir=app.config['INFERENCE_BACKEND_CACHE']
+    )
+    logger.info(f"Modelo cargado correctamente (versión {model_registry.current.version})")
 except Exception as e:
     logger.error(f"Error al cargar modelo: {e}")
-    model_loader = None
+    model_registry = None
+
+# Control de admisión de este worker (los contadores no se comparten entre workers)
+admission = AdmissionController(
+    max_concurrent=app.config['ADMISSION_MAX_CONCURRENT'],
+    max_queue=app.config['ADMISSION_MAX_QUEUE'],
+    bulk_min_share=app.config['BULK_MIN_SHARE']
+)
+
+# Cuadros resueltos en el navegador y escalados al servidor (inferencia híbrida)
+edge_stats = {'local_frames': 0, 'escalated': 0, 'audited': 0, 'compared': 0, 'agreed': 0}
+edge_lock = threading.Lock()
+
+# URLs con huella y variantes .br/.gz generadas por build_assets.py
+static_assets = AssetManifest(os.path.join(app.root_path, 'static'))
+
+# Índice de casi duplicados (se carga en la primera consulta)
+similarity_index = None
+similarity_lock = threading.Lock()
+
+# Historial de detecciones (el hilo escritor arranca en cada worker)
+detection_store = None
+if app.config['DETECTION_DB']:
+    try:
+        detection_store = DetectionStore(app.config['DETECTION_DB'],
+                                         max_queue=app.config['DETECTION_QUEUE'])
+    except Exception as e:
+        logger.error(f"Error al abrir el historial de detecciones: {e}")
 
 
 # ============================================================================
@@ -62,6 +166,390 @@ def timer_decorator(func):
     return wrapper
 
 
+def warmup_model():
+    """
+    Calienta el modelo en el proceso actual
+    
+    Se llama en cada worker antes de aceptar tráfico (post_worker_init en
+    gunicorn.conf.py) o al iniciar el servidor de desarrollo.
+    
+    Returns:
+        bool: True si el calentamiento terminó correctamente
+    """
+    if model_registry is None:
+        logger.error("No hay modelo que calentar")
+        return False
+    
+    try:
+        model_registry.current.warmup(app.config['WARMUP_BATCH_SIZES'])
+        return True
+    except Exception as e:
+        logger.error(f"Error en calentamiento del modelo: {e}")
+        return False
+
+
+def start_model_watcher():
+    """Inicia el observador de la carpeta del modelo si está configurado"""
+    if model_registry is not None and app.config['MODEL_WATCH_INTERVAL'] > 0:
+        model_registry.start_watcher(app.config['MODEL_WATCH_INTERVAL'])
+
+
+def start_detection_store():
+    """Inicia el escritor del historial de detecciones en el proceso actual"""
+    if detection_store is not None:
+        detection_store.start()
+
+
+def close_detection_store():
+    """Escribe los registros pendientes del historial al terminar el proceso"""
+    if detection_store is not None:
+        detection_store.close()
+
+
+atexit.register(close_detection_store)
+
+
+def admin_required(func):
+    """Decorador que exige el header X-Admin-Token"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if not token or request.headers.get('X-Admin-Token', '') != token:
+            return jsonify({
+                'success': False,
+                'error': 'No autorizado'
+            }), 403
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def get_request_deadline(arrival):
+    """
+    Plazo absoluto de la petición actual
+    
+    El plazo llega como presupuesto relativo en ms (header X-Deadline-Ms o
+    campo deadline_ms del formulario/JSON) para no depender del reloj del
+    cliente. Si el proxy agrega X-Request-Start (t=<segundos epoch>), el
+    presupuesto se cuenta desde ahí e incluye el tiempo en la cola de gunicorn.
+    
+    Args:
+        arrival (float): Momento en que el worker recibió la petición
+    
+    Returns:
+        float: Plazo absoluto (time.time()) o None sin plazo
+    """
+    budget = request.headers.get('X-Deadline-Ms')
+    if budget is None:
+        budget = request.form.get('deadline_ms')
+    if budget is None and request.is_json:
+        budget = (request.get_json(silent=True) or {}).get('deadline_ms')
+    try:
+        budget = float(budget) if budget is not None else app.config['DEFAULT_DEADLINE_MS']
+    except (TypeError, ValueError):
+        budget = app.config['DEFAULT_DEADLINE_MS']
+    if budget <= 0:
+        return None
+    
+    start = arrival
+    request_start = request.headers.get('X-Request-Start', '')
+    if request_start:
+        try:
+            start = min(arrival, float(request_start.replace('t=', '')))
+        except ValueError:
+            pass
+    return start + budget / 1000.0
+
+
+def get_request_session():
+    """Sesión de cámara de la petición actual (header X-Session-Id o campo session_id)"""
+    session_id = request.headers.get('X-Session-Id')
+    if session_id is None and request.is_json:
+        session_id = (request.get_json(silent=True) or {}).get('session_id')
+    return str(session_id)[:64] if session_id else None
+
+
+def admission_control(lane):
+    """
+    Decorador que aplica el control de admisión y fija g.deadline
+    
+    Rechaza con 429 (el plazo no alcanza para la espera estimada), 503
+    (cola llena, o plazo vencido mientras esperaba) o 409 (llegó un cuadro
+    más nuevo de la misma sesión de cámara), con header Retry-After.
+    
+    Args:
+        lane (str): Carril por defecto de la ruta; el header X-Priority
+                    ('interactive' o 'bulk') lo reemplaza
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            g.arrival = time.time()
+            g.deadline = get_request_deadline(g.arrival)
+            request_lane = request.headers.get('X-Priority', lane)
+            if request_lane not in LANES:
+                request_lane = lane
+            try:
+                with admission.admit(g.deadline, request_lane, get_request_session()):
+                    return func(*args, **kwargs)
+            except AdmissionRejected as e:
+                logger.warning(f"Petición rechazada por admisión ({e.reason}), "
+                               f"Retry-After {e.retry_after}s")
+                return jsonify({
+                    'success': False,
+                    'error': 'Servidor saturado, reintente más tarde',
+                    'reason': e.reason,
+                    'retry_after': e.retry_after
+                }), e.status, {'Retry-After': str(e.retry_after)}
+        return wrapper
+    return decorator
+
+
+def deadline_expired(stage):
+    """
+    Respuesta de descarte si el plazo de la petición actual ya venció
+    
+    Args:
+        stage (str): Etapa que se evita ('decode' o 'inference')
+    
+    Returns:
+        tuple: Respuesta 503 de Flask, o None si la petición sigue a tiempo
+    """
+    if not admission.expired(g.get('deadline'), stage):
+        return None
+    return jsonify({
+        'success': False,
+        'error': 'Plazo de la petición vencido',
+        'reason': f'expired_before_{stage}'
+    }), 503
+
+
+def image_too_large_response(error):
+    """Respuesta 413 para imágenes que exceden MAX_IMAGE_PIXELS"""
+    logger.warning(f"Imagen rechazada antes de decodificar: {error}")
+    return jsonify({
+        'success': False,
+        'error': str(error)
+    }), 413
+
+
+def predict_with_heads(model, processed_image, return_all_probabilities=False):
+    """
+    Predice con la cabeza principal y, si hay, con las adicionales
+    
+    Con varias cabezas el backbone se ejecuta una sola vez por imagen. Con
+    una sola cabeza y CASCADE_RESOLUTION configurado se usa la cascada de
+    resolución.
+    
+    Args:
+        model (ModelVersion): Versión del modelo de la petición
+        processed_image (np.array): Imagen procesada
+        return_all_probabilities (bool): Si incluir todas las probabilidades
+    
+    Returns:
+        tuple: (predicción principal, dict de cabezas o None)
+    """
+    if model.multi_head is None:
+        if app.config['CASCADE_RESOLUTION'] > 0:
+            prediction = model.predictor.predict_cascade(
+                processed_image,
+                app.config['CASCADE_RESOLUTION'],
+                app.config['CASCADE_CONFIDENCE'],
+                return_all_probabilities
+            )
+            return prediction, None
+        return model.predictor.predict(processed_image, return_all_probabilities), None
+    
+    heads = model.multi_head.predict(processed_image, return_all_probabilities)
+    return heads[model.multi_head.primary], heads
+
+
+def detect_pages(model, reader, confidence_threshold):
+    """
+    Clasifica las páginas de un archivo multipágina en una sola pasada
+    
+    Las páginas se decodifican de una en una y solo se conservan reducidas
+    al tamaño del modelo antes de formar el lote.
+    
+    Args:
+        model (ModelVersion): Versión del modelo de la petición
+        reader (PageReader): Lector del archivo
+        confidence_threshold (float): Umbral de confianza
+    
+    Returns:
+        tuple: (resultados por página, resumen del documento)
+    """
+    pages = [model.image_processor.process(page) for _, page in reader.iter_pages()]
+    results = model.predictor.predict_batch(pages, return_all_probabilities=True)
+    summary = summarize_pages(results, model.loader.get_class_names())
+    
+    page_results = []
+    for index, result in enumerate(results):
+        page_result = {'page': index + 1, 'class': result['class'],
+                       'confidence': round(result['confidence'], 4)}
+        if 'error' in result:
+            page_result['error'] = result['error']
+        else:
+            page_result['class_index'] = result['class_index']
+            page_result['above_threshold'] = result['confidence'] >= confidence_threshold
+        page_results.append(page_result)
+    
+    summary['confidence'] = round(summary['confidence'], 4)
+    summary['page_count'] = reader.page_count
+    summary['pages_processed'] = len(page_results)
+    summary['truncated'] = reader.truncated
+    return page_results, summary
+
+
+def format_heads(heads, confidence_threshold):
+    """Resume los resultados de todas las cabezas para la respuesta JSON"""
+    return {
+        name: {
+            'class': result['class'],
+            'confidence': round(result['confidence'], 4),
+            'class_index': result['class_index'],
+            'above_threshold': result['confidence'] >= confidence_threshold,
+            'model_version': result['model_version']
+        }
+        for name, result in heads.items()
+    }
+
+
+def get_similarity_index(model):
+    """
+    Obtiene el índice de casi duplicados compatible con el modelo
+
+    Lo carga de SIMILARITY_INDEX_DIR o crea uno vacío. Cada worker mantiene
+    su copia en memoria y la sincroniza con los demás a través del diario
+    de inserciones (ver SharedSimilarityIndex).
+
+    Args:
+        model (ModelVersion): Versión del modelo de la petición
+
+    Returns:
+        SharedSimilarityIndex: Índice cargado
+
+    Raises:
+        ValueError: Si el índice se construyó con otro backbone
+    """
+    global similarity_index
+    
+    with similarity_lock:
+        if similarity_index is None:
+            backbone = model.loader.get_model()
+            similarity_index = SharedSimilarityIndex(app.config['SIMILARITY_INDEX_DIR'],
+                                                     backbone.feature_dim,
+                                                     backbone.backbone_hash)
+    
+    backbone_hash = model.loader.get_model().backbone_hash
+    if similarity_index.backbone_hash and similarity_index.backbone_hash != backbone_hash:
+        raise ValueError('El índice de similitud se construyó con otro backbone; reconstruirlo '
+                         'con find_similar.py build')
+    return similarity_index
+
+
+def save_similarity_index(force=False):
+    """
+    Consolida el diario de inserciones en la carpeta del índice
+    
+    Sin force, solo cuando el diario acumula SIMILARITY_SAVE_EVERY
+    inserciones (de cualquier worker).
+    """
+    if similarity_index is None:
+        return
+    try:
+        similarity_index.compact(1 if force else app.config['SIMILARITY_SAVE_EVERY'])
+    except OSError as e:
+        logger.error(f"Error al guardar el índice de similitud: {e}")
+
+
+atexit.register(save_similarity_index, True)
+
+
+def record_edge_prediction(edge_prediction, server_class):
+    """
+    Compara la predicción del navegador con la del servidor
+    
+    Args:
+        edge_prediction (dict): {'class', 'confidence', 'reason', 'local_frames'}
+                                enviado por el navegador
+        server_class (str): Clase predicha por el servidor
+    
+    Returns:
+        bool: True si ambas predicciones coinciden
+    """
+    agreed = edge_prediction.get('class') == server_class
+    try:
+        local_frames = max(0, int(edge_prediction.get('local_frames', 0)))
+    except (TypeError, ValueError):
+        local_frames = 0
+    
+    with edge_lock:
+        edge_stats['local_frames'] += local_frames
+        if edge_prediction.get('reason') == 'audit':
+            edge_stats['audited'] += 1
+        else:
+            edge_stats['escalated'] += 1
+        edge_stats['compared'] += 1
+        edge_stats['agreed'] += int(agreed)
+    
+    if not agreed:
+        logger.info(f"Desacuerdo navegador/servidor: {edge_prediction.get('class')} "
+                    f"vs {server_class} ({edge_prediction.get('reason')})")
+    return agreed
+
+
+def get_edge_metrics():
+    """Contadores de inferencia híbrida con tasa de descarga y de acuerdo"""
+    with edge_lock:
+        stats = dict(edge_stats)
+    total = stats['local_frames'] + stats['escalated'] + stats['audited']
+    stats['offload_rate'] = round(stats['local_frames'] / total, 4) if total else None
+    stats['agreement_rate'] = (round(stats['agreed'] / stats['compared'], 4)
+                               if stats['compared'] else None)
+    return stats
+
+
+def upload_digest(stream):
+    """SHA-256 de una carga para el historial (None si el historial está desactivado)"""
+    if detection_store is None:
+        return None
+    with upload_buffer(stream) as buffer:
+        digest = content_hash(buffer)
+        del buffer
+    return digest
+
+
+def record_detection(source, prediction, digest, model_version):
+    """
+    Agrega una detección al historial sin bloquear la petición
+    
+    Args:
+        source (str): Origen ('upload', 'upload_pages', 'upload_regions', 'camera')
+        prediction (dict): Predicción principal (o resumen de páginas)
+        digest (str): SHA-256 del contenido
+        model_version (str): Versión del modelo que respondió
+    """
+    if detection_store is None:
+        return
+    arrival = g.get('arrival')
+    latency_ms = (time.time() - arrival) * 1000 if arrival is not None else None
+    if not detection_store.record(source, prediction, digest, model_version, latency_ms):
+        logger.warning("Historial de detecciones saturado; registro descartado")
+
+
+def parse_time_param(value):
+    """
+    Instante de un parámetro de consulta: epoch en segundos o fecha ISO 8601
+    
+    Raises:
+        ValueError: Si el valor no es ninguno de los dos
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
 def get_confidence_color(confidence):
     """Retorna color HTML basado en nivel de confianza"""
     if confidence >= 0.9:
@@ -94,6 +582,7 @@ def about():
 
 @app.route('/api/detect', methods=['POST'])
 @timer_decorator
+@admission_control('bulk')
 def detect_image():
     """
     Endpoint para detectar documento desde imagen subida
@@ -101,13 +590,18 @@ def detect_image():
     Parámetros:
         - image: archivo de imagen (multipart/form-data)
         - confidence: umbral de confianza (opcional, default=0.7)
+        - tta: 'true' para repetir con aumentos si la confianza queda bajo el umbral
+               (no admitido con mode=regions)
+        - mode: 'regions' para clasificar cada documento de la foto por separado
+        - region_source: 'auto', 'contours' o 'grid' (solo con mode=regions)
+        - deadline_ms: presupuesto de la petición en ms (o header X-Deadline-Ms)
     
     Retorna:
         JSON con resultado de detección
     """
     
     # Validar que modelo está cargado
-    if model_loader is None:
+    if model_registry is None:
         return jsonify({
             'success': False,
             'error': 'Modelo no disponible'
@@ -133,7 +627,7 @@ def detect_image():
     if not allowed_file(file.filename):
         return jsonify({
             'success': False,
-            'error': 'Formato de archivo no permitido. Use: PNG, JPG, JPEG, GIF, BMP'
+            'error': 'Formato de archivo no permitido. Use: PNG, JPG, JPEG, GIF, BMP, TIFF'
         }), 400
     
     # Obtener umbral de confianza
@@ -141,15 +635,71 @@ def detect_image():
     if not 0 <= confidence_threshold <= 1:
         confidence_threshold = 0.7
     
+    tta = request.form.get('tta', 'false').lower() == 'true'
+    region_mode = request.form.get('mode', 'single') == 'regions'
+    region_source = request.form.get('region_source', 'auto')
+    if region_source not in ('auto', 'contours', 'grid'):
+        region_source = 'auto'
+    if tta and region_mode:
+        # TTA re-evalúa la imagen completa; no hay equivalente por región
+        return jsonify({
+            'success': False,
+            'error': 'tta no es compatible con mode=regions'
+        }), 400
+    
     try:
-        # Procesar imagen
-        import cv2
-        import numpy as np
+        # No decodificar si el cliente ya no espera la respuesta
+        expired = deadline_expired('decode')
+        if expired is not None:
+            return expired
         
-        # Leer imagen
-        file_data = file.read()
-        nparr = np.frombuffer(file_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        digest = upload_digest(file.stream)
+        
+        # TIFF multipágina / GIF animado: clasificar cada página
+        if is_multipage_candidate(file.filename):
+            try:
+                reader = PageReader(file.stream, app.config['MAX_PAGES'],
+                                    max_pixels=app.config['MAX_IMAGE_PIXELS'])
+            except ValueError:
+                reader = None
+            if reader is not None and reader.is_multipage:
+                expired = deadline_expired('inference')
+                if expired is not None:
+                    reader.close()
+                    return expired
+                try:
+                    with reader, model_registry.acquire() as model:
+                        pages, summary = detect_pages(model, reader, confidence_threshold)
+                except ImageTooLarge as e:
+                    return image_too_large_response(e)
+                
+                response = {
+                    'success': True,
+                    'class': summary['class'],
+                    'confidence': summary['confidence'],
+                    'class_index': summary.get('class_index'),
+                    'above_threshold': summary['confidence'] >= confidence_threshold,
+                    'timestamp': datetime.now().isoformat(),
+                    'confidence_color': get_confidence_color(summary['confidence']),
+                    'model_version': model.version,
+                    'pages': pages,
+                    'summary': summary
+                }
+                logger.info(f"Detección multipágina: {summary['pages_processed']} páginas, "
+                            f"{response['class']} ({response['confidence']})")
+                record_detection('upload_pages', summary, digest, model.version)
+                return jsonify(response), 200
+        
+        # Decodificar desde el buffer de la carga (memoria o mmap), sin copiarlo a bytes
+        rss_before = current_rss_kb()
+        try:
+            img = decode_upload(file.stream, app.config['MAX_IMAGE_PIXELS'])
+        except ImageTooLarge as e:
+            return image_too_large_response(e)
+        # Crecimiento del RSS del proceso durante la decodificación (con varios
+        # hilos incluye lo que asignaron otras peticiones al mismo tiempo)
+        rss_after = current_rss_kb()
+        decode_rss_kb = None if None in (rss_before, rss_after) else rss_after - rss_before
         
         if img is None:
             return jsonify({
@@ -157,9 +707,34 @@ def detect_image():
                 'error': 'No se pudo leer la imagen'
             }), 400
         
-        # Procesar y predecir
-        processed_image = image_processor.process(img)
-        prediction = predictor.predict(processed_image)
+        expired = deadline_expired('inference')
+        if expired is not None:
+            return expired
+        
+        # Procesar y predecir (la versión del modelo no cambia durante la petición)
+        regions = None
+        with model_registry.acquire() as model:
+            if region_mode:
+                # Una pasada del backbone para la foto completa y todas las regiones
+                detector = RegionDetector(model.predictor, model.image_processor,
+                                          long_side=app.config['REGION_LONG_SIDE'])
+                regions = detector.detect(img, region_source)
+                prediction, heads = regions['image'], None
+            else:
+                processed_image = model.image_processor.process(img)
+                # Las probabilidades completas van al historial y las usa TTA
+                prediction, heads = predict_with_heads(model, processed_image,
+                                                       tta or detection_store is not None)
+            
+            # TTA solo para la cabeza principal y solo bajo el umbral
+            if tta:
+                prediction = model.predictor.predict_tta(
+                    processed_image,
+                    model.image_processor,
+                    confidence_threshold,
+                    num_augmentations=app.config['TTA_AUGMENTATIONS'],
+                    first_pass=prediction
+                )
         
         # Preparar respuesta
         response = {
@@ -169,10 +744,37 @@ def detect_image():
             'class_index': prediction['class_index'],
             'above_threshold': prediction['confidence'] >= confidence_threshold,
             'timestamp': datetime.now().isoformat(),
-            'confidence_color': get_confidence_color(prediction['confidence'])
+            'confidence_color': get_confidence_color(prediction['confidence']),
+            'model_version': model.version
         }
         
-        logger.info(f"Detección exitosa: {response['class']} ({response['confidence']})")
+        if heads is not None:
+            response['heads'] = format_heads(heads, confidence_threshold)
+        
+        if regions is not None:
+            response['region_source'] = regions['source']
+            response['regions'] = [
+                {
+                    'box': region['box'],
+                    'class': region['class'],
+                    'confidence': round(region['confidence'], 4),
+                    'class_index': region['class_index'],
+                    'above_threshold': region['confidence'] >= confidence_threshold
+                }
+                for region in regions['regions']
+            ]
+        
+        if 'cascade_stage' in prediction:
+            response['cascade_stage'] = prediction['cascade_stage']
+        
+        if tta:
+            response['tta_applied'] = prediction['tta_applied']
+            response['first_pass_confidence'] = round(prediction['first_pass_confidence'], 4)
+        
+        logger.info(f"Detección exitosa: {response['class']} ({response['confidence']}), "
+                    f"decodificación +{decode_rss_kb} KB de RSS (proceso: {rss_after} KB)")
+        record_detection('upload_regions' if region_mode else 'upload', prediction, digest,
+                         model.version)
         return jsonify(response), 200
         
     except Exception as e:
@@ -185,6 +787,7 @@ def detect_image():
 
 @app.route('/api/detect-camera', methods=['POST'])
 @timer_decorator
+@admission_control('interactive')
 def detect_camera():
     """
     Endpoint para detectar desde frame de cámara (base64)
@@ -192,12 +795,15 @@ def detect_camera():
     Parámetros JSON:
         - frame_data: imagen en base64
         - confidence: umbral (opcional)
+        - deadline_ms: presupuesto de la petición en ms (opcional)
+        - session_id: sesión de la cámara; solo se atiende su cuadro más reciente
+        - edge_prediction: predicción del navegador en modo híbrido (opcional)
     
     Retorna:
         JSON con resultado de detección
     """
     
-    if model_loader is None:
+    if model_registry is None:
         return jsonify({
             'success': False,
             'error': 'Modelo no disponible'
@@ -210,6 +816,10 @@ def detect_camera():
         
         data = request.get_json()
         
+        expired = deadline_expired('decode')
+        if expired is not None:
+            return expired
+        
         if 'frame_data' not in data:
             return jsonify({
                 'success': False,
@@ -231,17 +841,40 @@ def detect_camera():
                 'error': 'No se pudo decodificar frame'
             }), 400
         
+        expired = deadline_expired('inference')
+        if expired is not None:
+            return expired
+        
         # Procesar y predecir
-        processed_image = image_processor.process(frame)
-        prediction = predictor.predict(processed_image)
+        with model_registry.acquire() as model:
+            processed_image = model.image_processor.process(frame)
+            prediction, heads = predict_with_heads(model, processed_image,
+                                                   detection_store is not None)
         
         response = {
             'success': True,
             'class': prediction['class'],
             'confidence': round(prediction['confidence'], 4),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'model_version': model.version,
+            'queue_depth': admission.scheduler.depth()
         }
         
+        # Modo híbrido: el resultado del servidor es el definitivo
+        if isinstance(data.get('edge_prediction'), dict):
+            response['edge_agreement'] = record_edge_prediction(data['edge_prediction'],
+                                                                prediction['class'])
+        
+        if heads is not None:
+            try:
+                confidence_threshold = float(data.get('confidence', 0.7))
+            except (TypeError, ValueError):
+                confidence_threshold = 0.7
+            response['heads'] = format_heads(heads, confidence_threshold)
+        
+        if detection_store is not None:
+            record_detection('camera', prediction, content_hash(frame_bytes), model.version)
+        
         return jsonify(response), 200
         
     except Exception as e:
@@ -252,6 +885,181 @@ def detect_camera():
         }), 500
 
 
+@app.route('/api/similar', methods=['POST'])
+@timer_decorator
+@admission_control('bulk')
+def find_similar():
+    """
+    Endpoint para buscar documentos casi duplicados
+    
+    Compara el embedding del backbone de la imagen contra el índice de
+    documentos ya vistos (similitud coseno).
+    
+    Parámetros:
+        - image: archivo de imagen (multipart/form-data)
+        - k: número de coincidencias (opcional, default=5, máximo 50)
+        - add: 'true' para registrar la imagen en el índice tras buscar
+    
+    Retorna:
+        JSON con las coincidencias más similares
+    """
+    if model_registry is None:
+        return jsonify({
+            'success': False,
+            'error': 'Modelo no disponible'
+        }), 503
+    
+    if 'image' not in request.files or request.files['image'].filename == '':
+        return jsonify({
+            'success': False,
+            'error': 'No se encontró archivo de imagen'
+        }), 400
+    
+    file = request.files['image']
+    if not allowed_file(file.filename):
+        return jsonify({
+            'success': False,
+            'error': 'Formato de archivo no permitido. Use: PNG, JPG, JPEG, GIF, BMP, TIFF'
+        }), 400
+    
+    k = request.form.get('k', 5, type=int)
+    k = min(max(k, 1), 50)
+    add = request.form.get('add', 'false').lower() == 'true'
+    
+    try:
+        # No decodificar si el cliente ya no espera la respuesta
+        expired = deadline_expired('decode')
+        if expired is not None:
+            return expired
+        
+        try:
+            img = decode_upload(file.stream, app.config['MAX_IMAGE_PIXELS'])
+        except ImageTooLarge as e:
+            return image_too_large_response(e)
+        if img is None:
+            return jsonify({
+                'success': False,
+                'error': 'No se pudo leer la imagen'
+            }), 400
+        
+        expired = deadline_expired('inference')
+        if expired is not None:
+            return expired
+        
+        with model_registry.acquire() as model:
+            if model.predictor.is_simulated:
+                return jsonify({
+                    'success': False,
+                    'error': 'Búsqueda de similares no disponible en modo simulado'
+                }), 503
+            
+            try:
+                index = get_similarity_index(model)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 409
+            
+            processed_image = model.image_processor.process(img)
+            prediction, embedding = model.predictor.predict_with_embedding(processed_image)
+        
+        with upload_buffer(file.stream) as buffer:
+            key = content_hash(buffer)
+            del buffer
+        search_start = time.time()
+        matches = index.search(embedding, k + 1)[0]
+        # Un archivo idéntico ya registrado no cuenta como otro documento
+        exact = any(match['id'] == key for match in matches)
+        matches = [match for match in matches if match['id'] != key][:k]
+        search_time = time.time() - search_start
+        
+        added = False
+        if add:
+            added = index.add([key], embedding) > 0
+            if added:
+                save_similarity_index()
+        
+        top_score = matches[0]['score'] if matches else 0.0
+        response = {
+            'success': True,
+            'id': key,
+            'matches': matches,
+            'exact_match': exact,
+            'duplicate': exact or top_score >= app.config['SIMILARITY_DUPLICATE_THRESHOLD'],
+            'duplicate_threshold': app.config['SIMILARITY_DUPLICATE_THRESHOLD'],
+            'added': added,
+            'class': prediction['class'],
+            'confidence': round(prediction['confidence'], 4),
+            'embedding_time_ms': round(prediction['processing_time'] * 1000, 2),
+            'search_time_ms': round(search_time * 1000, 2),
+            'index': index.stats(),
+            'model_version': model.version
+        }
+        return jsonify(response), 200
+        
+    except Exception as e:
+        logger.error(f"Error en búsqueda de similares: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Error al procesar imagen: {str(e)}'
+        }), 500
+
+
+@app.route('/api/detections', methods=['GET'])
+@admin_required
+def list_detections():
+    """
+    Historial de detecciones paginado, de la más reciente a la más antigua
+    
+    Parámetros (query string):
+        - limit: filas por página (1-500, default=50)
+        - cursor: next_cursor de la página anterior
+        - class, hash, source, model_version: filtros exactos
+        - since, until: rango de tiempo (epoch en segundos o ISO 8601)
+    
+    Retorna:
+        JSON con detecciones y next_cursor (null en la última página)
+    """
+    
+    if detection_store is None:
+        return jsonify({
+            'success': False,
+            'error': 'Historial de detecciones desactivado (DETECTION_DB)'
+        }), 503
+    
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        detections, next_cursor = detection_store.query(
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            class_name=request.args.get('class'),
+            content_hash=request.args.get('hash'),
+            source=request.args.get('source'),
+            model_version=request.args.get('model_version'),
+            since=parse_time_param(since) if since else None,
+            until=parse_time_param(until) if until else None
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Parámetro inválido: {str(e)}'
+        }), 400
+    
+    for detection in detections:
+        detection['timestamp'] = datetime.fromtimestamp(detection['created_at']).isoformat()
+    
+    return jsonify({
+        'success': True,
+        'detections': detections,
+        'count': len(detections),
+        'next_cursor': next_cursor
+    }), 200
+
+
 @app.route('/api/classes', methods=['GET'])
 def get_classes():
     """
@@ -261,18 +1069,20 @@ def get_classes():
         JSON con lista de clases
     """
     
-    if model_loader is None:
+    if model_registry is None:
         return jsonify({
             'success': False,
             'error': 'Modelo no disponible'
         }), 503
     
     try:
-        classes = model_loader.get_class_names()
+        model = model_registry.current
+        classes = model.loader.get_class_names()
         return jsonify({
             'success': True,
             'classes': classes,
-            'count': len(classes)
+            'count': len(classes),
+            'model_version': model.version
         }), 200
     except Exception as e:
         logger.error(f"Error al obtener clases: {str(e)}")
@@ -291,18 +1101,41 @@ def get_model_info():
         JSON con detalles del modelo
     """
     
-    if model_loader is None:
+    if model_registry is None:
         return jsonify({
             'success': False,
             'error': 'Modelo no disponible'
         }), 503
     
     try:
-        metadata = model_loader.get_metadata()
-        return jsonify({
+        model = model_registry.current
+        metadata = model.loader.get_metadata()
+        response = {
             'success': True,
-            'model_info': metadata
-        }), 200
+            'model_info': metadata,
+            'model_version': model.version,
+            # Lado al que el navegador puede reducir las cargas (se omite el resize aquí)
+            'image_size': model.image_processor.target_size[0],
+            # Motor elegido y tiempos de la medición al cargar la versión
+            'backend': {
+                'configured': app.config['INFERENCE_BACKEND'],
+                'active': getattr(model.predictor.backend, 'name', 'numpy'),
+                'selection': model.predictor.backend_report
+            }
+        }
+        if model.multi_head is not None:
+            response['heads'] = model.multi_head.get_heads_info()
+        if app.config['EDGE_INFERENCE'] and not model.predictor.is_simulated:
+            response['edge'] = {
+                'enabled': True,
+                'model_url': url_for('serve_model_file', version=model.version,
+                                     filename='model.json'),
+                'image_size': model.predictor.input_shape[0],
+                'escalation_confidence': app.config['EDGE_ESCALATION_CONFIDENCE'],
+                'audit_rate': app.config['EDGE_AUDIT_RATE'],
+                'tfjs_url': app.config['EDGE_TFJS_URL']
+            }
+        return jsonify(response), 200
     except Exception as e:
         logger.error(f"Error al obtener info del modelo: {str(e)}")
         return jsonify({
@@ -311,14 +1144,249 @@ def get_model_info():
         }), 500
 
 
+# ============================================================================
+# RUTAS - ADMINISTRACIÓN
+# ============================================================================
+
+@app.route('/api/admin/reload-model', methods=['POST'])
+@admin_required
+def reload_model():
+    """
+    Recarga el modelo desde disco sin reiniciar el servidor
+    
+    La nueva versión se carga y calienta en segundo plano y se activa de
+    forma atómica; las peticiones en curso terminan con la versión anterior.
+    Solo afecta al worker que recibe la petición (ver MODEL_WATCH_INTERVAL).
+    
+    Parámetros JSON (opcionales):
+        - force: recargar aunque la huella no haya cambiado
+        - wait: esperar a que termine la recarga
+    
+    Retorna:
+        JSON con el estado del registro de modelos
+    """
+    
+    if model_registry is None:
+        return jsonify({
+            'success': False,
+            'error': 'Modelo no disponible'
+        }), 503
+    
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get('force', False))
+    
+    if data.get('wait', False):
+        swapped = model_registry.reload(force=force)
+        return jsonify({
+            'success': model_registry.last_error is None,
+            'swapped': swapped,
+            'status': model_registry.status()
+        }), 200
+    
+    model_registry.reload_async(force=force)
+    return jsonify({
+        'success': True,
+        'status': model_registry.status()
+    }), 202
+
+
+@app.route('/api/admin/model-status', methods=['GET'])
+@admin_required
+def model_status():
+    """Estado del registro de modelos de este worker"""
+    
+    if model_registry is None:
+        return jsonify({
+            'success': False,
+            'error': 'Modelo no disponible'
+        }), 503
+    
+    return jsonify({
+        'success': True,
+        'status': model_registry.status()
+    }), 200
+
+
+@app.route('/debug/profile', methods=['GET'])
+@admin_required
+def debug_profile():
+    """
+    Muestrea las pilas de todos los hilos de este worker durante N segundos
+    
+    Parámetros (query string):
+        - seconds: duración de la ventana (default=5, máximo PROFILE_MAX_SECONDS)
+        - interval_ms: ms entre muestras (default=10)
+        - format: 'collapsed' (flamegraph.pl / speedscope) o 'json' (default
+                  'json' con memory=true)
+        - memory: 'true' para comparar snapshots de tracemalloc inicio/fin
+        - idle: 'true' para incluir hilos bloqueados esperando trabajo
+        - lines: 'true' para distinguir la línea en ejecución
+        - background: 'true' para responder de inmediato y guardar el
+          resultado en PROFILE_DIR (workers de un solo hilo)
+    
+    Retorna:
+        Pilas colapsadas (text/plain) o JSON con funciones más frecuentes
+    """
+    
+    seconds = request.args.get('seconds', 5.0, type=float)
+    seconds = min(max(seconds, 0.1), app.config['PROFILE_MAX_SECONDS'])
+    interval = min(max(request.args.get('interval_ms', 10.0, type=float), 1.0), 1000.0) / 1000
+    memory = request.args.get('memory', 'false').lower() == 'true'
+    output_format = request.args.get('format', 'json' if memory else 'collapsed')
+    if output_format not in ('collapsed', 'json'):
+        return jsonify({
+            'success': False,
+            'error': "format debe ser 'collapsed' o 'json'"
+        }), 400
+    if memory and output_format != 'json':
+        return jsonify({
+            'success': False,
+            'error': 'La comparación de memoria requiere format=json'
+        }), 400
+    
+    options = {
+        'interval': interval,
+        'memory': memory,
+        'include_idle': request.args.get('idle', 'false').lower() == 'true',
+        'line_numbers': request.args.get('lines', 'false').lower() == 'true'
+    }
+    
+    try:
+        if request.args.get('background', 'false').lower() == 'true':
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            extension = 'json' if output_format == 'json' else 'txt'
+            filename = (f"profile-{os.getpid()}-"
+                        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+            profile_in_background(os.path.join(app.config['PROFILE_DIR'], filename), seconds,
+                                  output_format, **options)
+            return jsonify({
+                'success': True,
+                'pid': os.getpid(),
+                'seconds': seconds,
+                'file': filename,
+                'url': url_for('debug_profile_result', filename=filename)
+            }), 202
+        
+        result = profile(seconds, **options)
+    except ProfilerBusy as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+    
+    if output_format == 'json':
+        response = result.to_dict(request.args.get('top', 20, type=int))
+        response['success'] = True
+        return jsonify(response), 200
+    
+    return result.collapsed(), 200, {
+        'Content-Type': 'text/plain; charset=utf-8',
+        'X-Profile-Pid': str(os.getpid()),
+        'X-Profile-Samples': str(result.samples)
+    }
+
+
+@app.route('/debug/profile/<filename>', methods=['GET'])
+@admin_required
+def debug_profile_result(filename):
+    """Resultado de un muestreo en segundo plano (404 mientras no termina)"""
+    return send_from_directory(app.config['PROFILE_DIR'], filename, max_age=0)
+
+
 # ============================================================================
 # RUTAS - ARCHIVOS ESTÁTICOS
 # ============================================================================
 
+@app.route('/model/<version>/<filename>')
+def serve_model_file(version, filename):
+    """
+    Sirve los archivos del modelo TF.js para la inferencia en el navegador
+    
+    La URL incluye la versión del modelo, así que el contenido de cada URL
+    nunca cambia: se marca como immutable y se cachea un año. Una versión
+    que ya no es la activa responde 404 y el navegador vuelve a pedir
+    /api/model-info. Si los archivos cambiaron en disco sin recargar el
+    modelo responde 409 en lugar de servir pesos de otra versión.
+    """
+    if model_registry is None:
+        return jsonify({
+            'success': False,
+            'error': 'Modelo no disponible'
+        }), 503
+    
+    model = model_registry.current
+    if filename not in MODEL_FILES or version != model.version:
+        return jsonify({
+            'success': False,
+            'error': 'Versión del modelo no disponible',
+            'model_version': model.version
+        }), 404
+    
+    content = model.model_file(filename)
+    if content is None:
+        return jsonify({
+            'success': False,
+            'error': 'Los archivos del modelo cambiaron en disco; recargar el modelo',
+            'model_version': model.version
+        }), 409
+    
+    response = app.response_class(
+        content,
+        mimetype='application/json' if filename.endswith('.json') else 'application/octet-stream'
+    )
+    response.set_etag(f"{model.fingerprint}-{filename}")
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+
+@app.template_global()
+def asset_url(filename):
+    """
+    URL de un recurso de static/ para las plantillas
+    
+    Con build_assets.py ejecutado apunta a la copia con huella de dist/;
+    si no, a la ruta original.
+    
+    Args:
+        filename (str): Ruta original, p. ej. 'css/style.css'
+    
+    Returns:
+        str: URL de serve_static
+    """
+    return url_for('serve_static', filename=static_assets.url_path(filename))
+
+
 @app.route('/static/<path:filename>')
 def serve_static(filename):
-    """Sirve archivos estáticos"""
-    return send_from_directory('static', filename)
+    """
+    Sirve archivos estáticos
+    
+    Los archivos de static/dist/ llevan la huella del contenido en el
+    nombre: se guardan un año como inmutables y se envía la variante
+    precomprimida (.br/.gz) si el cliente la acepta. El resto se revalida
+    con ETag (304 si no cambió).
+    """
+    served, encoding = static_assets.negotiate(filename,
+                                               request.headers.get('Accept-Encoding', ''))
+    fingerprinted = static_assets.is_fingerprinted(filename)
+    
+    response = send_from_directory(
+        static_assets.static_dir,
+        served,
+        mimetype=static_assets.mimetype(filename),
+        max_age=365 * 24 * 3600 if fingerprinted else None
+    )
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+    else:
+        response.cache_control.no_cache = True
+    if encoding:
+        response.content_encoding = encoding
+    return response
 
 
 # ============================================================================
@@ -351,24 +1419,81 @@ def internal_error(error):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de salud del servidor"""
+    predictor = model_registry.current.predictor if model_registry is not None else None
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'model_loaded': model_loader is not None
+        'model_loaded': predictor is not None and not predictor.is_simulated,
+        'model_mode': 'real' if predictor is not None and not predictor.is_simulated else 'simulated'
+    }), 200
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Métricas de este worker: peticiones atendidas y descartadas
+    
+    Con varios workers de gunicorn cada uno responde con sus propios contadores.
+    """
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'admission': admission.stats(),
+        'edge': get_edge_metrics(),
+        'detection_store': detection_store.stats() if detection_store is not None else None,
+        'timestamp': datetime.now().isoformat()
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    Endpoint de disponibilidad del worker
+    
+    Responde 200 solo cuando el modelo real está cargado y calentado en este
+    proceso; 503 en caso contrario (el balanceador no debe enviar tráfico).
+    """
+    
+    if model_registry is None:
+        return jsonify({
+            'ready': False,
+            'model_mode': 'unavailable',
+            'warmed_up': False,
+            'pid': os.getpid()
+        }), 503
+    
+    model = model_registry.current
+    predictor = model.predictor
+    model_mode = 'simulated' if predictor.is_simulated else 'real'
+    ready = predictor.warmed_up and (model_mode == 'real' or app.config['ALLOW_SIMULATED_MODEL'])
+    
+    return jsonify({
+        'ready': ready,
+        'model_mode': model_mode,
+        'warmed_up': predictor.warmed_up,
+        'warmup_times': {str(size): round(seconds, 4)
+                         for size, seconds in predictor.warmup_times.items()},
+        'model_fingerprint': predictor.fingerprint,
+        'model_version': model.version,
+        'pid': os.getpid(),
+        'timestamp': datetime.now().isoformat()
+    }), 200 if ready else 503
+
+
 # ============================================================================
 # PUNTO DE ENTRADA
 # ============================================================================
 
 if __name__ == '__main__':
     # Configuración para desarrollo
+    warmup_model()
+    start_model_watcher()
+    start_detection_store()
     app.run(
         host='0.0.0.0',
         port=5000,
         debug=True,
         threaded=True
     )
-    # Para producción, usar:
-    # gunicorn -w 4 -b 0.0.0.0:5000 app:app
+    # Para producción, usar (carga única del modelo + calentamiento por worker):
+    # gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,450 @@
+"""
+Benchmark - Microbenchmarks por etapa del pipeline de detección
+
+Mide el costo de cada etapa (decodificación, preprocesamiento, predicción y
+llamada completa a /api/detect) usando JPEGs sintéticos, sin cámara ni red.
+
+Uso:
+    python benchmark.py run --output bench.json
+    python benchmark.py run --update-baseline
+    python benchmark.py compare bench.json --threshold 0.15
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+from tempfile import SpooledTemporaryFile
+from datetime import datetime
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+import cv2
+import numpy as np
+
+from utils.model_loader import ModelLoader
+from utils.image_processor import ImageProcessor
+from utils.predictor import Predictor
+from utils.upload_reader import decode_upload
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+
+# Resoluciones sintéticas (ancho, alto): webcam, HD, Full HD y foto de celular
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+BATCH_SIZES = [1, 4, 8, 16]
+
+
+def make_synthetic_jpeg(width, height, seed=0, quality=90):
+    """
+    Genera un JPEG sintético parecido a una foto de documento
+
+    Combina un gradiente de fondo, un rectángulo claro con "líneas de texto"
+    y ruido, para que el tamaño comprimido se parezca a una foto real.
+
+    Args:
+        width (int): Ancho en píxeles
+        height (int): Alto en píxeles
+        seed (int): Semilla para reproducibilidad
+        quality (int): Calidad JPEG (0-100)
+
+    Returns:
+        bytes: Imagen codificada en JPEG
+    """
+    rng = np.random.default_rng(seed)
+
+    gradient = np.linspace(40, 160, width, dtype=np.float32)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = gradient[None, :, None].astype(np.uint8)
+
+    # Documento centrado con líneas de texto
+    x0, y0 = width // 6, height // 6
+    x1, y1 = width - x0, height - y0
+    cv2.rectangle(image, (x0, y0), (x1, y1), (235, 235, 225), -1)
+    line_step = max(8, (y1 - y0) // 20)
+    for y in range(y0 + line_step, y1 - line_step, line_step):
+        line_end = int(x0 + (x1 - x0) * rng.uniform(0.4, 0.95))
+        cv2.line(image, (x0 + line_step, y), (line_end, y), (30, 30, 30), max(1, line_step // 4))
+
+    noise = rng.integers(0, 12, size=image.shape, dtype=np.uint8)
+    image = cv2.add(image, noise)
+
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError(f"No se pudo codificar JPEG sintético {width}x{height}")
+    return encoded.tobytes()
+
+
+def time_callable(func, repeat, warmup=1):
+    """
+    Mide el tiempo de ejecución de una función
+
+    Args:
+        func (callable): Función sin argumentos a medir
+        repeat (int): Número de repeticiones medidas
+        warmup (int): Repeticiones previas descartadas
+
+    Returns:
+        dict: Estadísticas en milisegundos (median, mean, min, p95, stdev)
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    samples.sort()
+    p95_index = min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))
+    return {
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'min_ms': samples[0],
+        'p95_ms': samples[p95_index],
+        'stdev_ms': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'repeat': repeat
+    }
+
+
+class BenchmarkSuite:
+    """Suite de microbenchmarks por etapa"""
+
+    def __init__(self, repeat=20, resolutions=None, batch_sizes=None, include_api=True):
+        """
+        Inicializa la suite
+
+        Args:
+            repeat (int): Repeticiones por caso
+            resolutions (list): Lista de (ancho, alto) a probar
+            batch_sizes (list): Tamaños de lote para process_batch/predict_batch
+            include_api (bool): Si medir la llamada completa a /api/detect
+        """
+        self.repeat = repeat
+        self.resolutions = resolutions or RESOLUTIONS
+        self.batch_sizes = batch_sizes or BATCH_SIZES
+        self.include_api = include_api
+
+        self.model_loader = ModelLoader()
+        self.image_processor = ImageProcessor()
+        self.predictor = Predictor(self.model_loader)
+
+        self.jpegs = {
+            (w, h): make_synthetic_jpeg(w, h, seed=i)
+            for i, (w, h) in enumerate(self.resolutions)
+        }
+        self.results = {}
+
+    def _record(self, name, stats, **extra):
+        stats.update(extra)
+        self.results[name] = stats
+        logger.info(f"{name}: mediana {stats['median_ms']:.2f}ms (p95 {stats['p95_ms']:.2f}ms)")
+
+    def bench_decode(self):
+        """Mide cv2.imdecode por resolución"""
+        for (w, h), data in self.jpegs.items():
+            buffer = np.frombuffer(data, np.uint8)
+            stats = time_callable(lambda: cv2.imdecode(buffer, cv2.IMREAD_COLOR), self.repeat)
+            self._record(f"decode/{w}x{h}", stats, bytes=len(data))
+
+    def bench_upload_decode(self):
+        """
+        Compara file.read() + imdecode contra la decodificación sin copias
+        
+        La carga se simula con un SpooledTemporaryFile igual al de Werkzeug
+        (en memoria hasta 500 KB, archivo temporal por encima). peak_kb es el
+        pico de memoria asignada por Python/NumPy durante una decodificación.
+        """
+        def spooled(data):
+            stream = SpooledTemporaryFile(max_size=1024 * 500, mode='rb+')
+            stream.write(data)
+            stream.seek(0)
+            return stream
+        
+        def read_copy(stream):
+            stream.seek(0)
+            return cv2.imdecode(np.frombuffer(stream.read(), np.uint8), cv2.IMREAD_COLOR)
+        
+        def peak_kb(func):
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return round(peak / 1024, 1)
+        
+        for (w, h), data in self.jpegs.items():
+            stream = spooled(data)
+            for name, func in (('read_copy', lambda: read_copy(stream)),
+                               ('zero_copy', lambda: decode_upload(stream))):
+                stats = time_callable(func, self.repeat)
+                self._record(f"upload_decode/{name}/{w}x{h}", stats, bytes=len(data),
+                             peak_kb=peak_kb(func))
+            stream.close()
+    
+    def bench_process(self):
+        """Mide ImageProcessor.process y resize_preserve_aspect por resolución"""
+        target = self.image_processor.target_size
+        for (w, h), data in self.jpegs.items():
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            stats = time_callable(lambda: self.image_processor.process(image), self.repeat)
+            self._record(f"process/{w}x{h}", stats)
+
+            stats = time_callable(
+                lambda: self.image_processor.resize_preserve_aspect(image, target), self.repeat)
+            self._record(f"resize_preserve_aspect/{w}x{h}", stats)
+
+    def bench_presized_upload(self):
+        """
+        Compara subir la foto original contra subirla ya reducida en el navegador
+        
+        Mide bytes por carga y el tiempo de decodificación + process en el
+        servidor. La carga reducida se simula como lo hace app.js: estirada a
+        imageSize x imageSize y codificada en JPEG calidad 95.
+        """
+        target = self.image_processor.target_size
+        for (w, h), data in self.jpegs.items():
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            small = cv2.resize(image, target, interpolation=cv2.INTER_AREA)
+            presized = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+            
+            for name, payload in (('full', data), ('presized', presized)):
+                buffer = np.frombuffer(payload, np.uint8)
+                stats = time_callable(
+                    lambda: self.image_processor.process(cv2.imdecode(buffer, cv2.IMREAD_COLOR)),
+                    self.repeat)
+                self._record(f"upload_{name}/{w}x{h}", stats, bytes=len(payload))
+    
+    def bench_process_batch(self):
+        """Mide ImageProcessor.process_batch con la resolución más pequeña"""
+        w, h = self.resolutions[0]
+        image = cv2.imdecode(np.frombuffer(self.jpegs[(w, h)], np.uint8), cv2.IMREAD_COLOR)
+        for batch_size in self.batch_sizes:
+            images = [image] * batch_size
+            stats = time_callable(lambda: self.image_processor.process_batch(images), self.repeat)
+            self._record(f"process_batch/{w}x{h}/b{batch_size}", stats,
+                         per_image_ms=stats['median_ms'] / batch_size)
+
+    def bench_predict(self):
+        """Compara Predictor.predict en bucle contra predict_batch"""
+        sample = np.random.default_rng(0).random(
+            (*self.image_processor.target_size[::-1], 3), dtype=np.float32)
+
+        stats = time_callable(lambda: self.predictor.predict(sample), self.repeat)
+        self._record("predict/b1", stats)
+
+        for batch_size in self.batch_sizes:
+            images = [sample] * batch_size
+            stats = time_callable(lambda: self.predictor.predict_batch(images), self.repeat)
+            self._record(f"predict_batch/b{batch_size}", stats,
+                         per_image_ms=stats['median_ms'] / batch_size)
+
+        # TTA forzado (umbral > 1): primera pasada + lote de 8 aumentos
+        stats = time_callable(lambda: self.image_processor.augment_batch(sample, 8), self.repeat)
+        self._record("augment_batch/k8", stats)
+        stats = time_callable(
+            lambda: self.predictor.predict_tta(sample, self.image_processor, 1.01, 8), self.repeat)
+        self._record("predict_tta/k8", stats)
+
+    def bench_api(self):
+        """Mide la llamada completa a /api/detect con el cliente de pruebas de Flask"""
+        import io
+        from app import app as flask_app
+
+        client = flask_app.test_client()
+        for (w, h), data in self.jpegs.items():
+            def call():
+                response = client.post('/api/detect', data={
+                    'image': (io.BytesIO(data), 'bench.jpg'),
+                    'confidence': '0.7'
+                }, content_type='multipart/form-data')
+                if response.status_code != 200:
+                    raise RuntimeError(f"/api/detect respondió {response.status_code}")
+
+            stats = time_callable(call, self.repeat)
+            self._record(f"api_detect/{w}x{h}", stats, bytes=len(data))
+
+    def run(self):
+        """
+        Ejecuta todas las etapas
+
+        Returns:
+            dict: Reporte con metadatos del entorno y resultados por caso
+        """
+        # Silenciar logs por-predicción para no distorsionar las mediciones
+        previous_level = logging.getLogger('utils').level
+        logging.getLogger('utils').setLevel(logging.ERROR)
+        logging.getLogger('app').setLevel(logging.ERROR)
+        try:
+            self.bench_decode()
+            self.bench_upload_decode()
+            self.bench_process()
+            self.bench_presized_upload()
+            self.bench_process_batch()
+            self.bench_predict()
+            if self.include_api:
+                self.bench_api()
+        finally:
+            logging.getLogger('utils').setLevel(previous_level)
+
+        return {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'opencv': cv2.__version__,
+                'cpu_count': os.cpu_count(),
+                'repeat': self.repeat
+            },
+            'results': self.results
+        }
+
+
+def compare_reports(baseline, current, threshold=0.10, metric='median_ms'):
+    """
+    Compara dos reportes y detecta regresiones
+
+    Args:
+        baseline (dict): Reporte de referencia
+        current (dict): Reporte actual
+        threshold (float): Aumento relativo tolerado (0.10 = 10%)
+        metric (str): Métrica a comparar
+
+    Returns:
+        list: Lista de dicts por caso con 'name', 'baseline', 'current',
+              'change' y 'status' ('regression', 'improvement', 'ok', 'new', 'missing')
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    curr_results = current.get('results', {})
+
+    for name in sorted(set(base_results) | set(curr_results)):
+        if name not in base_results:
+            rows.append({'name': name, 'baseline': None,
+                         'current': curr_results[name][metric], 'change': None, 'status': 'new'})
+            continue
+        if name not in curr_results:
+            rows.append({'name': name, 'baseline': base_results[name][metric],
+                         'current': None, 'change': None, 'status': 'missing'})
+            continue
+
+        base_value = base_results[name][metric]
+        curr_value = curr_results[name][metric]
+        change = (curr_value - base_value) / base_value if base_value > 0 else 0.0
+
+        if change > threshold:
+            status = 'regression'
+        elif change < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+
+        rows.append({'name': name, 'baseline': base_value, 'current': curr_value,
+                     'change': change, 'status': status})
+
+    return rows
+
+
+def print_comparison(rows, threshold):
+    """Imprime tabla de comparación"""
+    print(f"\n{'='*78}")
+    print(f"COMPARACIÓN CONTRA BASELINE (umbral {threshold:.0%})")
+    print(f"{'='*78}")
+    print(f"{'Caso':<40}{'Base (ms)':>11}{'Actual (ms)':>13}{'Cambio':>9}  Estado")
+    for row in rows:
+        base = f"{row['baseline']:.2f}" if row['baseline'] is not None else '-'
+        curr = f"{row['current']:.2f}" if row['current'] is not None else '-'
+        change = f"{row['change']:+.1%}" if row['change'] is not None else '-'
+        print(f"{row['name']:<40}{base:>11}{curr:>13}{change:>9}  {row['status']}")
+    print(f"{'='*78}\n")
+
+
+def load_report(path):
+    """Carga un reporte JSON"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    """Guarda un reporte JSON creando la carpeta si es necesario"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logger.info(f"Reporte guardado en: {path}")
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Microbenchmarks por etapa de AutoDocVision'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Ejecutar benchmarks')
+    run_parser.add_argument('--output', type=str, default='bench_results.json',
+                            help='Archivo JSON de resultados (default: bench_results.json)')
+    run_parser.add_argument('--repeat', type=int, default=20,
+                            help='Repeticiones por caso (default: 20)')
+    run_parser.add_argument('--quick', action='store_true',
+                            help='Solo resoluciones pequeñas y pocas repeticiones')
+    run_parser.add_argument('--no-api', action='store_true',
+                            help='Omitir la llamada completa a /api/detect')
+    run_parser.add_argument('--update-baseline', action='store_true',
+                            help=f'Guardar también como baseline ({DEFAULT_BASELINE})')
+
+    compare_parser = subparsers.add_parser('compare', help='Comparar contra baseline')
+    compare_parser.add_argument('current', type=str,
+                                help='Reporte JSON a evaluar')
+    compare_parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE,
+                                help=f'Reporte de referencia (default: {DEFAULT_BASELINE})')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='Aumento relativo tolerado (default: 0.10)')
+    compare_parser.add_argument('--metric', type=str, default='median_ms',
+                                choices=['median_ms', 'mean_ms', 'min_ms', 'p95_ms'],
+                                help='Métrica a comparar (default: median_ms)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'run':
+            if args.quick:
+                suite = BenchmarkSuite(repeat=min(args.repeat, 5), resolutions=RESOLUTIONS[:2],
+                                       batch_sizes=BATCH_SIZES[:2], include_api=not args.no_api)
+            else:
+                suite = BenchmarkSuite(repeat=args.repeat, include_api=not args.no_api)
+
+            report = suite.run()
+            save_report(report, args.output)
+            if args.update_baseline:
+                save_report(report, DEFAULT_BASELINE)
+            return 0
+
+        rows = compare_reports(load_report(args.baseline), load_report(args.current),
+                               args.threshold, args.metric)
+        print_comparison(rows, args.threshold)
+
+        regressions = [row for row in rows if row['status'] == 'regression']
+        if regressions:
+            logger.error(f"{len(regressions)} regresiones por encima de {args.threshold:.0%}")
+            return 1
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
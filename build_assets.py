@@ -0,0 +1,59 @@
+"""
+Build Assets - Prepara static/ para caché inmutable
+
+Genera en static/dist/ una copia de cada archivo con la huella de su
+contenido en el nombre, sus variantes precomprimidas (.br y .gz) y el
+manifiesto que usa el servidor para enlazarlas desde las plantillas.
+Ejecutar en cada despliegue, después de modificar static/.
+
+Uso:
+    python build_assets.py
+    python build_assets.py --clean
+"""
+
+import argparse
+import logging
+import os
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from utils.static_assets import BUILD_DIR, build_assets
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Generar recursos estáticos con huella y precomprimidos'
+    )
+    parser.add_argument('--static-dir', type=str,
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='Carpeta de recursos estáticos (default: static/ del proyecto)')
+    parser.add_argument('--output', type=str, default=BUILD_DIR,
+                        help=f'Subcarpeta de salida dentro de static/ (default: {BUILD_DIR})')
+    parser.add_argument('--min-compress-size', type=int, default=256,
+                        help='Bytes mínimos para generar variantes comprimidas (default: 256)')
+    parser.add_argument('--clean', action='store_true',
+                        help='Eliminar copias de compilaciones anteriores')
+
+    args = parser.parse_args()
+
+    try:
+        if not os.path.isdir(args.static_dir):
+            logger.error(f"No existe la carpeta: {args.static_dir}")
+            return 1
+        build_assets(args.static_dir, args.output, args.min_compress_size, args.clean)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
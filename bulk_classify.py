@@ -0,0 +1,334 @@
+"""
+Bulk Classify - Clasificación masiva repartida entre varias máquinas
+
+Un coordinador enumera los archivos en una cola SQLite sobre almacenamiento
+compartido; cada worker (en cualquier máquina que vea la misma carpeta) toma
+bloques en arriendo, los clasifica en lotes y entrega los resultados. El
+worker renueva su arriendo mientras trabaja; si muere, el arriendo vence y
+otro worker retoma el bloque. No requiere servicios externos: agregar
+máquinas solo significa lanzar más workers.
+
+Las rutas se guardan relativas a la carpeta de imágenes, de modo que cada
+máquina puede montarla en otro lugar (--root).
+
+Uso:
+    python bulk_classify.py --queue /mnt/compartido/cola.db enqueue --images /mnt/compartido/archivo
+    python bulk_classify.py --queue /mnt/compartido/cola.db work          # en cada máquina
+    python bulk_classify.py --queue /mnt/compartido/cola.db status
+    python bulk_classify.py --queue /mnt/compartido/cola.db export --output resultados.csv
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+from utils.work_queue import WorkQueue, default_worker_id
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def find_images(root, recursive=False):
+    """
+    Enumera las imágenes de una carpeta en orden estable
+
+    Args:
+        root (str): Carpeta de imágenes
+        recursive (bool): Incluir subcarpetas
+
+    Yields:
+        str: Ruta relativa a root (con '/' como separador)
+    """
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                relative = os.path.relpath(os.path.join(directory, name), root)
+                yield relative.replace(os.sep, '/')
+        if not recursive:
+            break
+
+
+class LeaseKeeper:
+    """
+    Hilo que renueva el arriendo de un bloque mientras se procesa
+    """
+
+    def __init__(self, queue, chunk_id, worker_id, interval):
+        self.queue = queue
+        self.chunk_id = chunk_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lease-keeper', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.renew(self.chunk_id, self.worker_id):
+                    logger.warning(f"Se perdió el arriendo del bloque {self.chunk_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                # Error transitorio del almacenamiento: se reintenta en el siguiente ciclo
+                logger.warning(f"No se pudo renovar el bloque {self.chunk_id}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def classify_chunk(tasks, root, predictor, image_processor, batch_size):
+    """
+    Clasifica las imágenes de un bloque en lotes
+
+    Args:
+        tasks (list): Tuplas (id de tarea, ruta relativa)
+        root (str): Carpeta de imágenes en esta máquina
+        predictor (Predictor): Predictor cargado
+        image_processor (ImageProcessor): Procesador de imágenes
+        batch_size (int): Imágenes por pasada del modelo
+
+    Returns:
+        list: Tuplas (id de tarea, resultado o None, error o None)
+    """
+    import cv2
+
+    results = []
+    for start in range(0, len(tasks), batch_size):
+        batch_ids, images = [], []
+        for task_id, path in tasks[start:start + batch_size]:
+            image = cv2.imread(os.path.join(root, path))
+            if image is None:
+                results.append((task_id, None, 'No se pudo leer la imagen'))
+                continue
+            batch_ids.append(task_id)
+            images.append(image_processor.process(image))
+
+        for task_id, prediction in zip(batch_ids, predictor.predict_batch(images,
+                                                                          batch_size=batch_size)):
+            if 'error' in prediction:
+                results.append((task_id, None, prediction['error']))
+            else:
+                results.append((task_id, {
+                    'class': prediction['class'],
+                    'class_index': prediction['class_index'],
+                    'confidence': float(prediction['confidence']),
+                    'above_threshold': bool(prediction['above_threshold'])
+                }, None))
+    return results
+
+
+def command_enqueue(args):
+    """Enumera una carpeta de imágenes en la cola"""
+    root = os.path.abspath(args.images)
+    if not os.path.isdir(root):
+        logger.error(f"La carpeta no existe: {root}")
+        return 1
+
+    queue = WorkQueue(args.queue)
+    previous_root = queue.get_meta('root')
+    if previous_root and previous_root != root:
+        logger.error(f"La cola ya pertenece a otra carpeta: {previous_root}")
+        return 1
+    queue.set_meta('root', root)
+
+    start_time = time.time()
+    added = queue.enqueue(find_images(root, args.recursive), args.chunk_size)
+    status = queue.status()
+    logger.info(f"{added} archivos nuevos en {time.time() - start_time:.2f}s "
+                f"({status['total_tasks']} en total, {sum(status['chunks'].values())} bloques)")
+    return 0
+
+
+def command_work(args):
+    """Procesa bloques hasta vaciar la cola"""
+    from utils.model_loader import ModelLoader
+    from utils.image_processor import ImageProcessor
+    from utils.predictor import Predictor
+
+    queue = WorkQueue(args.queue, lease_seconds=args.lease, max_attempts=args.max_attempts)
+    root = args.root or queue.get_meta('root')
+    if not root:
+        logger.error("La cola no tiene carpeta de imágenes; use 'enqueue' o --root")
+        return 1
+
+    loader = ModelLoader(args.model)
+    predictor = Predictor(loader, confidence_threshold=args.confidence)
+    image_size = loader.get_metadata().get('imageSize', 224)
+    image_processor = ImageProcessor(target_size=(image_size, image_size))
+    predictor.warmup()
+
+    worker_id = args.worker_id or default_worker_id()
+    logger.info(f"Worker {worker_id} procesando {root}")
+
+    chunks = images = 0
+    start_time = time.time()
+    while args.max_chunks is None or chunks < args.max_chunks:
+        leased = queue.lease(worker_id)
+        if leased is None:
+            # Sin bloques libres: esperar si otros workers aún tienen arriendos
+            if args.wait and queue.has_work():
+                time.sleep(min(args.lease / 3, 10))
+                continue
+            break
+
+        chunk_id, tasks = leased
+        chunk_start = time.time()
+        try:
+            with LeaseKeeper(queue, chunk_id, worker_id, args.lease / 3) as keeper:
+                results = classify_chunk(tasks, root, predictor, image_processor, args.batch_size)
+        except BaseException:
+            queue.release(chunk_id, worker_id)
+            raise
+
+        if keeper.lost or not queue.complete(chunk_id, worker_id, results):
+            continue
+
+        chunks += 1
+        images += len(results)
+        elapsed = time.time() - chunk_start
+        logger.info(f"Bloque {chunk_id}: {len(results)} imágenes en {elapsed:.2f}s "
+                    f"({len(results) / elapsed if elapsed else 0:.1f} img/s)")
+
+    elapsed = time.time() - start_time
+    logger.info(f"Worker {worker_id}: {chunks} bloques, {images} imágenes en {elapsed:.2f}s")
+    return 0
+
+
+def command_status(args):
+    """Muestra el avance de la cola"""
+    status = WorkQueue(args.queue).status()
+    if args.json:
+        print(json.dumps(status, indent=2))
+        return 0
+
+    tasks = status['tasks']
+    done = tasks.get('done', 0) + tasks.get('failed', 0)
+    total = status['total_tasks']
+    print(f"Tareas: {done}/{total} ({done / total * 100 if total else 0:.1f}%)")
+    for state in ('pending', 'done', 'failed'):
+        print(f"  {state}: {tasks.get(state, 0)}")
+    print("Bloques: " + ', '.join(f"{state} {count}" for state, count in
+                                  sorted(status['chunks'].items())))
+    print(f"Arriendos vencidos: {status['expired_leases']}")
+    print(f"Workers activos: {len(status['active_workers'])}")
+    for worker in status['active_workers']:
+        print(f"  {worker}")
+    return 0
+
+
+def command_export(args):
+    """Escribe los resultados en CSV o JSONL"""
+    queue = WorkQueue(args.queue)
+    count = 0
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        if args.output.endswith('.csv'):
+            writer = csv.writer(f)
+            writer.writerow(['path', 'status', 'class', 'confidence', 'error', 'worker'])
+            for row in queue.iter_results():
+                result = row['result'] or {}
+                writer.writerow([row['path'], row['status'], result.get('class', ''),
+                                 f"{result['confidence']:.6f}" if 'confidence' in result else '',
+                                 row['error'] or '', row['worker']])
+                count += 1
+        else:
+            for row in queue.iter_results():
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                count += 1
+    logger.info(f"{count} resultados exportados a {args.output}")
+    return 0
+
+
+def command_retry(args):
+    """Re-encola los bloques y tareas fallidos"""
+    count = WorkQueue(args.queue).retry_failed()
+    logger.info(f"{count} bloques re-encolados")
+    return 0
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Clasificación masiva de AutoDocVision repartida entre varias máquinas'
+    )
+    parser.add_argument('--queue', type=str, required=True,
+                        help='Archivo SQLite de la cola (en almacenamiento compartido)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Enumerar imágenes en la cola')
+    enqueue_parser.add_argument('--images', type=str, required=True,
+                                help='Carpeta de imágenes')
+    enqueue_parser.add_argument('--recursive', action='store_true',
+                                help='Incluir subcarpetas')
+    enqueue_parser.add_argument('--chunk-size', type=int, default=64,
+                                help='Imágenes por bloque arrendable (default: 64)')
+
+    work_parser = subparsers.add_parser('work', help='Procesar bloques de la cola')
+    work_parser.add_argument('--model', type=str, default='RECONOCIMIENTO DE DOCUMENTOS',
+                             help='Carpeta del modelo')
+    work_parser.add_argument('--root', type=str, default=None,
+                             help='Carpeta de imágenes en esta máquina (default: la del enqueue)')
+    work_parser.add_argument('--worker-id', type=str, default=None,
+                             help='Identificador del worker (default: máquina:pid:aleatorio)')
+    work_parser.add_argument('--batch-size', type=int, default=16,
+                             help='Imágenes por pasada del modelo (default: 16)')
+    work_parser.add_argument('--lease', type=float, default=120,
+                             help='Segundos de arriendo; se renueva cada tercio (default: 120)')
+    work_parser.add_argument('--max-attempts', type=int, default=3,
+                             help='Arriendos vencidos antes de dar un bloque por fallido '
+                                  '(default: 3)')
+    work_parser.add_argument('--max-chunks', type=int, default=None,
+                             help='Detenerse tras N bloques')
+    work_parser.add_argument('--wait', action='store_true',
+                             help='Esperar a que venzan arriendos ajenos en lugar de terminar')
+    work_parser.add_argument('--confidence', type=float, default=0.5,
+                             help='Umbral de confianza (0-1, default: 0.5)')
+
+    status_parser = subparsers.add_parser('status', help='Avance de la cola')
+    status_parser.add_argument('--json', action='store_true',
+                               help='Salida en formato JSON')
+
+    export_parser = subparsers.add_parser('export', help='Exportar resultados')
+    export_parser.add_argument('--output', type=str, required=True,
+                               help='Archivo .csv o .jsonl')
+
+    subparsers.add_parser('retry', help='Re-encolar bloques y tareas fallidos')
+
+    args = parser.parse_args()
+
+    try:
+        commands = {
+            'enqueue': command_enqueue,
+            'work': command_work,
+            'status': command_status,
+            'export': command_export,
+            'retry': command_retry
+        }
+        return commands[args.command](args)
+    except KeyboardInterrupt:
+        logger.info("Interrumpido; los bloques en curso vuelven a la cola")
+        return 130
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -5,9 +5,10 @@ Camera Detection - Detección en tiempo real desde cámara web
 import cv2
 import numpy as np
 import argparse
+import json
 import logging
+import time
 from datetime import datetime
-import os
 
 # Configurar logging
 logging.basicConfig(
@@ -19,18 +20,26 @@ logger = logging.getLogger(__name__)
 from utils.model_loader import ModelLoader
 from utils.image_processor import ImageProcessor
 from utils.predictor import Predictor
+from utils.capture_writer import CaptureWriter
+from utils.frame_source import SessionRecorder, ReplaySource
 
 
 class CameraDetector:
     """Detector de documentos en tiempo real desde cámara"""
     
-    def __init__(self, camera_id=0, confidence_threshold=0.7):
+    def __init__(self, camera_id=0, confidence_threshold=0.7, min_stable_frames=5,
+                 capture_queue=8, source=None):
         """
         Inicializa detector de cámara
         
         Args:
             camera_id (int): ID de la cámara (0=predeterminada)
             confidence_threshold (float): Umbral de confianza
+            min_stable_frames (int): Frames seguidos con la misma clase para
+                                     considerar estable una detección
+            capture_queue (int): Capturas pendientes de escribir como máximo
+            source: Fuente de frames con la interfaz de cv2.VideoCapture (por
+                    ejemplo ReplaySource); si se omite se abre la cámara
         """
         logger.info("Inicializando CameraDetector...")
         
@@ -40,29 +49,49 @@ class CameraDetector:
         self.image_processor = ImageProcessor()
         self.predictor = Predictor(self.model_loader, confidence_threshold)
         
-        # Inicializar cámara
-        self.cap = cv2.VideoCapture(camera_id)
+        # Inicializar cámara (o la fuente indicada, p. ej. una sesión grabada)
+        self.replay = source is not None
+        self.cap = source if source is not None else cv2.VideoCapture(camera_id)
         if not self.cap.isOpened():
             raise RuntimeError(f"No se pudo acceder a la cámara {camera_id}")
         
         # Configurar propiedades de cámara
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
+        if not self.replay:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            self.cap.set(cv2.CAP_PROP_FPS, 30)
         
         self.running = True
         self.frame_count = 0
         self.detections_count = 0
         
+        # Captura automática: mejor frame de cada detección estable
+        self.min_stable_frames = min_stable_frames
+        self.capture_queue = capture_queue
+        self.writer = None
+        self.auto_capture = False
+        self.stable_detections = 0
+        self._track = None
+        
+        # Latencia por etapa (segundos) y secuencia de predicciones para el reporte
+        self.stage_times = {stage: [] for stage in ('read', 'process', 'predict', 'render', 'display')}
+        self.predictions = []
+        self.elapsed_time = 0.0
+        
         logger.info("CameraDetector inicializado correctamente")
     
-    def run(self, save_detections=False, output_dir='detections'):
+    def run(self, save_detections=False, output_dir='detections', display=True,
+            record_path=None, max_frames=None):
         """
         Ejecuta detección en tiempo real
         
         Args:
-            save_detections (bool): Guardar imágenes detectadas
+            save_detections (bool): Guardar automáticamente el mejor frame de
+                                    cada detección estable
             output_dir (str): Directorio para guardar imágenes
+            display (bool): Mostrar la ventana (False en servidores sin pantalla)
+            record_path (str): Carpeta donde grabar la sesión (ver SessionRecorder)
+            max_frames (int): Detenerse tras este número de frames
         
         Controles:
             q - Salir
@@ -71,32 +100,64 @@ class CameraDetector:
             t - Mostrar estadísticas
         """
         
-        if save_detections:
-            os.makedirs(output_dir, exist_ok=True)
+        # Las capturas (automáticas y con 's') se escriben en segundo plano
+        self.writer = CaptureWriter(output_dir, max_queue=self.capture_queue)
+        self.auto_capture = save_detections
+        recorder = SessionRecorder(record_path) if record_path else None
+        prediction = None
         
         logger.info("Iniciando captura de cámara...")
         logger.info("Controles: q=salir, s=guardar, c=limpiar, t=estadísticas")
         
         fps_start_time = datetime.now()
         fps_counter = 0
+        run_start = time.perf_counter()
         
         while self.running:
+            stage_start = time.perf_counter()
             ret, frame = self.cap.read()
+            self.stage_times['read'].append(time.perf_counter() - stage_start)
             
             if not ret:
-                logger.error("Error al leer frame de cámara")
+                if self.replay:
+                    logger.info("Fin de la sesión grabada")
+                else:
+                    logger.error("Error al leer frame de cámara")
                 break
             
+            if recorder is not None:
+                recorder.write(frame)
+            
             self.frame_count += 1
             fps_counter += 1
             
             # Redimensionar para procesamiento
+            stage_start = time.perf_counter()
             display_frame = cv2.resize(frame, (1280, 720))
+            render_time = time.perf_counter() - stage_start
             
             # Procesar y predecir
             try:
+                stage_start = time.perf_counter()
                 processed = self.image_processor.process(frame)
+                self.stage_times['process'].append(time.perf_counter() - stage_start)
+                
+                stage_start = time.perf_counter()
                 prediction = self.predictor.predict(processed)
+                self.stage_times['predict'].append(time.perf_counter() - stage_start)
+                
+                # Instante del frame: el grabado en una reproducción, el transcurrido en vivo
+                frame_time = getattr(self.cap, 'timestamp', None)
+                if frame_time is None:
+                    frame_time = time.perf_counter() - run_start
+                self.predictions.append({
+                    'frame': self.frame_count,
+                    't': round(frame_time, 6),
+                    'class': prediction['class'],
+                    'confidence': round(prediction['confidence'], 4)
+                })
+                self._track_detection(frame, prediction)
+                stage_start = time.perf_counter()
                 
                 # Verificar si cumple threshold
                 if prediction['confidence'] >= self.confidence_threshold:
@@ -116,8 +177,11 @@ class CameraDetector:
             
             except Exception as e:
                 logger.error(f"Error en predicción: {e}")
+            else:
+                render_time += time.perf_counter() - stage_start
             
             # Mostrar información
+            stage_start = time.perf_counter()
             fps_elapsed = (datetime.now() - fps_start_time).total_seconds()
             if fps_elapsed >= 1:
                 fps = fps_counter / fps_elapsed
@@ -131,36 +195,98 @@ class CameraDetector:
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             cv2.putText(display_frame, f"Frames: {self.frame_count} | Detecciones: {self.detections_count}", 
                        (10, 750), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            self.stage_times['render'].append(render_time + time.perf_counter() - stage_start)
+            
+            if max_frames is not None and self.frame_count >= max_frames:
+                break
+            
+            if not display:
+                continue
             
             # Mostrar frame
+            stage_start = time.perf_counter()
             cv2.imshow('AutoDocVision - Detección en Tiempo Real', display_frame)
             
             # Manejo de teclas
             key = cv2.waitKey(1) & 0xFF
+            self.stage_times['display'].append(time.perf_counter() - stage_start)
             
             if key == ord('q'):
                 logger.info("Saliendo...")
                 break
             elif key == ord('s'):
-                self._save_frame(display_frame, prediction, output_dir)
+                self._save_frame(display_frame, prediction)
             elif key == ord('c'):
                 cv2.destroyAllWindows()
                 cv2.namedWindow('AutoDocVision - Detección en Tiempo Real')
             elif key == ord('t'):
                 self._print_stats()
         
-        self.cleanup()
+        self.elapsed_time = time.perf_counter() - run_start
+        if recorder is not None:
+            recorder.close()
+        self.cleanup(display)
+    
+    def _track_detection(self, frame, prediction):
+        """
+        Sigue la detección actual y guarda su mejor frame al terminar
+        
+        Una detección es la racha de frames consecutivos con la misma clase
+        sobre el umbral. Si dura al menos min_stable_frames, al terminar se
+        guarda el frame de mayor confianza de la racha.
+        
+        Args:
+            frame (np.array): Frame original de la cámara
+            prediction (dict): Predicción del frame (None si no hubo)
+        """
+        above = prediction is not None and prediction['confidence'] >= self.confidence_threshold
+        label = prediction['class'] if above else None
+        
+        if self._track is not None and self._track['class'] != label:
+            self._finish_track()
+        
+        if label is None:
+            return
+        
+        if self._track is None:
+            self._track = {'class': label, 'frames': 0, 'best_confidence': -1.0,
+                           'best_frame': None, 'started_at': datetime.now()}
+        
+        track = self._track
+        track['frames'] += 1
+        if prediction['confidence'] > track['best_confidence']:
+            # cap.read() entrega un array nuevo en cada llamada: basta con la referencia
+            track['best_confidence'] = prediction['confidence']
+            track['best_frame'] = frame
     
-    def _save_frame(self, frame, prediction, output_dir):
-        """Guarda frame actual con información de predicción"""
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{output_dir}/detection_{timestamp}_{prediction['class']}.jpg"
-            cv2.imwrite(filename, frame)
-            logger.info(f"Frame guardado: {filename}")
-        except Exception as e:
-            logger.error(f"Error al guardar frame: {e}")
+    def _finish_track(self):
+        """Cierra la detección en curso y encola su mejor frame si fue estable"""
+        track, self._track = self._track, None
+        if track is None or track['frames'] < self.min_stable_frames:
+            return
+        
+        self.stable_detections += 1
+        if self.auto_capture and self.writer is not None:
+            self.writer.submit(track['best_frame'], {
+                'class': track['class'],
+                'confidence': round(track['best_confidence'], 4),
+                'frames': track['frames'],
+                'started_at': track['started_at'].isoformat(),
+                'source': 'auto'
+            })
     
+    def _save_frame(self, frame, prediction):
+        """Encola el frame actual (con anotaciones) para guardarlo"""
+        if prediction is None or self.writer is None:
+            logger.warning("No hay predicción que guardar todavía")
+            return
+        if not self.writer.submit(frame.copy(), {
+            'class': prediction['class'],
+            'confidence': round(prediction['confidence'], 4),
+            'source': 'manual'
+        }):
+            logger.warning("Cola de capturas llena; captura descartada")
+
     def _print_stats(self):
         """Imprime estadísticas de sesión"""
         accuracy = (self.detections_count / self.frame_count * 100) if self.frame_count > 0 else 0
@@ -170,14 +296,55 @@ class CameraDetector:
         print(f"Frames procesados: {self.frame_count}")
         print(f"Detecciones: {self.detections_count}")
         print(f"Tasa de detección: {accuracy:.1f}%")
+        print(f"Detecciones estables: {self.stable_detections}")
+        if self.writer is not None:
+            stats = self.writer.stats()
+            print(f"Capturas guardadas: {stats['written']} "
+                  f"(en cola: {stats['queued']}, descartadas por cola llena: {stats['dropped']}, "
+                  f"errores: {stats['errors']})")
         print(f"{'='*50}\n")
     
-    def cleanup(self):
+    def build_report(self):
+        """
+        Reporte de rendimiento de la sesión
+        
+        Returns:
+            dict: FPS logrados, latencia por etapa (ms) y secuencia de predicciones
+        """
+        stages = {}
+        for stage, samples in self.stage_times.items():
+            if not samples:
+                continue
+            values = np.array(samples) * 1000
+            stages[stage] = {
+                'mean_ms': round(float(values.mean()), 3),
+                'p50_ms': round(float(np.percentile(values, 50)), 3),
+                'p95_ms': round(float(np.percentile(values, 95)), 3),
+                'count': len(samples)
+            }
+        
+        return {
+            'frames': self.frame_count,
+            'elapsed_s': round(self.elapsed_time, 3),
+            'fps': round(self.frame_count / self.elapsed_time, 2) if self.elapsed_time else 0.0,
+            'detections': self.detections_count,
+            'stable_detections': self.stable_detections,
+            'stages': stages,
+            'predictions': self.predictions
+        }
+    
+    def cleanup(self, display=True):
         """Limpia recursos"""
         logger.info("Limpiando recursos...")
         self.running = False
         self.cap.release()
-        cv2.destroyAllWindows()
+        if display:
+            cv2.destroyAllWindows()
+        
+        # Guardar la detección en curso y esperar las escrituras pendientes
+        self._finish_track()
+        if self.writer is not None:
+            self.writer.close()
         logger.info("Recursos liberados")
         self._print_stats()
 
@@ -192,18 +359,47 @@ def main():
     parser.add_argument('--confidence', type=float, default=0.7,
                        help='Umbral de confianza (0-1, default: 0.7)')
     parser.add_argument('--save', action='store_true',
-                       help='Guardar detecciones en archivos')
+                       help='Guardar automáticamente el mejor frame de cada detección estable')
     parser.add_argument('--output', type=str, default='detections',
                        help='Directorio de salida para detecciones')
+    parser.add_argument('--min-stable-frames', type=int, default=5,
+                       help='Frames seguidos de la misma clase para una detección estable (default: 5)')
+    parser.add_argument('--capture-queue', type=int, default=8,
+                       help='Capturas pendientes de escribir como máximo (default: 8)')
+    parser.add_argument('--record', type=str, default=None,
+                       help='Grabar los frames de la sesión en esta carpeta')
+    parser.add_argument('--replay', type=str, default=None,
+                       help='Procesar una sesión grabada en lugar de la cámara')
+    parser.add_argument('--max-rate', action='store_true',
+                       help='Con --replay, procesar lo más rápido posible (sin respetar los tiempos)')
+    parser.add_argument('--no-display', action='store_true',
+                       help='No mostrar ventana (servidores sin pantalla)')
+    parser.add_argument('--max-frames', type=int, default=None,
+                       help='Detenerse tras N frames')
+    parser.add_argument('--report', type=str, default=None,
+                       help='Guardar reporte JSON de FPS, latencia por etapa y predicciones')
     
     args = parser.parse_args()
     
     try:
+        source = ReplaySource(args.replay, realtime=not args.max_rate) if args.replay else None
         detector = CameraDetector(
             camera_id=args.camera,
-            confidence_threshold=args.confidence
+            confidence_threshold=args.confidence,
+            min_stable_frames=args.min_stable_frames,
+            capture_queue=args.capture_queue,
+            source=source
         )
-        detector.run(save_detections=args.save, output_dir=args.output)
+        detector.run(save_detections=args.save, output_dir=args.output,
+                     display=not args.no_display, record_path=args.record,
+                     max_frames=args.max_frames)
+        
+        if args.report:
+            report = detector.build_report()
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            logger.info(f"Reporte guardado en {args.report}: {report['frames']} frames, "
+                        f"{report['fps']} FPS")
     except Exception as e:
         logger.error(f"Error fatal: {e}")
         return 1
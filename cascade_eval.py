@@ -0,0 +1,196 @@
+"""
+Cascade Eval - Evaluación de la cascada de resolución
+
+Sobre una carpeta etiquetada (una subcarpeta por clase, con el mismo nombre
+que en metadata.json) compara la predicción siempre a resolución completa
+contra la cascada (baja resolución + escalado por confianza) para varias
+resoluciones y umbrales, y reporta tasa de escalado, exactitud y costo
+relativo por imagen.
+
+Uso:
+    python cascade_eval.py --data dataset/ --resolutions 128 160 --confidence 0.8 0.9 0.95
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+import cv2
+import numpy as np
+
+from utils.model_loader import ModelLoader
+from utils.image_processor import ImageProcessor
+from utils.predictor import Predictor
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
+
+
+def load_labeled_folder(folder, class_names):
+    """
+    Lista las imágenes de una carpeta etiquetada
+
+    Args:
+        folder (str): Carpeta con una subcarpeta por clase
+        class_names (list): Clases del modelo
+
+    Returns:
+        list: Tuplas (ruta, índice de clase)
+    """
+    lookup = {name.lower(): i for i, name in enumerate(class_names)}
+    samples = []
+    for entry in sorted(os.listdir(folder)):
+        class_dir = os.path.join(folder, entry)
+        if not os.path.isdir(class_dir):
+            continue
+        if entry.lower() not in lookup:
+            logger.warning(f"Carpeta '{entry}' no corresponde a ninguna clase; se omite")
+            continue
+        for filename in sorted(os.listdir(class_dir)):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                samples.append((os.path.join(class_dir, filename), lookup[entry.lower()]))
+    return samples
+
+
+def compute_probabilities(predictor, images, resolution, batch_size):
+    """
+    Probabilidades de todas las imágenes a una resolución
+
+    Returns:
+        tuple: (probabilidades (N, C), segundos por imagen)
+    """
+    outputs = []
+    elapsed_time = 0.0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        if batch.shape[1] != resolution:
+            batch = np.stack([cv2.resize(image, (resolution, resolution),
+                                         interpolation=cv2.INTER_AREA) for image in batch])
+        start_time = time.time()
+        outputs.append(predictor._forward(batch))
+        elapsed_time += time.time() - start_time
+    return np.concatenate(outputs), elapsed_time / len(images)
+
+
+def evaluate(labels, full_probs, full_time, low_probs, low_time, confidence):
+    """
+    Métricas de la cascada para una resolución y un umbral
+
+    Args:
+        labels (np.array): Clase verdadera por imagen
+        full_probs (np.array): Probabilidades a resolución completa
+        full_time (float): Segundos por imagen a resolución completa
+        low_probs (np.array): Probabilidades a baja resolución
+        low_time (float): Segundos por imagen a baja resolución
+        confidence (float): Confianza mínima para no escalar
+
+    Returns:
+        dict: Tasa de escalado, exactitudes y costo relativo
+    """
+    escalate = low_probs.max(axis=1) < confidence
+    cascade_pred = np.where(escalate, full_probs.argmax(axis=1), low_probs.argmax(axis=1))
+    full_pred = full_probs.argmax(axis=1)
+    escalation_rate = float(escalate.mean())
+    return {
+        'confidence': confidence,
+        'escalation_rate': round(escalation_rate, 4),
+        'accuracy_cascade': round(float((cascade_pred == labels).mean()), 4),
+        'accuracy_full': round(float((full_pred == labels).mean()), 4),
+        'agreement_with_full': round(float((cascade_pred == full_pred).mean()), 4),
+        'relative_cost': round((low_time + escalation_rate * full_time) / full_time, 4)
+    }
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Evaluar la cascada de resolución sobre una carpeta etiquetada'
+    )
+    parser.add_argument('--data', type=str, required=True,
+                        help='Carpeta con una subcarpeta por clase')
+    parser.add_argument('--model', type=str, default='RECONOCIMIENTO DE DOCUMENTOS',
+                        help='Carpeta del modelo')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[128, 160],
+                        help='Resoluciones de la primera etapa (default: 128 160)')
+    parser.add_argument('--confidence', type=float, nargs='+', default=[0.8, 0.9, 0.95],
+                        help='Umbrales de escalado (default: 0.8 0.9 0.95)')
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help='Imágenes por pasada (default: 16)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Guardar resultados en JSON')
+
+    args = parser.parse_args()
+
+    try:
+        loader = ModelLoader(args.model)
+        predictor = Predictor(loader)
+        if predictor.is_simulated:
+            logger.error("La evaluación requiere el modelo real (model.json y weights.bin)")
+            return 1
+
+        samples = load_labeled_folder(args.data, loader.get_class_names())
+        if not samples:
+            logger.error(f"No se encontraron imágenes etiquetadas en {args.data}")
+            return 1
+
+        full_resolution = predictor.input_shape[0]
+        image_processor = ImageProcessor(target_size=(full_resolution, full_resolution))
+        images = np.stack([image_processor.process(path) for path, _ in samples])
+        labels = np.array([label for _, label in samples])
+        logger.info(f"Evaluando {len(samples)} imágenes...")
+
+        predictor.warmup((args.batch_size,))
+        full_probs, full_time = compute_probabilities(predictor, images, full_resolution,
+                                                      args.batch_size)
+
+        report = {
+            'images': len(samples),
+            'full_resolution': full_resolution,
+            'full_ms_per_image': round(full_time * 1000, 3),
+            'cascades': []
+        }
+        for resolution in args.resolutions:
+            low_probs, low_time = compute_probabilities(predictor, images, resolution,
+                                                        args.batch_size)
+            for confidence in args.confidence:
+                metrics = evaluate(labels, full_probs, full_time, low_probs, low_time, confidence)
+                metrics['resolution'] = resolution
+                metrics['low_ms_per_image'] = round(low_time * 1000, 3)
+                report['cascades'].append(metrics)
+
+        print(f"\n{'='*78}")
+        print(f"CASCADA DE RESOLUCIÓN - {len(samples)} imágenes, completa a {full_resolution}px "
+              f"({report['full_ms_per_image']:.2f} ms/img)")
+        print(f"{'='*78}")
+        print(f"{'Res':>5} {'Umbral':>7} {'Escalado':>9} {'Exact.':>7} {'Exact. full':>11} "
+              f"{'Acuerdo':>8} {'Costo rel.':>10}")
+        for metrics in report['cascades']:
+            print(f"{metrics['resolution']:>5} {metrics['confidence']:>7.2f} "
+                  f"{metrics['escalation_rate']:>9.1%} {metrics['accuracy_cascade']:>7.1%} "
+                  f"{metrics['accuracy_full']:>11.1%} {metrics['agreement_with_full']:>8.1%} "
+                  f"{metrics['relative_cost']:>10.2f}")
+        print(f"{'='*78}\n")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Resultados guardados en: {args.output}")
+
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
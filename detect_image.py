@@ -6,6 +6,7 @@ import argparse
 import logging
 import json
 import os
+import sys
 from datetime import datetime
 
 # Configurar logging
@@ -15,42 +16,136 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from utils.model_loader import ModelLoader
-from utils.image_processor import ImageProcessor
-from utils.predictor import Predictor
+# Los módulos con OpenCV/NumPy se importan dentro de ImageDetector para que el
+# modo cliente del daemon arranque sin cargarlos
+from utils.inference_daemon import (InferenceDaemon, DaemonClient, DaemonError,
+                                    default_socket_path)
 
 
 class ImageDetector:
     """Detector de documentos en imágenes estáticas"""
     
-    def __init__(self, confidence_threshold=0.5):
+    def __init__(self, confidence_threshold=0.5, embedding_store=None, region_mode=False,
+                 max_pages=20):
         """
         Inicializa detector de imágenes
         
         Args:
             confidence_threshold (float): Umbral de confianza
+            embedding_store (str): Carpeta donde guardar los embeddings del
+                                   backbone por hash de contenido (opcional)
+            region_mode (bool): Clasificar además cada documento de la foto
+            max_pages (int): Máximo de páginas de un TIFF multipágina o GIF animado
         """
         logger.info("Inicializando ImageDetector...")
         
+        from utils.model_loader import ModelLoader
+        from utils.image_processor import ImageProcessor
+        from utils.predictor import Predictor
+        
         self.confidence_threshold = confidence_threshold
+        self.max_pages = max_pages
         self.model_loader = ModelLoader()
         self.image_processor = ImageProcessor()
         self.predictor = Predictor(self.model_loader, confidence_threshold)
         
+        self.region_detector = None
+        if region_mode:
+            from utils.region_detector import RegionDetector
+            self.region_detector = RegionDetector(self.predictor, self.image_processor)
+        
+        self.embedding_store = None
+        if embedding_store:
+            if self.predictor.is_simulated:
+                logger.warning("Modelo simulado: no se guardarán embeddings")
+            else:
+                from utils.embedding_store import EmbeddingStore
+                model = self.predictor.model
+                self.embedding_store = EmbeddingStore(embedding_store, dim=model.feature_dim,
+                                                      backbone_hash=model.backbone_hash)
+        
         logger.info("ImageDetector inicializado correctamente")
     
-    def detect(self, image_path, return_all_probs=False):
+    def _predict_with_store(self, image_path, return_all_probs):
+        """
+        Predice reutilizando el embedding guardado si el contenido ya se vio
+        
+        Args:
+            image_path (str): Ruta a la imagen
+            return_all_probs (bool): Retorna probabilidades de todas las clases
+        
+        Returns:
+            dict: Resultado de predicción
+        """
+        import cv2
+        import numpy as np
+        from utils.embedding_store import content_hash
+        
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        key = content_hash(data)
+        
+        embedding = self.embedding_store.get(key)
+        if embedding is None:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"No se pudo decodificar la imagen: {image_path}")
+            image = self.image_processor.process(image)
+            embedding = self.predictor.extract_embeddings(image)[0]
+            self.embedding_store.add(key, embedding, os.path.abspath(image_path))
+        else:
+            logger.info("Embedding reutilizado del almacén")
+        
+        return self.predictor.predict_from_embeddings(embedding, return_all_probs)[0]
+    
+    def _detect_pages(self, reader, confidence_threshold):
+        """
+        Clasifica las páginas de un archivo multipágina en un solo lote
+        
+        Args:
+            reader (PageReader): Lector del archivo
+            confidence_threshold (float): Umbral de confianza
+        
+        Returns:
+            tuple: (resultados por página, resumen del documento)
+        """
+        from utils.page_reader import summarize_pages
+        
+        pages = [self.image_processor.process(page) for _, page in reader.iter_pages()]
+        results = self.predictor.predict_batch(pages, return_all_probabilities=True)
+        summary = summarize_pages(results, self.model_loader.get_class_names())
+        summary['confidence'] = round(summary['confidence'], 4)
+        summary['page_count'] = reader.page_count
+        summary['pages_processed'] = len(results)
+        summary['truncated'] = reader.truncated
+        
+        page_results = [
+            {
+                'page': index + 1,
+                'class': result['class'],
+                'confidence': round(result['confidence'], 4),
+                'above_threshold': result['confidence'] >= confidence_threshold
+            }
+            for index, result in enumerate(results)
+        ]
+        return page_results, summary
+    
+    def detect(self, image_path, return_all_probs=False, confidence_threshold=None):
         """
         Detecta documento en imagen
         
         Args:
             image_path (str): Ruta a la imagen
             return_all_probs (bool): Retorna probabilidades de todas las clases
+            confidence_threshold (float): Umbral para esta llamada (default: el del detector)
         
         Returns:
             dict: Resultado de detección
         """
         
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        
         try:
             # Validar archivo
             if not os.path.exists(image_path):
@@ -58,11 +153,44 @@ class ImageDetector:
             
             logger.info(f"Procesando imagen: {image_path}")
             
-            # Procesar imagen
-            image = self.image_processor.process(image_path)
+            # TIFF multipágina / GIF animado: una predicción por página
+            from utils.page_reader import PageReader, is_multipage_candidate
+            if is_multipage_candidate(image_path):
+                with PageReader(image_path, self.max_pages) as reader:
+                    if reader.is_multipage:
+                        pages, summary = self._detect_pages(reader, confidence_threshold)
+                        logger.info(f"Documento de {summary['page_count']} páginas: "
+                                    f"{summary['class']} ({summary['confidence']})")
+                        return {
+                            'file': os.path.basename(image_path),
+                            'success': True,
+                            'class': summary['class'],
+                            'class_index': summary.get('class_index'),
+                            'confidence': summary['confidence'],
+                            'above_threshold': summary['confidence'] >= confidence_threshold,
+                            'threshold': confidence_threshold,
+                            'timestamp': datetime.now().isoformat(),
+                            'pages': pages,
+                            'summary': summary
+                        }
             
-            # Hacer predicción
-            prediction = self.predictor.predict(image, return_all_probs)
+            regions = None
+            if self.region_detector is not None:
+                import cv2
+                image = cv2.imread(image_path)
+                if image is None:
+                    raise ValueError(f"No se pudo leer imagen: {image_path}")
+                detection = self.region_detector.detect(image,
+                                                        return_all_probabilities=return_all_probs)
+                prediction, regions = detection['image'], detection['regions']
+            elif self.embedding_store is not None:
+                prediction = self._predict_with_store(image_path, return_all_probs)
+            else:
+                # Procesar imagen
+                image = self.image_processor.process(image_path)
+                
+                # Hacer predicción
+                prediction = self.predictor.predict(image, return_all_probs)
             
             # Agregar información adicional
             result = {
@@ -71,8 +199,8 @@ class ImageDetector:
                 'class': prediction['class'],
                 'class_index': prediction['class_index'],
                 'confidence': round(prediction['confidence'], 4),
-                'above_threshold': prediction['confidence'] >= self.confidence_threshold,
-                'threshold': self.confidence_threshold,
+                'above_threshold': prediction['confidence'] >= confidence_threshold,
+                'threshold': confidence_threshold,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -80,6 +208,17 @@ class ImageDetector:
                 result['all_probabilities'] = prediction['all_probabilities']
                 result['all_classes'] = self.model_loader.get_class_names()
             
+            if regions is not None:
+                result['regions'] = [
+                    {
+                        'box': region['box'],
+                        'class': region['class'],
+                        'confidence': round(region['confidence'], 4),
+                        'above_threshold': region['confidence'] >= confidence_threshold
+                    }
+                    for region in regions
+                ]
+            
             logger.info(f"Detección exitosa: {result['class']} ({result['confidence']})")
             
             return result
@@ -92,13 +231,14 @@ class ImageDetector:
                 'error': str(e)
             }
     
-    def detect_batch(self, image_paths, return_all_probs=False):
+    def detect_batch(self, image_paths, return_all_probs=False, confidence_threshold=None):
         """
         Detecta documentos en múltiples imágenes
         
         Args:
             image_paths (list): Lista de rutas a imágenes
             return_all_probs (bool): Retorna probabilidades de todas las clases
+            confidence_threshold (float): Umbral para esta llamada (default: el del detector)
         
         Returns:
             list: Lista de resultados
@@ -106,7 +246,7 @@ class ImageDetector:
         
         results = []
         for image_path in image_paths:
-            result = self.detect(image_path, return_all_probs)
+            result = self.detect(image_path, return_all_probs, confidence_threshold)
             results.append(result)
         
         return results
@@ -129,6 +269,19 @@ def print_result_text(result):
             print(f"\nProbabilidades por clase:")
             for class_name, prob in zip(result['all_classes'], result['all_probabilities']):
                 print(f"  {class_name}: {prob:.4f} ({prob*100:.2f}%)")
+        
+        if 'pages' in result:
+            summary = result['summary']
+            print(f"\nPáginas ({summary['pages_processed']} de {summary['page_count']}):")
+            for page in result['pages']:
+                print(f"  Página {page['page']}: {page['class']} ({page['confidence']:.1%})")
+        
+        if 'regions' in result:
+            print(f"\nRegiones ({len(result['regions'])}):")
+            for region in result['regions']:
+                box = region['box']
+                print(f"  [{box['x']}, {box['y']}, {box['width']}x{box['height']}] "
+                      f"{region['class']} ({region['confidence']:.1%})")
     else:
         print(f"ERROR: {result['error']}")
     
@@ -141,7 +294,7 @@ def main():
     parser = argparse.ArgumentParser(
         description='Detección de documentos vehiculares en imágenes'
     )
-    parser.add_argument('--image', type=str, required=True,
+    parser.add_argument('--image', type=str, default=None,
                        help='Ruta a la imagen a procesar')
     parser.add_argument('--confidence', type=float, default=0.5,
                        help='Umbral de confianza (0-1, default: 0.5)')
@@ -153,25 +306,76 @@ def main():
                        help='Mostrar probabilidades de todas las clases')
     parser.add_argument('--batch', nargs='+', default=None,
                        help='Procesar múltiples imágenes')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Iniciar daemon residente con el modelo cargado')
+    parser.add_argument('--socket', type=str, default=default_socket_path(),
+                       help='Socket Unix del daemon (default: %(default)s)')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='No usar el daemon aunque esté disponible')
+    parser.add_argument('--max-pages', type=int, default=20,
+                       help='Máximo de páginas de TIFF/GIF multipágina (default: 20)')
+    parser.add_argument('--regions', action='store_true',
+                       help='Clasificar por separado cada documento de la foto')
+    parser.add_argument('--store-embeddings', type=str, default=None, metavar='DIR',
+                       help='Guardar embeddings del backbone por hash de contenido '
+                            '(re-clasificar después con rescore.py)')
     
     args = parser.parse_args()
     
+    if not args.daemon and not args.image and not args.batch:
+        parser.error('Se requiere --image, --batch o --daemon')
+    
     try:
         # Validar confianza
         if not 0 <= args.confidence <= 1:
             logger.error("Confianza debe estar entre 0 y 1")
             return 1
         
-        # Inicializar detector
-        detector = ImageDetector(confidence_threshold=args.confidence)
+        # Modo daemon: mantener modelo residente
+        if args.daemon:
+            import signal
+            
+            detector = ImageDetector(confidence_threshold=args.confidence,
+                                     embedding_store=args.store_embeddings,
+                                     max_pages=args.max_pages)
+            detector.predictor.warmup()
+            # SIGTERM detiene el servidor limpiando el socket
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            try:
+                InferenceDaemon(detector, args.socket).serve_forever()
+            except KeyboardInterrupt:
+                logger.info("Daemon interrumpido")
+            return 0
         
-        # Procesar imagen(s)
-        if args.batch:
-            logger.info(f"Procesando lote de {len(args.batch)} imágenes...")
-            results = detector.detect_batch(args.batch, args.all_probs)
-        else:
-            result = detector.detect(args.image, args.all_probs)
-            results = [result]
+        image_paths = args.batch if args.batch else [args.image]
+        results = None
+        
+        # Modo cliente: usar el daemon si está escuchando (el almacén de
+        # embeddings y el modo regiones se ejecutan en proceso)
+        if not args.no_daemon and not args.store_embeddings and not args.regions:
+            client = DaemonClient(args.socket)
+            try:
+                results = client.detect(image_paths, args.all_probs, args.confidence)
+                logger.info(f"Resultados obtenidos del daemon ({args.socket})")
+            except DaemonError as e:
+                # La petición llegó al daemon: repetirla en proceso duplicaría el trabajo
+                logger.error(f"Error del daemon: {e}")
+                return 1
+            except OSError as e:
+                logger.debug(f"Daemon no disponible, ejecutando en proceso: {e}")
+        
+        # Ejecución en proceso
+        if results is None:
+            detector = ImageDetector(confidence_threshold=args.confidence,
+                                     embedding_store=args.store_embeddings,
+                                     region_mode=args.regions,
+                                     max_pages=args.max_pages)
+            if args.batch:
+                logger.info(f"Procesando lote de {len(args.batch)} imágenes...")
+                results = detector.detect_batch(args.batch, args.all_probs)
+            else:
+                result = detector.detect(args.image, args.all_probs)
+                results = [result]
         
         # Mostrar resultados
         if args.json:
@@ -194,7 +398,7 @@ def main():
         if args.output and not args.output.endswith('.json') and len(results) == 1:
             import cv2
             try:
-                img = cv2.imread(args.image)
+                img = cv2.imread(image_paths[0])
                 if img is not None:
                     # Dibujar resultado
                     result = results[0]
@@ -204,6 +408,16 @@ def main():
                         cv2.rectangle(img, (10, 10), (400, 80), color, 2)
                         cv2.putText(img, label, (20, 55),
                                    cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+                        
+                        for region in result.get('regions', []):
+                            box = region['box']
+                            color = (0, 255, 0) if region['above_threshold'] else (0, 165, 255)
+                            cv2.rectangle(img, (box['x'], box['y']),
+                                         (box['x'] + box['width'], box['y'] + box['height']),
+                                         color, 3)
+                            cv2.putText(img, f"{region['class']}: {region['confidence']:.1%}",
+                                       (box['x'] + 10, box['y'] + 35),
+                                       cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
                     
                     cv2.imwrite(args.output, img)
                     logger.info(f"Imagen guardada en: {args.output}")
@@ -0,0 +1,108 @@
+"""
+Export ONNX - Convierte el modelo de Teachable Machine a ONNX
+
+Traduce model.json + weights.bin (TF.js Layers) a un archivo .onnx que
+pueden ejecutar ONNX Runtime, OpenCV DNN u otros runtimes. El servidor lo
+hace solo al arrancar (INFERENCE_BACKEND); este script sirve para exportar a
+mano, fijar el tamaño de entrada o comprobar la conversión.
+
+Uso:
+    python export_onnx.py --output modelo.onnx
+    python export_onnx.py --output modelo_224.onnx --image-size 224 --check
+"""
+
+import argparse
+import logging
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from utils.model_loader import ModelLoader
+from utils.onnx_export import export_onnx
+from utils.backends import NumpyBackend, OnnxRuntimeBackend, OpenCvDnnBackend
+
+
+def check_conversion(model, output_path, image_size, batch_size, tolerance):
+    """
+    Compara el ONNX exportado con el motor NumPy en cada runtime instalado
+
+    Returns:
+        bool: True si todos los runtimes disponibles coinciden
+    """
+    rng = np.random.default_rng(0)
+    sample = rng.random((batch_size, image_size, image_size, model.input_shape[-1]),
+                        dtype=np.float32)
+    expected = NumpyBackend(model).predict(sample)
+
+    ok = True
+    for backend_class in (OnnxRuntimeBackend, OpenCvDnnBackend):
+        if not backend_class.available():
+            logger.info(f"{backend_class.name}: no instalado, se omite")
+            continue
+        backend = backend_class(output_path)
+        start_time = time.time()
+        output = backend.predict(sample)
+        elapsed = time.time() - start_time
+        max_diff = float(np.abs(output - expected).max())
+        same_class = bool(np.array_equal(output.argmax(axis=1), expected.argmax(axis=1)))
+        passed = max_diff <= tolerance and same_class
+        ok = ok and passed
+        logger.info(f"{backend_class.name}: diferencia máxima {max_diff:.2e}, "
+                    f"misma clase {same_class}, {elapsed * 1000:.1f} ms "
+                    f"-> {'OK' if passed else 'NO COINCIDE'}")
+    return ok
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Convertir el modelo TF.js de AutoDocVision a ONNX'
+    )
+    parser.add_argument('--model', type=str, default='RECONOCIMIENTO DE DOCUMENTOS',
+                        help='Carpeta del modelo (model.json, weights.bin, metadata.json)')
+    parser.add_argument('--output', type=str, required=True,
+                        help='Archivo .onnx de salida')
+    parser.add_argument('--image-size', type=int, default=None,
+                        help='Fijar el lado de la entrada (default: alto y ancho dinámicos)')
+    parser.add_argument('--opset', type=int, default=13,
+                        help='Versión del opset de ONNX (default: 13)')
+    parser.add_argument('--check', action='store_true',
+                        help='Comparar el resultado con el motor NumPy en los runtimes instalados')
+    parser.add_argument('--check-batch', type=int, default=4,
+                        help='Imágenes del lote de comprobación (default: 4)')
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help='Diferencia absoluta máxima aceptada (default: 1e-3)')
+
+    args = parser.parse_args()
+
+    try:
+        loader = ModelLoader(args.model)
+        model = loader.get_model()
+        if model is None:
+            logger.error("Se requiere el modelo real (model.json y weights.bin)")
+            return 1
+
+        export_onnx(model, args.output, args.image_size, args.opset)
+
+        if args.check:
+            image_size = args.image_size or loader.get_metadata().get('imageSize', 224)
+            if not check_conversion(model, args.output, image_size, args.check_batch,
+                                    args.tolerance):
+                return 1
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,220 @@
+"""
+Find Similar - Índice de documentos casi duplicados desde la línea de comandos
+
+Construye el índice de similitud a partir de imágenes (o de un almacén de
+embeddings de `detect_image.py --store-embeddings`) y consulta los
+documentos más parecidos a una imagen. El servidor usa el mismo índice en
+/api/similar (SIMILARITY_INDEX_DIR).
+
+Uso:
+    python find_similar.py build --images archivo/*.jpg
+    python find_similar.py build --from-store embeddings/
+    python find_similar.py query documento.jpg --k 5
+    python find_similar.py stats
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+import cv2
+import numpy as np
+
+from utils.model_loader import ModelLoader
+from utils.image_processor import ImageProcessor
+from utils.predictor import Predictor
+from utils.embedding_store import EmbeddingStore, content_hash
+from utils.similarity_index import SimilarityIndex
+
+DEFAULT_INDEX = os.environ.get('SIMILARITY_INDEX_DIR', 'similarity_index')
+
+
+def load_predictor(model_path):
+    """
+    Carga el modelo real para calcular embeddings
+
+    Returns:
+        tuple: (Predictor, ImageProcessor)
+
+    Raises:
+        RuntimeError: Si el modelo está en modo simulado
+    """
+    loader = ModelLoader(model_path)
+    predictor = Predictor(loader)
+    if predictor.is_simulated:
+        raise RuntimeError("Se requiere el modelo real (model.json y weights.bin) para embeddings")
+    image_size = loader.get_metadata().get('imageSize', 224)
+    return predictor, ImageProcessor(target_size=(image_size, image_size))
+
+
+def embed_files(paths, predictor, image_processor, batch_size=16):
+    """
+    Calcula el embedding de cada archivo en lotes
+
+    Args:
+        paths (list): Rutas de imágenes
+        predictor (Predictor): Predictor con modelo real
+        image_processor (ImageProcessor): Procesador de imágenes
+        batch_size (int): Imágenes por pasada del backbone
+
+    Yields:
+        tuple: (hashes, rutas, embeddings (n, D)) por lote
+    """
+    for start in range(0, len(paths), batch_size):
+        hashes, sources, images = [], [], []
+        for path in paths[start:start + batch_size]:
+            with open(path, 'rb') as f:
+                data = f.read()
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                logger.warning(f"No se pudo leer {path}; se omite")
+                continue
+            hashes.append(content_hash(data))
+            sources.append(path)
+            images.append(image_processor.process(image))
+        if images:
+            yield hashes, sources, predictor.extract_embeddings(np.stack(images))
+
+
+def open_index(index_dir, dim, backbone_hash, ivf_threshold):
+    """Carga el índice existente o crea uno nuevo"""
+    if os.path.exists(os.path.join(index_dir, 'index.json')):
+        index = SimilarityIndex.load(index_dir)
+        if index.backbone_hash and backbone_hash and index.backbone_hash != backbone_hash:
+            raise ValueError("El índice existente se construyó con otro backbone")
+        return index
+    return SimilarityIndex(dim, backbone_hash, ivf_threshold=ivf_threshold)
+
+
+def command_build(args):
+    """Agrega imágenes o un almacén de embeddings al índice"""
+    start_time = time.time()
+    added = 0
+
+    if args.from_store:
+        store = EmbeddingStore(args.from_store, readonly=True)
+        index = open_index(args.index, store.dim, store.backbone_hash, args.ivf_threshold)
+        for start, embeddings in store.iter_chunks(args.chunk_size):
+            added += index.add(store.hashes(start, start + len(embeddings)), embeddings)
+    else:
+        if not args.images:
+            logger.error("Se requiere --images o --from-store")
+            return 1
+        predictor, image_processor = load_predictor(args.model)
+        index = open_index(args.index, predictor.model.feature_dim,
+                           predictor.model.backbone_hash, args.ivf_threshold)
+        for hashes, sources, embeddings in embed_files(args.images, predictor, image_processor,
+                                                      args.batch_size):
+            added += index.add(hashes, embeddings)
+            for key, source in zip(hashes, sources):
+                logger.debug(f"{key[:12]} <- {source}")
+
+    if index.needs_ivf:
+        index.build_ivf()
+    index.save(args.index)
+    logger.info(f"{added} documentos nuevos en {time.time() - start_time:.2f}s "
+                f"(total {len(index)}, {index.kind})")
+    return 0
+
+
+def command_query(args):
+    """Busca los documentos más similares a cada imagen"""
+    index = SimilarityIndex.load(args.index)
+    predictor, image_processor = load_predictor(args.model)
+    if index.backbone_hash and index.backbone_hash != predictor.model.backbone_hash:
+        logger.error("El índice se construyó con otro backbone")
+        return 1
+
+    results = []
+    for hashes, sources, embeddings in embed_files(args.images, predictor, image_processor):
+        search_start = time.time()
+        matches = index.search(embeddings, args.k)
+        search_time = (time.time() - search_start) / len(hashes)
+        for key, source, image_matches in zip(hashes, sources, matches):
+            results.append({
+                'file': source,
+                'id': key,
+                'matches': image_matches,
+                'duplicate': bool(image_matches) and image_matches[0]['score'] >= args.threshold,
+                'search_time_ms': round(search_time * 1000, 3)
+            })
+
+    if args.json:
+        print(json.dumps({'results': results, 'index': index.stats()}, indent=2, ensure_ascii=False))
+        return 0
+
+    for result in results:
+        print(f"\n{'='*60}")
+        print(f"SIMILARES A: {result['file']}")
+        print(f"{'='*60}")
+        for match in result['matches']:
+            marker = '  <- duplicado' if match['score'] >= args.threshold else ''
+            print(f"  {match['score']:.4f}  {match['id'][:16]}{marker}")
+        print(f"Búsqueda: {result['search_time_ms']:.2f} ms")
+    return 0
+
+
+def command_stats(args):
+    """Muestra el resumen del índice"""
+    index = SimilarityIndex.load(args.index)
+    print(json.dumps(index.stats(), indent=2))
+    return 0
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Índice de documentos casi duplicados de AutoDocVision'
+    )
+    parser.add_argument('--index', type=str, default=DEFAULT_INDEX,
+                        help=f'Carpeta del índice (default: {DEFAULT_INDEX})')
+    parser.add_argument('--model', type=str, default='RECONOCIMIENTO DE DOCUMENTOS',
+                        help='Carpeta del modelo que calcula los embeddings')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Agregar documentos al índice')
+    build_parser.add_argument('--images', nargs='+', default=None,
+                              help='Imágenes a indexar')
+    build_parser.add_argument('--from-store', type=str, default=None,
+                              help='Almacén de embeddings (detect_image.py --store-embeddings)')
+    build_parser.add_argument('--batch-size', type=int, default=16,
+                              help='Imágenes por pasada del backbone (default: 16)')
+    build_parser.add_argument('--chunk-size', type=int, default=65536,
+                              help='Embeddings por bloque al leer el almacén (default: 65536)')
+    build_parser.add_argument('--ivf-threshold', type=int, default=50000,
+                              help='Documentos a partir de los cuales se usa el índice '
+                                   'particionado (default: 50000, 0 = siempre exacto)')
+
+    query_parser = subparsers.add_parser('query', help='Buscar documentos similares')
+    query_parser.add_argument('images', nargs='+', help='Imágenes a consultar')
+    query_parser.add_argument('--k', type=int, default=5,
+                              help='Coincidencias por imagen (default: 5)')
+    query_parser.add_argument('--threshold', type=float, default=0.95,
+                              help='Similitud para marcar duplicado (default: 0.95)')
+    query_parser.add_argument('--json', action='store_true',
+                              help='Salida en formato JSON')
+
+    subparsers.add_parser('stats', help='Resumen del índice')
+
+    args = parser.parse_args()
+
+    try:
+        commands = {'build': command_build, 'query': command_query, 'stats': command_stats}
+        return commands[args.command](args)
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,67 @@
+"""
+Configuración de Gunicorn para AutoDocVision
+
+El modelo se carga y optimiza una sola vez en el proceso maestro
+(preload_app) y los workers lo heredan por copy-on-write al hacer fork.
+Cada worker ejecuta inferencias de calentamiento antes de aceptar tráfico.
+
+El control de admisión y los carriles de prioridad (cámara antes que cargas
+masivas) actúan dentro de cada worker, entre sus peticiones simultáneas: los
+workers son gthread con más hilos que ADMISSION_MAX_CONCURRENT para que se
+forme la cola que esos mecanismos ordenan y descartan. Con workers sync (un
+hilo) cada worker solo ve una petición a la vez y ninguno de los dos actúa.
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import os
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WORKERS', '2'))
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+# Por defecto: lugares de inferencia + cola de admisión + margen para /health,
+# /ready y estáticos, que no pasan por la admisión
+_admission_slots = (int(os.environ.get('ADMISSION_MAX_CONCURRENT', '2'))
+                    + int(os.environ.get('ADMISSION_MAX_QUEUE', '16')))
+threads = int(os.environ.get('THREADS') or _admission_slots + 4)
+timeout = int(os.environ.get('TIMEOUT', '60'))
+
+# Importar app.py (y cargar el modelo) en el maestro antes del fork
+preload_app = True
+
+
+def when_ready(server):
+    """Maestro listo, antes de crear workers"""
+    # Mover los objetos ya creados (modelo incluido) a la generación
+    # permanente para que el GC de los workers no toque sus páginas
+    gc.freeze()
+    server.log.info(f"Modelo precargado en el maestro (pid {os.getpid()})")
+
+    from app import app
+    max_concurrent = app.config['ADMISSION_MAX_CONCURRENT']
+    if server.cfg.worker_class_str == 'sync' or (server.cfg.worker_class_str == 'gthread'
+                                                 and server.cfg.threads <= max_concurrent):
+        server.log.warning(
+            f"Workers {server.cfg.worker_class_str} con {server.cfg.threads} hilo(s) y "
+            f"ADMISSION_MAX_CONCURRENT={max_concurrent}: cada worker atiende a lo sumo "
+            f"{min(server.cfg.threads, max_concurrent)} petición(es) a la vez, así que la "
+            f"cola de admisión (429/503) y los carriles de prioridad no actúan. Usar "
+            f"WORKER_CLASS=gthread y THREADS > ADMISSION_MAX_CONCURRENT"
+        )
+
+
+def post_worker_init(worker):
+    """Worker inicializado, antes de aceptar conexiones"""
+    from app import warmup_model, start_model_watcher, start_detection_store
+
+    if warmup_model():
+        worker.log.info(f"Worker {worker.pid} calentado y listo")
+    else:
+        worker.log.warning(f"Worker {worker.pid} sin calentamiento; /ready responderá 503")
+
+    # Los hilos no sobreviven al fork: el observador y el escritor del
+    # historial se inician en cada worker
+    start_model_watcher()
+    start_detection_store()
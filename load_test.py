@@ -0,0 +1,392 @@
+"""
+Load Test - Generador de carga HTTP para la API de detección
+
+Envía imágenes de una carpeta a un servidor app.py ya iniciado, en modo de
+concurrencia fija (lazo cerrado) o con tasa de llegada fija (lazo abierto),
+y reporta throughput, latencias p50/p95/p99 y tasas de error y de 503.
+
+Uso:
+    python load_test.py --images muestras/ --concurrency 8 --duration 30
+    python load_test.py --images muestras/ --rate 20 --duration 30
+    python load_test.py --images muestras/ --ramp 1,2,4,8,16 --duration 20
+    python load_test.py --images muestras/ --endpoint detect-camera --ramp-rate 5,10,20,40
+"""
+
+import argparse
+import base64
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tif', '.tiff'}
+
+
+def load_images(folder):
+    """
+    Carga en memoria las imágenes de una carpeta
+
+    Args:
+        folder (str): Carpeta con imágenes
+
+    Returns:
+        list: Lista de tuplas (nombre, bytes)
+
+    Raises:
+        FileNotFoundError: Si la carpeta no existe o no tiene imágenes
+    """
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"Carpeta no encontrada: {folder}")
+
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+            with open(os.path.join(folder, name), 'rb') as f:
+                images.append((name, f.read()))
+
+    if not images:
+        raise FileNotFoundError(f"No se encontraron imágenes en: {folder}")
+
+    logger.info(f"{len(images)} imágenes cargadas desde {folder}")
+    return images
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadResult:
+    """Acumulador thread-safe de resultados de una corrida"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.status_counts = {}
+        self.exceptions = 0
+
+    def record(self, latency, status_code):
+        """Registra una respuesta (status_code=None si hubo excepción)"""
+        with self._lock:
+            self.latencies.append(latency)
+            if status_code is None:
+                self.exceptions += 1
+            else:
+                self.status_counts[status_code] = self.status_counts.get(status_code, 0) + 1
+
+    def summary(self, elapsed, label):
+        """
+        Calcula el resumen de la corrida
+
+        Args:
+            elapsed (float): Duración efectiva en segundos
+            label (str): Descripción de la carga aplicada
+
+        Returns:
+            dict: Throughput, latencias y tasas de error
+        """
+        with self._lock:
+            total = len(self.latencies)
+            ok = sum(count for code, count in self.status_counts.items() if 200 <= code < 300)
+            unavailable = self.status_counts.get(503, 0)
+            errors = total - ok
+            latencies = sorted(self.latencies)
+
+        return {
+            'load': label,
+            'requests': total,
+            'ok': ok,
+            'errors': errors,
+            'status_503': unavailable,
+            'exceptions': self.exceptions,
+            'status_counts': {str(code): count for code, count in sorted(self.status_counts.items())},
+            'duration_s': round(elapsed, 3),
+            'throughput_rps': round(ok / elapsed, 3) if elapsed > 0 else 0.0,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'rate_503': round(unavailable / total, 4) if total else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50) * 1000, 2),
+                'p95': round(percentile(latencies, 0.95) * 1000, 2),
+                'p99': round(percentile(latencies, 0.99) * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2) if latencies else 0.0
+            }
+        }
+
+
+class LoadGenerator:
+    """Generador de carga contra /api/detect o /api/detect-camera"""
+
+    def __init__(self, base_url, images, endpoint='detect', confidence=0.7, timeout=30.0):
+        """
+        Inicializa el generador
+
+        Args:
+            base_url (str): URL base del servidor (ej. http://127.0.0.1:5000)
+            images (list): Lista de tuplas (nombre, bytes)
+            endpoint (str): 'detect' (multipart) o 'detect-camera' (JSON base64)
+            confidence (float): Umbral enviado en cada petición
+            timeout (float): Timeout por petición en segundos
+        """
+        if endpoint not in ('detect', 'detect-camera'):
+            raise ValueError("endpoint debe ser 'detect' o 'detect-camera'")
+
+        self.url = f"{base_url.rstrip('/')}/api/{endpoint}"
+        self.endpoint = endpoint
+        self.images = images
+        self.confidence = confidence
+        self.timeout = timeout
+        self._local = threading.local()
+
+        # Pre-codificar frames para no medir base64 del lado del cliente
+        if endpoint == 'detect-camera':
+            self._frames = [
+                'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii')
+                for _, data in images
+            ]
+
+    def _session(self):
+        """Sesión HTTP por hilo (keep-alive)"""
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _send(self, index):
+        """Envía una petición y retorna el status code"""
+        session = self._session()
+        if self.endpoint == 'detect':
+            name, data = self.images[index % len(self.images)]
+            response = session.post(self.url, files={'image': (name, data)},
+                                    data={'confidence': str(self.confidence)},
+                                    timeout=self.timeout)
+        else:
+            frame = self._frames[index % len(self._frames)]
+            response = session.post(self.url, json={'frame_data': frame,
+                                                    'confidence': self.confidence},
+                                    timeout=self.timeout)
+        return response.status_code
+
+    def _timed_send(self, index, result, scheduled_at=None):
+        """Envía y registra la latencia (desde el instante programado si se indica)"""
+        start = scheduled_at if scheduled_at is not None else time.perf_counter()
+        try:
+            status = self._send(index)
+        except requests.RequestException as e:
+            logger.debug(f"Petición fallida: {e}")
+            status = None
+        result.record(time.perf_counter() - start, status)
+
+    def run_closed(self, concurrency, duration):
+        """
+        Lazo cerrado: N clientes que envían en cuanto reciben respuesta
+
+        Args:
+            concurrency (int): Número de clientes simultáneos
+            duration (float): Duración en segundos
+
+        Returns:
+            dict: Resumen de la corrida
+        """
+        result = LoadResult()
+        deadline = time.perf_counter() + duration
+        counter = iter(range(10 ** 12))
+        counter_lock = threading.Lock()
+
+        def client():
+            while time.perf_counter() < deadline:
+                with counter_lock:
+                    index = next(counter)
+                self._timed_send(index, result)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return result.summary(time.perf_counter() - start, f"concurrency={concurrency}")
+
+    def run_open(self, rate, duration, poisson=True, max_workers=256):
+        """
+        Lazo abierto: llegadas a tasa fija independientes de la respuesta
+
+        La latencia se mide desde el instante programado de llegada, para que
+        la espera en el cliente cuando el servidor se satura cuente en el
+        resultado (evita la omisión coordinada).
+
+        Args:
+            rate (float): Peticiones por segundo
+            duration (float): Duración en segundos
+            poisson (bool): Llegadas exponenciales (True) o uniformes (False)
+            max_workers (int): Máximo de peticiones simultáneas en vuelo
+
+        Returns:
+            dict: Resumen de la corrida
+        """
+        if rate <= 0:
+            raise ValueError("La tasa debe ser mayor que 0")
+
+        result = LoadResult()
+        rng = random.Random(0)
+        start = time.perf_counter()
+        next_arrival = start
+        index = 0
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while next_arrival < start + duration:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self._timed_send, index, result, next_arrival)
+                index += 1
+                next_arrival += rng.expovariate(rate) if poisson else 1.0 / rate
+
+        return result.summary(time.perf_counter() - start, f"rate={rate}")
+
+
+def find_saturation(runs, max_error_rate=0.01, min_gain=0.05):
+    """
+    Estima el punto de saturación de una rampa
+
+    Es el último nivel cuyo throughput mejora al menos min_gain respecto al
+    mejor nivel anterior sin superar max_error_rate.
+
+    Args:
+        runs (list): Resúmenes en orden creciente de carga
+        max_error_rate (float): Tasa de error máxima aceptable
+        min_gain (float): Mejora relativa mínima para considerar que escala
+
+    Returns:
+        dict: Resumen del nivel de saturación o None
+    """
+    best = None
+    for run in runs:
+        if run['error_rate'] > max_error_rate:
+            break
+        if best is None or run['throughput_rps'] >= best['throughput_rps'] * (1 + min_gain):
+            best = run
+    return best
+
+
+def print_summary(summary):
+    """Imprime resumen de una corrida"""
+    latency = summary['latency_ms']
+    print(f"{summary['load']:<18} {summary['throughput_rps']:>8.2f} rps  "
+          f"p50 {latency['p50']:>8.1f}ms  p95 {latency['p95']:>8.1f}ms  "
+          f"p99 {latency['p99']:>8.1f}ms  errores {summary['error_rate']:>6.1%}  "
+          f"503 {summary['rate_503']:>6.1%}  ({summary['requests']} peticiones)")
+
+
+def parse_levels(text, cast):
+    """Convierte '1,2,4' en lista de niveles"""
+    return [cast(value) for value in text.split(',') if value.strip()]
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Prueba de carga HTTP para la API de detección'
+    )
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:5000',
+                        help='URL base del servidor (default: http://127.0.0.1:5000)')
+    parser.add_argument('--images', type=str, required=True,
+                        help='Carpeta con imágenes a enviar')
+    parser.add_argument('--endpoint', type=str, default='detect',
+                        choices=['detect', 'detect-camera'],
+                        help='Endpoint a probar (default: detect)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Clientes simultáneos en lazo cerrado (default: 4)')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Tasa de llegada en peticiones/s (activa lazo abierto)')
+    parser.add_argument('--uniform', action='store_true',
+                        help='Llegadas uniformes en lugar de Poisson (lazo abierto)')
+    parser.add_argument('--ramp', type=str, default=None,
+                        help='Rampa de concurrencias, ej. 1,2,4,8,16')
+    parser.add_argument('--ramp-rate', type=str, default=None,
+                        help='Rampa de tasas de llegada, ej. 5,10,20,40')
+    parser.add_argument('--duration', type=float, default=20.0,
+                        help='Duración de cada corrida en segundos (default: 20)')
+    parser.add_argument('--confidence', type=float, default=0.7,
+                        help='Umbral de confianza enviado (default: 0.7)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Timeout por petición en segundos (default: 30)')
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help='Error máximo aceptable en rampas (default: 0.01)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Guardar resultados en JSON')
+
+    args = parser.parse_args()
+
+    try:
+        images = load_images(args.images)
+        generator = LoadGenerator(args.url, images, args.endpoint,
+                                  args.confidence, args.timeout)
+
+        # Verificar que el servidor responde antes de generar carga
+        requests.get(f"{args.url.rstrip('/')}/health", timeout=5).raise_for_status()
+
+        runs = []
+        if args.ramp:
+            for level in parse_levels(args.ramp, int):
+                runs.append(generator.run_closed(level, args.duration))
+                print_summary(runs[-1])
+        elif args.ramp_rate:
+            for level in parse_levels(args.ramp_rate, float):
+                runs.append(generator.run_open(level, args.duration, poisson=not args.uniform))
+                print_summary(runs[-1])
+        elif args.rate:
+            runs.append(generator.run_open(args.rate, args.duration, poisson=not args.uniform))
+            print_summary(runs[-1])
+        else:
+            runs.append(generator.run_closed(args.concurrency, args.duration))
+            print_summary(runs[-1])
+
+        output = {
+            'timestamp': datetime.now().isoformat(),
+            'url': generator.url,
+            'images': len(images),
+            'runs': runs
+        }
+
+        if len(runs) > 1:
+            saturation = find_saturation(runs, args.max_error_rate)
+            output['saturation'] = saturation
+            if saturation:
+                print(f"\nPunto de saturación estimado: {saturation['load']} "
+                      f"({saturation['throughput_rps']:.2f} rps, "
+                      f"p99 {saturation['latency_ms']['p99']:.1f}ms)")
+            else:
+                print("\nNingún nivel cumplió el límite de errores")
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(output, f, indent=2, ensure_ascii=False)
+            logger.info(f"Resultados guardados en: {args.output}")
+
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,175 @@
+"""
+Rescore - Re-clasificación del archivo con una cabeza nueva
+
+Aplica la cabeza Dense de un modelo (por ejemplo, uno re-entrenado en
+Teachable Machine con clases nuevas) a los embeddings guardados con
+`detect_image.py --store-embeddings`, sin volver a ejecutar el backbone.
+Los embeddings se leen por bloques desde el archivo mapeado y cada bloque es
+una multiplicación de matrices.
+
+Uso:
+    python detect_image.py --batch archivo/*.jpg --store-embeddings embeddings/
+    python rescore.py --store embeddings/ --model "NUEVO MODELO" --output resultados.csv
+"""
+
+import argparse
+import csv
+import json
+import logging
+import time
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+import numpy as np
+
+from utils.model_loader import ModelLoader
+from utils.embedding_store import EmbeddingStore
+
+
+def rescore(store, model, chunk_size=65536):
+    """
+    Clasifica todos los embeddings del almacén con la cabeza del modelo
+
+    Args:
+        store (EmbeddingStore): Almacén de embeddings
+        model (TFJSModel): Modelo cuya cabeza se aplica
+        chunk_size (int): Filas por bloque
+
+    Yields:
+        tuple: (fila inicial, índices de clase (n,), confianzas (n,), probabilidades (n, C))
+    """
+    for start, features in store.iter_chunks(chunk_size):
+        probabilities = model.classify_features(features)
+        indices = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(indices)), indices]
+        yield start, indices, confidences, probabilities
+
+
+def main():
+    """Función principal"""
+
+    parser = argparse.ArgumentParser(
+        description='Re-clasificar embeddings guardados con una cabeza nueva'
+    )
+    parser.add_argument('--store', type=str, required=True,
+                        help='Carpeta del almacén de embeddings')
+    parser.add_argument('--model', type=str, default='RECONOCIMIENTO DE DOCUMENTOS',
+                        help='Carpeta del modelo con la cabeza a aplicar')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Archivo .csv o .jsonl con una fila por imagen')
+    parser.add_argument('--confidence', type=float, default=0.5,
+                        help='Umbral de confianza (0-1, default: 0.5)')
+    parser.add_argument('--chunk-size', type=int, default=65536,
+                        help='Embeddings por bloque (default: 65536)')
+    parser.add_argument('--all-probs', action='store_true',
+                        help='Incluir probabilidades de todas las clases en la salida')
+    parser.add_argument('--force', action='store_true',
+                        help='Aplicar aunque el backbone del modelo no coincida con el del almacén')
+
+    args = parser.parse_args()
+
+    try:
+        store = EmbeddingStore(args.store, readonly=True)
+        loader = ModelLoader(args.model)
+        model = loader.get_model()
+        if model is None:
+            logger.error("El modelo no se pudo cargar; se requiere model.json y weights.bin")
+            return 1
+
+        if model.feature_dim != store.dim:
+            logger.error(f"La cabeza espera embeddings de dimensión {model.feature_dim}, "
+                         f"el almacén tiene {store.dim}")
+            return 1
+        if store.backbone_hash and model.backbone_hash != store.backbone_hash:
+            message = "El backbone del modelo no coincide con el que generó los embeddings"
+            if not args.force:
+                logger.error(f"{message} (usar --force para aplicarlo de todos modos)")
+                return 1
+            logger.warning(message)
+
+        class_names = loader.get_class_names()
+        counts = np.zeros(len(class_names), dtype=np.int64)
+        above_threshold = 0
+        compute_time = 0.0
+
+        writer = None
+        output_file = None
+        if args.output:
+            sources = store.sources()
+            output_file = open(args.output, 'w', encoding='utf-8', newline='')
+            if not args.output.endswith('.jsonl'):
+                writer = csv.writer(output_file)
+                header = ['hash', 'source', 'class', 'class_index', 'confidence', 'above_threshold']
+                writer.writerow(header + (class_names if args.all_probs else []))
+
+        logger.info(f"Re-clasificando {store.count} embeddings con {args.model}...")
+        start_time = time.time()
+        try:
+            chunks = rescore(store, model, args.chunk_size)
+            while True:
+                chunk_start = time.time()
+                try:
+                    start, indices, confidences, probabilities = next(chunks)
+                except StopIteration:
+                    break
+                compute_time += time.time() - chunk_start
+
+                counts += np.bincount(indices, minlength=len(class_names))
+                above_threshold += int((confidences >= args.confidence).sum())
+
+                if output_file is None:
+                    continue
+                hashes = store.hashes(start, start + len(indices))
+                for row, (key, index, confidence) in enumerate(zip(hashes, indices, confidences)):
+                    record = {
+                        'hash': key,
+                        'source': sources[start + row],
+                        'class': class_names[index],
+                        'class_index': int(index),
+                        'confidence': round(float(confidence), 4),
+                        'above_threshold': bool(confidence >= args.confidence)
+                    }
+                    if writer is not None:
+                        values = list(record.values())
+                        if args.all_probs:
+                            values += [round(float(p), 6) for p in probabilities[row]]
+                        writer.writerow(values)
+                    else:
+                        if args.all_probs:
+                            record['all_probabilities'] = probabilities[row].round(6).tolist()
+                        output_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        finally:
+            if output_file is not None:
+                output_file.close()
+
+        elapsed_time = time.time() - start_time
+        rate = store.count / compute_time if compute_time > 0 else 0.0
+
+        print(f"\n{'='*60}")
+        print(f"RE-CLASIFICACIÓN - AutoDocVision")
+        print(f"{'='*60}")
+        print(f"Embeddings: {store.count}")
+        print(f"Tiempo de cómputo: {compute_time:.3f}s ({rate:,.0f} embeddings/s)")
+        print(f"Tiempo total: {elapsed_time:.3f}s")
+        print(f"Encima del umbral ({args.confidence}): {above_threshold}")
+        print(f"\nDistribución de clases:")
+        for class_name, count in zip(class_names, counts):
+            print(f"  {class_name}: {count}")
+        if args.output:
+            print(f"\nResultados guardados en: {args.output}")
+        print(f"{'='*60}\n")
+
+        return 0
+
+    except Exception as e:
+        logger.error(f"Error fatal: {e}")
+        return 1
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -11,6 +11,17 @@ let selectedFile = null;
 let detectionHistory = JSON.parse(localStorage.getItem('detectionHistory')) || [];
 let cameraStream = null;
 let cameraActive = false;
+// Identifica esta pestaña ante el servidor: solo se atiende su cuadro más reciente
+const cameraSessionId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+
+// Inferencia híbrida: modelo TF.js local (ver /api/model-info -> edge)
+let edgeModel = null;
+let edgeConfig = null;
+let edgeClassNames = [];
+let edgeLocalFrames = 0;
+
+// Lado de entrada del modelo (imageSize de /api/model-info) para reducir cargas
+let modelImageSize = null;
 
 // ============================================================================
 // FUNCIONALIDAD DE CARGAS
@@ -75,6 +86,59 @@ function handleFileSelect(file) {
     reader.readAsDataURL(file);
 }
 
+// Lado de entrada del modelo; null si no se pudo consultar
+async function getModelImageSize() {
+    if (modelImageSize === null) {
+        try {
+            const response = await fetch('/api/model-info');
+            const data = await response.json();
+            modelImageSize = data.success ? data.image_size : null;
+        } catch (error) {
+            console.warn('No se pudo consultar /api/model-info:', error);
+        }
+    }
+    return modelImageSize;
+}
+
+// Reduce la foto al tamaño de entrada del modelo antes de subirla.
+// El servidor estira la imagen a imageSize x imageSize igual que aquí, así que
+// recibe la imagen ya dimensionada y omite su propio resize.
+async function downscaleForUpload(file) {
+    // TIFF/GIF pueden tener varias páginas: se suben completos
+    if (!/^image\/(jpeg|png|bmp|webp)$/.test(file.type) || typeof createImageBitmap === 'undefined') {
+        return file;
+    }
+
+    try {
+        const size = await getModelImageSize();
+        if (!size) return file;
+
+        const bitmap = await createImageBitmap(file);
+        if (bitmap.width <= size && bitmap.height <= size) {
+            bitmap.close();
+            return file;
+        }
+
+        const canvas = typeof OffscreenCanvas !== 'undefined'
+            ? new OffscreenCanvas(size, size)
+            : Object.assign(document.createElement('canvas'), { width: size, height: size });
+        const ctx = canvas.getContext('2d');
+        ctx.imageSmoothingEnabled = true;
+        ctx.imageSmoothingQuality = 'high';
+        ctx.drawImage(bitmap, 0, 0, size, size);
+        bitmap.close();
+
+        const blob = canvas.convertToBlob
+            ? await canvas.convertToBlob({ type: 'image/jpeg', quality: 0.95 })
+            : await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.95));
+        console.debug(`Carga reducida: ${file.size} -> ${blob.size} bytes`);
+        return new File([blob], file.name.replace(/\.[^.]+$/, '') + '.jpg', { type: 'image/jpeg' });
+    } catch (error) {
+        console.warn('No se pudo reducir la imagen; se sube la original:', error);
+        return file;
+    }
+}
+
 // Cargar y procesar imagen
 async function uploadImage() {
     if (!selectedFile) {
@@ -84,15 +148,19 @@ async function uploadImage() {
 
     const confidence = parseInt(document.getElementById('confidenceSlider').value) / 100;
     
+    showLoader(true);
+
     const formData = new FormData();
-    formData.append('image', selectedFile);
+    formData.append('image', await downscaleForUpload(selectedFile));
     formData.append('confidence', confidence);
 
-    showLoader(true);
-
     try {
         const response = await fetch('/api/detect', {
             method: 'POST',
+            // Hay una persona esperando: carril interactivo, no el de cargas masivas
+            headers: {
+                'X-Priority': 'interactive'
+            },
             body: formData
         });
 
@@ -176,43 +244,263 @@ function updateCameraUI() {
     document.getElementById('captureBtn').style.display = cameraActive ? 'block' : 'none';
 }
 
+// ============================================================================
+// INFERENCIA HÍBRIDA (TF.js EN EL NAVEGADOR)
+// ============================================================================
+
+function loadScript(src) {
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = src;
+        script.onload = resolve;
+        script.onerror = () => reject(new Error('No se pudo cargar ' + src));
+        document.head.appendChild(script);
+    });
+}
+
+// Carga el modelo local si el servidor tiene habilitado el modo híbrido
+async function loadEdgeModel() {
+    try {
+        const response = await fetch('/api/model-info');
+        const data = await response.json();
+        if (!data.success || !data.edge || !data.edge.enabled) {
+            edgeModel = null;
+            return;
+        }
+
+        if (typeof tf === 'undefined') {
+            await loadScript(data.edge.tfjs_url);
+        }
+
+        // La URL versionada se cachea como immutable: solo se descarga una vez por versión
+        const model = await tf.loadLayersModel(data.edge.model_url);
+        const size = data.edge.image_size;
+        tf.tidy(() => model.predict(tf.zeros([1, size, size, 3])));
+
+        edgeConfig = { ...data.edge, version: data.model_version };
+        edgeClassNames = data.model_info.labels || [];
+        edgeModel = model;
+        console.log('Modelo local cargado, versión ' + edgeConfig.version);
+    } catch (error) {
+        // Sin modelo local todos los cuadros se envían al servidor
+        console.warn('Inferencia local no disponible:', error);
+        edgeModel = null;
+    }
+}
+
+// Clasifica el cuadro con el mismo preprocesamiento que el servidor
+async function classifyLocally(canvas) {
+    const size = edgeConfig.image_size;
+    const output = tf.tidy(() => {
+        const pixels = tf.browser.fromPixels(canvas);
+        const resized = tf.image.resizeBilinear(pixels, [size, size]);
+        // Normalización de Teachable Machine: [-1, 1]
+        const input = resized.toFloat().div(127.5).sub(1).expandDims(0);
+        return edgeModel.predict(input);
+    });
+    const probabilities = await output.data();
+    output.dispose();
+
+    let best = 0;
+    for (let i = 1; i < probabilities.length; i++) {
+        if (probabilities[i] > probabilities[best]) best = i;
+    }
+    return {
+        class: edgeClassNames[best] || ('Clase ' + best),
+        confidence: probabilities[best]
+    };
+}
+
+function showCameraResult(className, confidence, source) {
+    document.getElementById('cameraResultClass').textContent = className;
+    document.getElementById('cameraResultConfidence').textContent = (confidence * 100).toFixed(2) + '%';
+    document.getElementById('cameraResultSource').textContent = source;
+    document.getElementById('cameraResultSection').style.display = 'block';
+}
+
+// ============================================================================
+// CONTROL ADAPTATIVO DE CUADROS DE CÁMARA
+// ============================================================================
+
+// Ajusta intervalo, resolución y calidad JPEG según la latencia medida y la
+// cola reportada por el servidor: con el servidor saturado se envían menos
+// cuadros y más pequeños en lugar de acumular peticiones.
+const cameraAdaptive = {
+    maxInFlight: 2,
+    targetLatency: 400,       // ms de ida y vuelta aceptables
+    interval: 500,            // ms entre capturas
+    minInterval: 150,
+    maxInterval: 3000,
+    widths: [960, 640, 480, 320, 224],
+    widthIndex: 1,
+    quality: 0.8,
+    minQuality: 0.5,
+    maxQuality: 0.9,
+    inFlight: 0,
+    rtt: null,                // promedio móvil de la latencia
+    pausedUntil: 0,
+    resultTimes: []
+};
+
+function resetCameraAdaptive() {
+    Object.assign(cameraAdaptive, {
+        interval: 500, widthIndex: 1, quality: 0.8,
+        inFlight: 0, rtt: null, pausedUntil: 0, resultTimes: []
+    });
+}
+
+// Servidor lento o con cola: primero espaciar cuadros, luego reducir resolución y calidad
+function degradeCameraQuality() {
+    const c = cameraAdaptive;
+    if (c.interval < c.maxInterval) {
+        c.interval = Math.min(c.maxInterval, c.interval * 1.25);
+    }
+    if (c.interval >= 1000 && c.widthIndex < c.widths.length - 1) {
+        c.widthIndex++;
+    } else if (c.interval >= 1000 && c.quality > c.minQuality) {
+        c.quality = Math.max(c.minQuality, c.quality - 0.1);
+    }
+}
+
+// Servidor holgado: recuperar en orden inverso
+function improveCameraQuality() {
+    const c = cameraAdaptive;
+    if (c.quality < c.maxQuality) {
+        c.quality = Math.min(c.maxQuality, c.quality + 0.05);
+    } else if (c.widthIndex > 1) {
+        c.widthIndex--;
+    } else {
+        c.interval = Math.max(c.minInterval, c.interval * 0.9);
+    }
+}
+
+function recordCameraResult() {
+    const now = performance.now();
+    const times = cameraAdaptive.resultTimes;
+    times.push(now);
+    while (times.length && now - times[0] > 2000) times.shift();
+    updateCameraStats();
+}
+
+function updateCameraStats() {
+    const c = cameraAdaptive;
+    const now = performance.now();
+    while (c.resultTimes.length && now - c.resultTimes[0] > 2000) c.resultTimes.shift();
+    const fps = c.resultTimes.length / 2;
+    const rtt = c.rtt === null ? '-' : Math.round(c.rtt) + ' ms';
+    document.getElementById('cameraFps').textContent =
+        `${fps.toFixed(1)} FPS · ${c.widths[c.widthIndex]}px · JPEG ${Math.round(c.quality * 100)} · RTT ${rtt}`;
+}
+
+async function sendCameraFrame(canvas, edgePrediction) {
+    const c = cameraAdaptive;
+    const imageData = canvas.toDataURL('image/jpeg', c.quality);
+    const sentAt = performance.now();
+    c.inFlight++;
+
+    try {
+        const response = await fetch('/api/detect-camera', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                frame_data: imageData,
+                session_id: cameraSessionId,
+                edge_prediction: edgePrediction,
+                // Un cuadro que tarda más que esto ya no sirve: el servidor lo descarta
+                deadline_ms: Math.round(Math.max(1000, c.interval * 3))
+            })
+        });
+
+        const elapsed = performance.now() - sentAt;
+        c.rtt = c.rtt === null ? elapsed : 0.7 * c.rtt + 0.3 * elapsed;
+        const data = await response.json();
+
+        if (response.status === 429 || response.status === 503) {
+            // Saturado: respetar Retry-After y degradar
+            const retryAfter = parseFloat(response.headers.get('Retry-After') || '1');
+            c.pausedUntil = performance.now() + retryAfter * 1000;
+            degradeCameraQuality();
+        } else if (data.success) {
+            showCameraResult(data.class, data.confidence, 'Servidor');
+            recordCameraResult();
+
+            if (c.rtt > c.targetLatency || data.queue_depth > 0) {
+                degradeCameraQuality();
+            } else if (c.rtt < c.targetLatency / 2) {
+                improveCameraQuality();
+            }
+
+            // El servidor cambió de versión: recargar el modelo local
+            if (edgeModel && data.model_version !== edgeConfig.version) {
+                edgeModel = null;
+                loadEdgeModel();
+            }
+        }
+        // 409: un cuadro más nuevo de esta sesión lo reemplazó; no es un error
+    } catch (error) {
+        console.error('Error en detección de cámara:', error);
+        degradeCameraQuality();
+    } finally {
+        c.inFlight--;
+    }
+}
+
 async function startCameraDetection() {
     const video = document.getElementById('cameraVideo');
     const canvas = document.getElementById('cameraCanvas');
     const ctx = canvas.getContext('2d');
 
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
+    resetCameraAdaptive();
+
+    if (!edgeModel) {
+        loadEdgeModel();
+    }
 
     const detectFrame = async () => {
         if (!cameraActive) return;
+        const c = cameraAdaptive;
 
         try {
-            ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-            const imageData = canvas.toDataURL('image/jpeg');
-
-            const response = await fetch('/api/detect-camera', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    frame_data: imageData
-                })
-            });
-
-            const data = await response.json();
-
-            if (data.success) {
-                document.getElementById('cameraResultClass').textContent = data.class;
-                document.getElementById('cameraResultConfidence').textContent = (data.confidence * 100).toFixed(2) + '%';
-                document.getElementById('cameraResultSection').style.display = 'block';
+            // Sin lugar para otro cuadro o en pausa por Retry-After: saltar esta captura
+            if (c.inFlight < c.maxInFlight && performance.now() >= c.pausedUntil) {
+                const width = Math.min(video.videoWidth, c.widths[c.widthIndex]);
+                canvas.width = width;
+                canvas.height = Math.round(video.videoHeight * width / video.videoWidth);
+                ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+
+                // Modo híbrido: resolver en el navegador los cuadros seguros
+                let edgePrediction = null;
+                if (edgeModel) {
+                    const local = await classifyLocally(canvas);
+                    const uncertain = local.confidence < edgeConfig.escalation_confidence;
+                    if (!uncertain && Math.random() >= edgeConfig.audit_rate) {
+                        edgeLocalFrames++;
+                        showCameraResult(local.class, local.confidence, 'Navegador');
+                        recordCameraResult();
+                    } else {
+                        edgePrediction = {
+                            class: local.class,
+                            confidence: local.confidence,
+                            reason: uncertain ? 'uncertain' : 'audit',
+                            local_frames: edgeLocalFrames
+                        };
+                        edgeLocalFrames = 0;
+                    }
+                }
+
+                if (!edgeModel || edgePrediction) {
+                    // Sin await: la siguiente captura no espera la respuesta
+                    sendCameraFrame(canvas, edgePrediction);
+                }
             }
+            updateCameraStats();
         } catch (error) {
             console.error('Error en detección de cámara:', error);
         }
 
-        setTimeout(detectFrame, 500); // Detectar cada 500ms
+        setTimeout(detectFrame, c.interval);
     };
 
     detectFrame();
@@ -1,9 +1,39 @@
 """
 Módulo de utilidades - Inicializador del paquete utils
+
+Las clases se importan bajo demanda para que módulos ligeros del paquete
+(como el cliente del daemon de inferencia) no carguen OpenCV/NumPy.
 """
 
-from .model_loader import ModelLoader
-from .image_processor import ImageProcessor
-from .predictor import Predictor
+import importlib
+
+_EXPORTS = {
+    'ModelLoader': '.model_loader',
+    'ImageProcessor': '.image_processor',
+    'Predictor': '.predictor',
+    'InferenceDaemon': '.inference_daemon',
+    'DaemonClient': '.inference_daemon',
+    'EmbeddingStore': '.embedding_store',
+    'SimilarityIndex': '.similarity_index',
+    'RegionDetector': '.region_detector',
+    'PageReader': '.page_reader',
+    'AdmissionController': '.admission',
+    'InferenceScheduler': '.inference_scheduler',
+    'CaptureWriter': '.capture_writer',
+    'SessionRecorder': '.frame_source',
+    'ReplaySource': '.frame_source',
+    'WorkQueue': '.work_queue',
+    'DetectionStore': '.detection_store',
+    'InferenceBackend': '.backends',
+    'StackSampler': '.profiler',
+    'AssetManifest': '.static_assets',
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = ['ModelLoader', 'ImageProcessor', 'Predictor']
+def __getattr__(name):
+    if name in _EXPORTS:
+        module = importlib.import_module(_EXPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,179 @@
+"""
+Admission Controller - Control de admisión por plazo y descarte de carga
+
+Limita las inferencias simultáneas de un worker y decide, al llegar cada
+petición, si puede terminar antes de su plazo (deadline) con la cola actual.
+Las que no pueden se rechazan de inmediato con Retry-After en lugar de
+esperar y consumir CPU para un cliente que ya se fue. Las que ya vencieron
+se descartan antes de decodificar y antes de inferir. El orden de atención
+entre carriles lo decide InferenceScheduler.
+
+Los límites son por proceso y solo actúan si el worker atiende varias
+peticiones a la vez (gunicorn gthread con THREADS > max_concurrent); con
+workers sync de un hilo solo queda el descarte de peticiones ya vencidas.
+gunicorn.conf.py avisa al arrancar si la configuración no lo permite.
+"""
+
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from .inference_scheduler import InferenceScheduler, TicketCancelled, LANES, BULK
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Petición rechazada por el control de admisión"""
+
+    def __init__(self, status, reason, retry_after):
+        """
+        Args:
+            status (int): Código HTTP sugerido (409, 429 o 503)
+            reason (str): 'deadline', 'queue_full', 'expired_before_admission',
+                          'expired_in_queue' o 'superseded'
+            retry_after (int): Segundos sugeridos para reintentar
+        """
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Control de admisión sobre el planificador de inferencia
+    """
+
+    def __init__(self, max_concurrent=2, max_queue=16, initial_service_time=0.05, alpha=0.2,
+                 bulk_min_share=0.2):
+        """
+        Inicializa el controlador
+
+        Args:
+            max_concurrent (int): Peticiones atendidas a la vez
+            max_queue (int): Peticiones esperando turno como máximo
+            initial_service_time (float): Segundos por petición antes de medir
+            alpha (float): Peso de la última medición en el promedio móvil
+            bulk_min_share (float): Fracción mínima de lugares del carril bulk
+        """
+        self.max_queue = max(0, max_queue)
+        self.alpha = alpha
+        self.scheduler = InferenceScheduler(max_concurrent, bulk_min_share)
+        # Tiempo de servicio por carril (los cuadros de cámara son más baratos)
+        self.service_time = {lane: initial_service_time for lane in LANES}
+
+        self.served = 0
+        self.shed = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrent(self):
+        return self.scheduler.max_concurrent
+
+    def estimate_wait(self, lane=BULK):
+        """
+        Segundos estimados de espera para una petición que llega ahora
+
+        Args:
+            lane (str): Carril de la petición
+
+        Returns:
+            float: 0 si hay un lugar libre
+        """
+        return self.scheduler.estimate_wait(lane, self.service_time[lane])
+
+    def _retry_after(self, wait):
+        return max(1, math.ceil(wait))
+
+    def _count_shed(self, reason):
+        with self._lock:
+            self.shed[reason] = self.shed.get(reason, 0) + 1
+
+    @contextmanager
+    def admit(self, deadline=None, lane=BULK, session_id=None):
+        """
+        Espera un lugar libre o rechaza la petición
+
+        Args:
+            deadline (float): Plazo absoluto (time.time()) o None sin plazo
+            lane (str): Carril del planificador ('interactive' o 'bulk')
+            session_id (str): Sesión de cámara (solo carril interactivo)
+
+        Yields:
+            float: Segundos que la petición esperó en la cola
+
+        Raises:
+            AdmissionRejected: Si la cola está llena, si la espera estimada
+                               no cabe en el plazo, si el plazo vence en la
+                               cola o si llegó un cuadro más nuevo de la sesión
+        """
+        arrival = time.time()
+        wait = self.estimate_wait(lane)
+        if deadline is not None and deadline <= arrival:
+            # Venció en la cola del servidor (X-Request-Start) antes de llegar aquí
+            self._count_shed('expired_before_admission')
+            raise AdmissionRejected(503, 'expired_before_admission', self._retry_after(wait))
+        if wait > 0 and self.scheduler.depth() >= self.max_queue:
+            self._count_shed('queue_full')
+            raise AdmissionRejected(503, 'queue_full', self._retry_after(wait))
+        if deadline is not None and arrival + wait + self.service_time[lane] > deadline:
+            self._count_shed('deadline')
+            raise AdmissionRejected(429, 'deadline', self._retry_after(wait))
+
+        try:
+            with self.scheduler.slot(lane, session_id, deadline) as waited:
+                start_time = time.time()
+                try:
+                    yield waited
+                finally:
+                    elapsed_time = time.time() - start_time
+                    with self._lock:
+                        self.served += 1
+                        self.service_time[lane] += self.alpha * (elapsed_time -
+                                                                 self.service_time[lane])
+        except TicketCancelled as e:
+            # Solo se lanza al esperar turno, nunca desde el cuerpo de la petición
+            self._count_shed(e.reason)
+            if e.reason == 'superseded':
+                raise AdmissionRejected(409, e.reason, 0)
+            raise AdmissionRejected(503, e.reason, self._retry_after(self.estimate_wait(lane)))
+
+    def expired(self, deadline, stage):
+        """
+        Indica si el plazo ya venció y, de ser así, cuenta el descarte
+
+        Args:
+            deadline (float): Plazo absoluto o None
+            stage (str): Etapa en la que se revisa ('decode', 'inference', ...)
+
+        Returns:
+            bool: True si la petición debe descartarse
+        """
+        if deadline is None or time.time() < deadline:
+            return False
+        self._count_shed(f'expired_before_{stage}')
+        logger.info(f"Petición descartada antes de {stage}: plazo vencido")
+        return True
+
+    def stats(self):
+        """Contadores de admisión y estado de los carriles"""
+        with self._lock:
+            stats = {
+                'max_queue': self.max_queue,
+                'served': self.served,
+                'shed': dict(self.shed),
+                'shed_total': sum(self.shed.values()),
+                'service_time_ms': {lane: round(seconds * 1000, 2)
+                                    for lane, seconds in self.service_time.items()}
+            }
+        stats['estimated_wait_ms'] = {lane: round(self.estimate_wait(lane) * 1000, 2)
+                                      for lane in LANES}
+        stats.update(self.scheduler.stats())
+        return stats
+
+    def __repr__(self):
+        return (f"AdmissionController(max_concurrent={self.max_concurrent}, "
+                f"max_queue={self.max_queue})")
@@ -0,0 +1,259 @@
+"""
+Backends - Motores de inferencia intercambiables
+
+Todos los backends reciben el mismo lote NHWC en [0, 1] (salida de
+ImageProcessor) y devuelven probabilidades (N, num_classes):
+
+- numpy: TFJSModel, el motor de referencia (siempre disponible)
+- onnxruntime: ONNX Runtime en CPU sobre el modelo convertido (onnx_export.py)
+- opencv: cv2.dnn sobre el mismo modelo convertido
+
+select_backend mide cada backend disponible con un lote de muestra y elige
+el más rápido cuyas probabilidades coinciden con las de referencia. Solo la
+predicción completa (Predictor._forward) usa el backend elegido; embeddings,
+regiones y cabezas múltiples siguen en el motor NumPy.
+"""
+
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .onnx_export import INPUT_NAME, cached_onnx_path, onnx_available
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('numpy', 'onnxruntime', 'opencv')
+
+
+class InferenceBackend:
+    """
+    Interfaz de un motor de inferencia
+    """
+
+    name = 'base'
+
+    def predict(self, images):
+        """
+        Probabilidades de un lote
+
+        Args:
+            images (np.array): Lote (N, H, W, 3) float32 en [0, 1]
+
+        Returns:
+            np.array: Probabilidades (N, num_classes)
+        """
+        raise NotImplementedError
+
+    def supports(self, shape):
+        """True si el backend acepta un lote con esta forma"""
+        return True
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+
+class NumpyBackend(InferenceBackend):
+    """Motor de referencia: TFJSModel"""
+
+    name = 'numpy'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, images):
+        return self.model.predict(images)
+
+
+class _ProcessLocalBackend(InferenceBackend):
+    """
+    Backend cuya sesión nativa se crea por proceso
+
+    Los hilos internos de ONNX Runtime y OpenCV no sobreviven al fork de
+    gunicorn: la sesión creada en el maestro (para la medición) se descarta
+    en cada worker y se crea de nuevo en su primera predicción.
+    """
+
+    def __init__(self, onnx_path):
+        self.onnx_path = onnx_path
+        self._session = None
+        self._pid = None
+        self._session_for_process()
+
+    def _create_session(self):
+        raise NotImplementedError
+
+    def _session_for_process(self):
+        if self._pid != os.getpid():
+            self._session = self._create_session()
+            self._pid = os.getpid()
+        return self._session
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.onnx_path!r})"
+
+
+class OnnxRuntimeBackend(_ProcessLocalBackend):
+    """ONNX Runtime en CPU"""
+
+    name = 'onnxruntime'
+
+    @staticmethod
+    def available():
+        return onnxruntime is not None and onnx_available()
+
+    def _create_session(self):
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return onnxruntime.InferenceSession(self.onnx_path, options,
+                                            providers=['CPUExecutionProvider'])
+
+    def predict(self, images):
+        images = np.ascontiguousarray(images, dtype=np.float32)
+        return self._session_for_process().run(None, {INPUT_NAME: images})[0]
+
+
+class OpenCvDnnBackend(_ProcessLocalBackend):
+    """OpenCV DNN (CPU)"""
+
+    name = 'opencv'
+
+    @staticmethod
+    def available():
+        return hasattr(cv2, 'dnn') and onnx_available()
+
+    def _create_session(self):
+        net = cv2.dnn.readNetFromONNX(self.onnx_path)
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        return net
+
+    def predict(self, images):
+        net = self._session_for_process()
+        net.setInput(np.ascontiguousarray(images, dtype=np.float32))
+        return net.forward().copy()
+
+
+def create_backend(name, model, cache_dir, fingerprint):
+    """
+    Construye un backend por nombre
+
+    Args:
+        name (str): 'numpy', 'onnxruntime' u 'opencv'
+        model (TFJSModel): Modelo cargado (referencia y fuente de la conversión)
+        cache_dir (str): Carpeta de modelos ONNX convertidos
+        fingerprint (str): Huella de la versión del modelo
+
+    Returns:
+        InferenceBackend: Backend listo
+
+    Raises:
+        ImportError: Si faltan las dependencias opcionales del backend
+        ValueError: Si el nombre no es un backend conocido
+    """
+    if name == 'numpy':
+        return NumpyBackend(model)
+    if name == 'onnxruntime':
+        backend_class = OnnxRuntimeBackend
+    elif name == 'opencv':
+        backend_class = OpenCvDnnBackend
+    else:
+        raise ValueError(f"Backend desconocido: {name} (opciones: {', '.join(BACKENDS)})")
+    if not backend_class.available():
+        raise ImportError(f"El backend {name} requiere paquetes opcionales no instalados "
+                          f"(onnx{', onnxruntime' if name == 'onnxruntime' else ''})")
+    return backend_class(cached_onnx_path(model, cache_dir, fingerprint))
+
+
+def _time_backend(backend, sample, rounds):
+    """Milisegundos por pasada (mediana) tras una pasada de calentamiento"""
+    output = backend.predict(sample)
+    times = []
+    for _ in range(max(1, rounds)):
+        start = time.perf_counter()
+        backend.predict(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times)), np.asarray(output)
+
+
+def select_backend(model, input_shape, cache_dir, fingerprint, candidates=BACKENDS,
+                   batch_sizes=(1, 8), rounds=3, tolerance=1e-3):
+    """
+    Mide los backends disponibles y elige el más rápido que coincide con NumPy
+
+    Cada candidato procesa el mismo lote aleatorio fijo; se descarta si su
+    diferencia máxima con las probabilidades de referencia supera tolerance
+    o si cambia alguna clase ganadora. El criterio es el tiempo total de los
+    tamaños de lote medidos.
+
+    Args:
+        model (TFJSModel): Modelo cargado
+        input_shape (tuple): (H, W, C) de la entrada
+        cache_dir (str): Carpeta de modelos ONNX convertidos
+        fingerprint (str): Huella de la versión del modelo
+        candidates (iterable): Backends a considerar
+        batch_sizes (iterable): Tamaños de lote a medir
+        rounds (int): Pasadas medidas por tamaño
+        tolerance (float): Diferencia absoluta máxima aceptada
+
+    Returns:
+        tuple: (InferenceBackend elegido, reporte dict)
+    """
+    rng = np.random.default_rng(0)
+    batch_sizes = sorted(set(batch_sizes))
+    samples = {size: rng.random((size,) + tuple(input_shape), dtype=np.float32)
+               for size in batch_sizes}
+
+    reference = NumpyBackend(model)
+    report = {'candidates': {}, 'tolerance': tolerance, 'batch_sizes': batch_sizes}
+    expected = {}
+    chosen, best_total = reference, None
+
+    ordered = ['numpy'] + [name for name in candidates if name != 'numpy']
+    for name in ordered:
+        entry = {'available': True}
+        report['candidates'][name] = entry
+        try:
+            backend = reference if name == 'numpy' else create_backend(name, model, cache_dir,
+                                                                       fingerprint)
+            timings, max_diff, agrees = {}, 0.0, True
+            for size, sample in samples.items():
+                timings[size], output = _time_backend(backend, sample, rounds)
+                if name == 'numpy':
+                    expected[size] = output
+                    continue
+                max_diff = max(max_diff, float(np.abs(output - expected[size]).max()))
+                agrees = agrees and bool(np.array_equal(output.argmax(axis=1),
+                                                        expected[size].argmax(axis=1)))
+            agrees = agrees and max_diff <= tolerance
+        except ImportError as e:
+            entry.update(available=False, error=str(e))
+            continue
+        except Exception as e:
+            logger.warning(f"Backend {name} descartado: {e}")
+            entry.update(error=str(e), agrees=False)
+            continue
+
+        total = sum(timings.values())
+        entry.update({
+            'agrees': agrees,
+            'max_abs_diff': max_diff,
+            'timings_ms': {str(size): round(ms, 3) for size, ms in timings.items()},
+            'total_ms': round(total, 3)
+        })
+        if agrees and (best_total is None or total < best_total):
+            chosen, best_total = backend, total
+
+    report['selected'] = chosen.name
+    logger.info("Backends de inferencia: " + ', '.join(
+        f"{name} {entry['total_ms']:.1f} ms" + ('' if entry.get('agrees') else ' (descartado)')
+        for name, entry in report['candidates'].items() if 'total_ms' in entry
+    ) + f" -> {chosen.name}")
+    return chosen, report
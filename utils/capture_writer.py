@@ -0,0 +1,164 @@
+"""
+Capture Writer - Guardado de capturas en segundo plano
+
+Codifica y escribe las capturas de la cámara en un hilo aparte para que el
+ciclo de video no se detenga por E/S de disco. La cola es acotada: si el
+disco no da abasto, las capturas nuevas se descartan (y se cuentan) en lugar
+de frenar la detección. Cada captura guardada se registra en un índice JSONL
+(captures.jsonl) que se escribe por lotes.
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class CaptureWriter:
+    """
+    Escritor de capturas con cola acotada e índice JSONL
+    """
+
+    def __init__(self, output_dir, max_queue=8, jpeg_quality=90, index_name='captures.jsonl',
+                 flush_every=16, flush_interval=2.0):
+        """
+        Inicializa el escritor y arranca su hilo
+
+        Args:
+            output_dir (str): Carpeta de las capturas
+            max_queue (int): Capturas pendientes como máximo
+            jpeg_quality (int): Calidad JPEG (0-100)
+            index_name (str): Nombre del índice JSONL dentro de output_dir
+            flush_every (int): Registros acumulados antes de escribir el índice
+            flush_interval (float): Segundos máximos sin escribir el índice
+        """
+        self.output_dir = output_dir
+        self.jpeg_quality = jpeg_quality
+        self.index_path = os.path.join(output_dir, index_name)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = []
+        self._last_flush = time.time()
+        self._thread = threading.Thread(target=self._run, name='capture-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, metadata):
+        """
+        Encola una captura sin bloquear
+
+        Args:
+            frame (np.array): Imagen BGR (no debe modificarse después)
+            metadata (dict): Datos de la detección ('class', 'confidence', ...)
+
+        Returns:
+            bool: False si la cola estaba llena y la captura se descartó
+        """
+        try:
+            self._queue.put_nowait((frame, dict(metadata), datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _filename(self, metadata, timestamp):
+        label = re.sub(r'[^\w-]+', '_', str(metadata.get('class', 'captura'))).strip('_')
+        return f"detection_{timestamp.strftime('%Y%m%d_%H%M%S_%f')}_{label}.jpg"
+
+    def _write(self, frame, metadata, timestamp):
+        """Codifica y escribe una captura"""
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("No se pudo codificar la captura")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = self._filename(metadata, timestamp)
+        with open(os.path.join(self.output_dir, filename), 'wb') as f:
+            f.write(encoded.tobytes())
+
+        record = {'file': filename, 'timestamp': timestamp.isoformat()}
+        record.update(metadata)
+        self._pending.append(record)
+        self.written += 1
+        logger.info(f"Captura guardada: {filename}")
+
+    def _flush_index(self):
+        """Agrega al índice los registros acumulados en una sola escritura"""
+        if self._pending:
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                            for record in self._pending)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            self._pending = []
+        self._last_flush = time.time()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            if item is not None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error al guardar captura: {e}")
+
+            if (len(self._pending) >= self.flush_every or
+                    (self._pending and time.time() - self._last_flush >= self.flush_interval)):
+                try:
+                    self._flush_index()
+                except OSError as e:
+                    self.errors += 1
+                    logger.error(f"Error al escribir el índice de capturas: {e}")
+
+        try:
+            self._flush_index()
+        except OSError as e:
+            logger.error(f"Error al escribir el índice de capturas: {e}")
+
+    def close(self, timeout=10.0):
+        """
+        Escribe las capturas pendientes y detiene el hilo
+
+        Args:
+            timeout (float): Segundos máximos de espera
+        """
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Contadores del escritor"""
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self._queue.qsize()
+        }
+
+    def __repr__(self):
+        return f"CaptureWriter(output_dir={self.output_dir!r}, written={self.written})"
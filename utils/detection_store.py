@@ -0,0 +1,312 @@
+"""
+Detection Store - Historial de detecciones en SQLite
+
+Guarda cada detección del servidor (hash del contenido, clase, confianza,
+probabilidades, versión del modelo e instantes) para auditoría. Las
+peticiones solo encolan el registro: un hilo escribe los registros por lotes
+en una transacción, así que la ruta de la petición nunca espera al disco. Si
+el disco no da abasto y la cola se llena, los registros nuevos se descartan
+y se cuentan.
+
+Las consultas se paginan por cursor (instante, id) en orden descendente, no
+por OFFSET: cada página cuesta lo mismo con diez o con decenas de millones
+de filas. Los índices por instante, clase y hash cubren los filtros comunes.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    content_hash TEXT,
+    class TEXT,
+    class_index INTEGER,
+    confidence REAL,
+    probabilities BLOB,
+    model_version TEXT,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS detections_time ON detections(created_at);
+CREATE INDEX IF NOT EXISTS detections_class ON detections(class, created_at);
+CREATE INDEX IF NOT EXISTS detections_hash ON detections(content_hash, created_at);
+"""
+
+COLUMNS = ('created_at', 'source', 'content_hash', 'class', 'class_index', 'confidence',
+           'probabilities', 'model_version', 'latency_ms')
+
+_STOP = object()
+
+
+def encode_cursor(created_at, row_id):
+    """Cursor de paginación a partir de la última fila de una página"""
+    return f"{created_at!r}:{row_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Interpreta un cursor de encode_cursor
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    created_at, row_id = cursor.rsplit(':', 1)
+    return float(created_at), int(row_id)
+
+
+class DetectionStore:
+    """
+    Historial de detecciones con escritura por lotes en segundo plano
+    """
+
+    def __init__(self, path, batch_size=256, flush_interval=1.0, max_queue=10000):
+        """
+        Abre (o crea) la base de datos
+
+        El hilo escritor se inicia con start() o con el primer registro, en el
+        proceso que lo usa (los hilos no sobreviven al fork de gunicorn).
+
+        Args:
+            path (str): Archivo SQLite
+            batch_size (int): Registros por transacción como máximo
+            flush_interval (float): Segundos máximos que un registro espera en la cola
+            max_queue (int): Registros pendientes como máximo
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = self._connect()
+        try:
+            # WAL: las consultas no bloquean al escritor (varios workers, un archivo)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30.0)
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def start(self):
+        """Inicia el hilo escritor en este proceso (idempotente)"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Proceso hijo: la cola heredada puede tener el lock tomado
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='detection-store', daemon=True)
+            self._thread.start()
+
+    def record(self, source, prediction, content_hash=None, model_version=None,
+               latency_ms=None, created_at=None):
+        """
+        Encola una detección sin bloquear
+
+        Args:
+            source (str): Origen ('upload', 'camera', ...)
+            prediction (dict): Resultado del Predictor ('class', 'confidence',
+                               'class_index' y opcionalmente 'all_probabilities')
+            content_hash (str): SHA-256 del contenido
+            model_version (str): Versión del modelo que respondió
+            latency_ms (float): Duración de la petición hasta la predicción
+            created_at (float): Instante de la detección (default: time.time())
+
+        Returns:
+            bool: False si la cola estaba llena y el registro se descartó
+        """
+        if self._thread is None or self._pid != os.getpid():
+            self.start()
+
+        probabilities = prediction.get('all_probabilities')
+        if probabilities is not None:
+            probabilities = np.asarray(probabilities, dtype=np.float32).tobytes()
+
+        row = (
+            time.time() if created_at is None else created_at,
+            source,
+            content_hash,
+            prediction.get('class'),
+            prediction.get('class_index'),
+            float(prediction['confidence']) if prediction.get('confidence') is not None else None,
+            probabilities,
+            model_version,
+            round(latency_ms, 3) if latency_ms is not None else None
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _write(self, db, rows):
+        """Escribe un lote de registros en una sola transacción"""
+        with db:
+            db.executemany(f"INSERT INTO detections ({', '.join(COLUMNS)}) "
+                           f"VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        self.written += len(rows)
+
+    def _run(self):
+        db = self._connect()
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                # Juntar lo que llegue hasta completar el lote o agotar el intervalo
+                rows = []
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    rows.append(item)
+                    if len(rows) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+
+                if rows:
+                    try:
+                        self._write(db, rows)
+                    except sqlite3.Error as e:
+                        self.errors += len(rows)
+                        logger.error(f"Error al guardar {len(rows)} detecciones: {e}")
+        finally:
+            db.close()
+
+    def flush(self, timeout=10.0):
+        """
+        Espera a que se escriban los registros encolados
+
+        Returns:
+            bool: True si la cola quedó vacía antes del timeout
+        """
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            if self._queue.empty() and self.written + self.errors >= self.submitted:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=10.0):
+        """
+        Escribe los registros pendientes y detiene el hilo
+
+        Args:
+            timeout (float): Segundos máximos de espera
+        """
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout)
+
+    def query(self, limit=50, cursor=None, class_name=None, content_hash=None, source=None,
+              model_version=None, since=None, until=None):
+        """
+        Página de detecciones, de la más reciente a la más antigua
+
+        Args:
+            limit (int): Filas por página
+            cursor (str): next_cursor de la página anterior
+            class_name (str): Filtrar por clase
+            content_hash (str): Filtrar por hash del contenido
+            source (str): Filtrar por origen
+            model_version (str): Filtrar por versión del modelo
+            since (float): Instante mínimo (epoch, inclusive)
+            until (float): Instante máximo (epoch, exclusivo)
+
+        Returns:
+            tuple: (lista de dicts, next_cursor o None si no hay más)
+
+        Raises:
+            ValueError: Si el cursor no es válido
+        """
+        conditions, params = [], []
+        for column, value in (('class', class_name), ('content_hash', content_hash),
+                              ('source', source), ('model_version', model_version)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('created_at < ?')
+            params.append(until)
+        if cursor:
+            # La primera condición acota el rango del índice; la segunda desempata
+            created_at, row_id = decode_cursor(cursor)
+            conditions.append('created_at <= ? AND (created_at < ? OR id < ?)')
+            params.extend([created_at, created_at, row_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = (f"SELECT id, {', '.join(COLUMNS)} FROM detections {where} "
+               f"ORDER BY created_at DESC, id DESC LIMIT ?")
+        params.append(limit + 1)
+
+        db = self._connect()
+        try:
+            rows = db.execute(sql, params).fetchall()
+        finally:
+            db.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+        return [self._row_to_dict(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _row_to_dict(row):
+        record = dict(zip(('id',) + COLUMNS, row))
+        if record['probabilities'] is not None:
+            record['probabilities'] = [round(float(p), 6) for p in
+                                       np.frombuffer(record['probabilities'], dtype=np.float32)]
+        return record
+
+    def stats(self):
+        """Contadores del escritor"""
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self._queue.qsize()
+        }
+
+    def __repr__(self):
+        return f"DetectionStore(path={self.path!r}, written={self.written})"
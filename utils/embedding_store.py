@@ -0,0 +1,325 @@
+"""
+Embedding Store - Almacén columnar de embeddings del backbone
+
+Guarda el embedding (salida de GlobalAveragePooling2D) de cada imagen como
+float16, indexado por el SHA-256 del contenido del archivo. Cada columna
+vive en su propio archivo y se abre con memoria mapeada, de modo que
+re-clasificar el archivo completo con una cabeza nueva es una
+multiplicación de matrices por bloques, sin volver a ejecutar el backbone.
+
+Estructura de la carpeta:
+    meta.json         dimensión, número de filas, capacidad y hash del backbone
+    embeddings.f16    matriz (capacidad, dim) float16
+    hashes.bin        matriz (capacidad, 32) uint8 con el SHA-256 del contenido
+    sources.jsonl     ruta de origen de cada fila ({"row": n, "source": ...} por línea)
+    store.lock        bloqueo entre procesos para las escrituras
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from .file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+HASH_BYTES = 32
+INITIAL_CAPACITY = 1024
+
+
+def content_hash(data):
+    """
+    SHA-256 del contenido de una imagen
+
+    Args:
+        data (bytes): Bytes del archivo
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Almacén de embeddings float16 con memoria mapeada
+    """
+
+    def __init__(self, directory, dim=None, backbone_hash=None, readonly=False):
+        """
+        Abre o crea un almacén
+
+        Args:
+            directory (str): Carpeta del almacén
+            dim (int): Dimensión de los embeddings (requerida al crear)
+            backbone_hash (str): Hash del backbone que produjo los embeddings
+            readonly (bool): Abrir solo para lectura
+
+        Raises:
+            ValueError: Si la dimensión o el backbone no coinciden con el almacén
+            FileNotFoundError: Si readonly y el almacén no existe
+        """
+        self.directory = directory
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._index = None
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._lock_path = os.path.join(directory, 'store.lock')
+
+        if not os.path.exists(self._meta_path) and not readonly:
+            os.makedirs(directory, exist_ok=True)
+            # Otro proceso puede estar creando el mismo almacén
+            with file_lock(self._lock_path):
+                if not os.path.exists(self._meta_path):
+                    if dim is None:
+                        raise ValueError("Se requiere 'dim' para crear un almacén nuevo")
+                    self.meta = {'dim': int(dim), 'count': 0, 'capacity': 0,
+                                 'dtype': 'float16', 'backbone_hash': backbone_hash}
+                    self._resize(INITIAL_CAPACITY)
+                    self._write_meta()
+
+        if os.path.exists(self._meta_path):
+            self.meta = self._read_meta()
+            if dim is not None and dim != self.meta['dim']:
+                raise ValueError(f"Dimensión {dim} distinta a la del almacén ({self.meta['dim']})")
+            if backbone_hash and self.meta.get('backbone_hash') not in (None, backbone_hash):
+                raise ValueError("Los embeddings del almacén provienen de otro backbone")
+            if backbone_hash and not self.meta.get('backbone_hash'):
+                self.meta['backbone_hash'] = backbone_hash
+        else:
+            raise FileNotFoundError(f"Almacén de embeddings no encontrado: {directory}")
+
+        self._open()
+        logger.info(f"EmbeddingStore abierto: {directory} ({self.count} filas, dim={self.dim})")
+
+    # ------------------------------------------------------------------
+    # Archivos
+    # ------------------------------------------------------------------
+
+    @property
+    def dim(self):
+        return self.meta['dim']
+
+    @property
+    def count(self):
+        return self.meta['count']
+
+    @property
+    def backbone_hash(self):
+        return self.meta.get('backbone_hash')
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        """Mapea las columnas en memoria"""
+        mode = 'r' if self.readonly else 'r+'
+        capacity = self.meta['capacity']
+        self._embeddings = np.memmap(self._path('embeddings.f16'), dtype=np.float16,
+                                     mode=mode, shape=(capacity, self.dim))
+        self._hashes = np.memmap(self._path('hashes.bin'), dtype=np.uint8,
+                                 mode=mode, shape=(capacity, HASH_BYTES))
+
+    def _resize(self, capacity):
+        """Amplía los archivos de columnas a la nueva capacidad"""
+        for name, row_bytes in (('embeddings.f16', self.dim * 2), ('hashes.bin', HASH_BYTES)):
+            with open(self._path(name), 'ab') as f:
+                f.truncate(capacity * row_bytes)
+        self.meta['capacity'] = capacity
+
+    def _read_meta(self):
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _reload_meta(self):
+        """
+        Incorpora las filas que otros procesos agregaron desde la última lectura
+
+        Requiere el bloqueo entre procesos.
+        """
+        meta = self._read_meta()
+        if not meta.get('backbone_hash'):
+            meta['backbone_hash'] = self.meta.get('backbone_hash')
+        previous_count = self.count
+        capacity_changed = meta['capacity'] != self.meta['capacity']
+        self.meta = meta
+        if capacity_changed:
+            self._open()
+        if self._index is not None and self.count > previous_count:
+            for row in range(previous_count, self.count):
+                self._index.setdefault(bytes(self._hashes[row]), row)
+
+    def _write_meta(self):
+        temp_path = self._meta_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(temp_path, self._meta_path)
+
+    def _build_index(self):
+        """Índice hash -> fila (se construye bajo demanda)"""
+        if self._index is None:
+            hashes = self._hashes[:self.count]
+            self._index = {bytes(row): i for i, row in enumerate(hashes)}
+        return self._index
+
+    # ------------------------------------------------------------------
+    # Escritura y lectura
+    # ------------------------------------------------------------------
+
+    def add_batch(self, hashes, embeddings, sources=None):
+        """
+        Agrega embeddings omitiendo los hashes ya presentes
+
+        Args:
+            hashes (list): Hashes hexadecimales del contenido
+            embeddings (np.array): Matriz (N, dim)
+            sources (list): Rutas de origen (opcional)
+
+        Returns:
+            int: Número de filas nuevas
+        """
+        if self.readonly:
+            raise PermissionError("Almacén abierto en modo solo lectura")
+
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[None]
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Se esperaban embeddings de dimensión {self.dim}")
+        sources = sources if sources is not None else [None] * len(hashes)
+
+        with self._lock, file_lock(self._lock_path):
+            self._reload_meta()
+            index = self._build_index()
+            rows = []
+            for i, hex_hash in enumerate(hashes):
+                key = bytes.fromhex(hex_hash)
+                if key not in index:
+                    index[key] = self.count + len(rows)
+                    rows.append(i)
+            if not rows:
+                return 0
+
+            new_count = self.count + len(rows)
+            if new_count > self.meta['capacity']:
+                capacity = max(self.meta['capacity'], INITIAL_CAPACITY)
+                while capacity < new_count:
+                    capacity *= 2
+                self._embeddings.flush()
+                self._hashes.flush()
+                self._resize(capacity)
+                self._open()
+
+            start = self.count
+            self._embeddings[start:new_count] = embeddings[rows].astype(np.float16)
+            self._hashes[start:new_count] = np.frombuffer(
+                b''.join(bytes.fromhex(hashes[i]) for i in rows), dtype=np.uint8
+            ).reshape(len(rows), HASH_BYTES)
+
+            # Cada línea lleva su fila: las que dejó una escritura interrumpida
+            # antes de actualizar meta.json no desplazan a las siguientes
+            with open(self._path('sources.jsonl'), 'a+b') as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                for row, i in enumerate(rows, start):
+                    record = {'row': row, 'source': sources[i]}
+                    f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+
+            self.meta['count'] = new_count
+            self._embeddings.flush()
+            self._hashes.flush()
+            self._write_meta()
+            return len(rows)
+
+    def add(self, hex_hash, embedding, source=None):
+        """Agrega un embedding (ver add_batch)"""
+        return self.add_batch([hex_hash], embedding, [source])
+
+    def get(self, hex_hash):
+        """
+        Busca el embedding de un contenido
+
+        Args:
+            hex_hash (str): Hash hexadecimal del contenido
+
+        Returns:
+            np.array: Embedding float32 o None si no existe
+        """
+        with self._lock:
+            row = self._build_index().get(bytes.fromhex(hex_hash))
+        if row is None:
+            return None
+        return self._embeddings[row].astype(np.float32)
+
+    def __contains__(self, hex_hash):
+        with self._lock:
+            return bytes.fromhex(hex_hash) in self._build_index()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def embeddings(self):
+        """Vista float16 (count, dim) sobre el archivo mapeado"""
+        return self._embeddings[:self.count]
+
+    def hashes(self, start=0, stop=None):
+        """
+        Hashes hexadecimales de un rango de filas
+
+        Returns:
+            list: Hashes en orden de fila
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        return [bytes(row).hex() for row in self._hashes[start:stop]]
+
+    def sources(self):
+        """
+        Rutas de origen en orden de fila
+
+        Returns:
+            list: Rutas (None si no se registró)
+        """
+        result = [None] * self.count
+        path = self._path('sources.jsonl')
+        if not os.path.exists(path):
+            return result
+        with open(path, 'r', encoding='utf-8') as f:
+            for position, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Línea truncada por una escritura interrumpida
+                    continue
+                if isinstance(record, dict) and 'row' in record:
+                    row, source = record['row'], record.get('source')
+                else:
+                    # Formato anterior: una ruta por línea, en orden de fila
+                    row, source = position, record
+                # Una fila reescrita tras una interrupción: gana la última línea
+                if row < self.count:
+                    result[row] = source
+        return result
+
+    def iter_chunks(self, chunk_size=65536):
+        """
+        Recorre los embeddings por bloques convertidos a float32
+
+        Args:
+            chunk_size (int): Filas por bloque
+
+        Yields:
+            tuple: (fila inicial, np.array (n, dim) float32)
+        """
+        for start in range(0, self.count, chunk_size):
+            stop = min(start + chunk_size, self.count)
+            yield start, np.asarray(self._embeddings[start:stop], dtype=np.float32)
+
+    def __repr__(self):
+        return f"EmbeddingStore(path='{self.directory}', count={self.count}, dim={self.dim})"
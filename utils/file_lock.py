@@ -0,0 +1,38 @@
+"""
+File Lock - Bloqueo entre procesos sobre un archivo auxiliar
+
+Lo usan los almacenes en disco que varios procesos pueden modificar a la
+vez (workers de gunicorn, varias ejecuciones de detect_image.py).
+"""
+
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin bloqueo entre procesos (servidor de desarrollo de un proceso)
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, exclusive=True, blocking=True):
+    """
+    Bloqueo entre procesos (flock) sobre un archivo auxiliar
+
+    Args:
+        path (str): Archivo de bloqueo (se crea si no existe)
+        exclusive (bool): Exclusivo (escritura) o compartido (lectura)
+        blocking (bool): Esperar si otro proceso tiene el bloqueo
+
+    Raises:
+        BlockingIOError: Si blocking=False y el bloqueo está tomado
+    """
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            fcntl.flock(f.fileno(), operation if blocking else operation | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
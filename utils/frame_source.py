@@ -0,0 +1,194 @@
+"""
+Frame Source - Grabación y reproducción de sesiones de cámara
+
+Una sesión grabada es una carpeta con:
+
+- frames.mjpeg: los frames codificados en JPEG, concatenados
+- index.jsonl: una línea por frame con su instante (segundos desde el
+  inicio), desplazamiento y tamaño dentro de frames.mjpeg
+- meta.json: resolución, calidad JPEG y fecha de grabación
+
+ReplaySource imita la interfaz de cv2.VideoCapture (isOpened, read, set,
+release) para que CameraDetector procese una sesión grabada igual que una
+cámara, al ritmo original o tan rápido como pueda.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAMES_FILE = 'frames.mjpeg'
+INDEX_FILE = 'index.jsonl'
+META_FILE = 'meta.json'
+
+
+class SessionRecorder:
+    """
+    Graba los frames de una sesión con sus instantes
+    """
+
+    def __init__(self, path, jpeg_quality=90):
+        """
+        Crea la carpeta de la sesión
+
+        Args:
+            path (str): Carpeta de la sesión (no debe contener otra sesión)
+            jpeg_quality (int): Calidad JPEG (0-100)
+
+        Raises:
+            FileExistsError: Si la carpeta ya contiene una sesión
+        """
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileExistsError(f"Ya existe una sesión grabada en {path}")
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.jpeg_quality = jpeg_quality
+        self.frame_count = 0
+        self._offset = 0
+        self._start = None
+        self._size = None
+        self._frames = open(os.path.join(path, FRAMES_FILE), 'wb')
+        self._index = open(os.path.join(path, INDEX_FILE), 'w', encoding='utf-8')
+
+    def write(self, frame, timestamp=None):
+        """
+        Agrega un frame
+
+        Args:
+            frame (np.array): Frame BGR
+            timestamp (float): Instante de captura (default: time.time())
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self._start is None:
+            self._start = timestamp
+            self._size = (frame.shape[1], frame.shape[0])
+
+        ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("No se pudo codificar el frame")
+
+        data = encoded.tobytes()
+        self._frames.write(data)
+        self._index.write(json.dumps({
+            't': round(timestamp - self._start, 6),
+            'offset': self._offset,
+            'size': len(data)
+        }) + '\n')
+        self._offset += len(data)
+        self.frame_count += 1
+
+    def close(self):
+        """Cierra los archivos y escribe meta.json"""
+        if self._frames.closed:
+            return
+        self._frames.close()
+        self._index.close()
+
+        width, height = self._size or (0, 0)
+        with open(os.path.join(self.path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'frames': self.frame_count,
+                'width': width,
+                'height': height,
+                'jpeg_quality': self.jpeg_quality,
+                'recorded_at': datetime.now().isoformat()
+            }, f, indent=2)
+        logger.info(f"Sesión grabada: {self.frame_count} frames en {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"SessionRecorder(path={self.path!r}, frames={self.frame_count})"
+
+
+class ReplaySource:
+    """
+    Reproduce una sesión grabada con la interfaz de cv2.VideoCapture
+    """
+
+    def __init__(self, path, realtime=True, loop=False):
+        """
+        Abre una sesión grabada
+
+        Args:
+            path (str): Carpeta de la sesión
+            realtime (bool): Respetar los instantes originales (False = lo
+                             más rápido posible)
+            loop (bool): Volver al inicio al terminar
+
+        Raises:
+            FileNotFoundError: Si la carpeta no contiene una sesión
+        """
+        index_path = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"No hay sesión grabada en {path}")
+
+        with open(index_path, encoding='utf-8') as f:
+            self.index = [json.loads(line) for line in f if line.strip()]
+
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.position = 0
+        self.timestamp = None
+        self._frames = open(os.path.join(path, FRAMES_FILE), 'rb')
+        self._start = None
+
+    def isOpened(self):
+        return not self._frames.closed and bool(self.index)
+
+    def set(self, prop_id, value):
+        """Sin efecto: la resolución y los FPS son los de la grabación"""
+        return False
+
+    def read(self):
+        """
+        Siguiente frame de la sesión
+
+        Returns:
+            tuple: (True, frame BGR) o (False, None) al terminar
+        """
+        if self.position >= len(self.index):
+            if not self.loop or not self.index:
+                return False, None
+            self.position = 0
+            self._start = None
+
+        entry = self.index[self.position]
+        self.position += 1
+
+        if self.realtime:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now - entry['t']
+            delay = self._start + entry['t'] - now
+            if delay > 0:
+                time.sleep(delay)
+
+        self._frames.seek(entry['offset'])
+        data = self._frames.read(entry['size'])
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        self.timestamp = entry['t']
+        return frame is not None, frame
+
+    def release(self):
+        self._frames.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return (f"ReplaySource(path={self.path!r}, frames={len(self.index)}, "
+                f"realtime={self.realtime})")
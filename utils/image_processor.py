@@ -69,7 +69,11 @@ class ImageProcessor:
         if verbose:
             logger.info(f"Redimensionando de {image.shape} a {self.target_size}")
         
-        image = cv2.resize(image, self.target_size, interpolation=cv2.INTER_LINEAR)
+        # Las cargas ya reducidas en el navegador llegan con el tamaño final
+        if image.shape[1::-1] != tuple(self.target_size):
+            image = cv2.resize(image, self.target_size, interpolation=cv2.INTER_LINEAR)
+        elif verbose:
+            logger.info("Imagen ya dimensionada; se omite el resize")
         
         # Convertir BGR a RGB (OpenCV por defecto usa BGR)
         if len(image.shape) == 3 and image.shape[2] == 3:
@@ -112,8 +116,34 @@ class ImageProcessor:
         
         return np.array(processed_images)
     
+    @staticmethod
+    def augmentation_matrix(rng, width, height, rotation_range=15, shift_range=0.1):
+        """
+        Matriz afín que combina rotación y desplazamiento aleatorios
+        
+        Args:
+            rng (np.random.Generator): Generador de números aleatorios
+            width (int): Ancho de la imagen
+            height (int): Alto de la imagen
+            rotation_range (int): Rango de rotación en grados
+            shift_range (float): Rango de desplazamiento (0-1)
+        
+        Returns:
+            np.array: Matriz 2x3 float32 para cv2.warpAffine
+        """
+        
+        angle = rng.uniform(-rotation_range, rotation_range) if rotation_range > 0 else 0.0
+        M = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        
+        # Desplazar después de rotar equivale a sumar a la traslación
+        if shift_range > 0:
+            M[0, 2] += int(width * rng.uniform(-shift_range, shift_range))
+            M[1, 2] += int(height * rng.uniform(-shift_range, shift_range))
+        
+        return M.astype(np.float32)
+    
     def augment(self, image, num_augmentations=1, rotation_range=15, 
-                shift_range=0.1, brightness_range=0.2):
+                shift_range=0.1, brightness_range=0.2, seed=None):
         """
         Augmenta imagen con transformaciones aleatorias
         
@@ -123,35 +153,68 @@ class ImageProcessor:
             rotation_range (int): Rango de rotación en grados
             shift_range (float): Rango de desplazamiento (0-1)
             brightness_range (float): Rango de cambio de brillo (0-1)
+            seed (int): Semilla para resultados reproducibles (opcional)
         
         Yields:
             np.array: Imágenes aumentadas
         """
         
+        rng = np.random.default_rng(seed)
+        h, w = image.shape[:2]
+        
         for _ in range(num_augmentations):
-            augmented = image.copy()
+            augmented = image
             
-            # Rotación aleatoria
-            if rotation_range > 0:
-                angle = np.random.uniform(-rotation_range, rotation_range)
-                h, w = augmented.shape[:2]
-                M = cv2.getRotationMatrix2D((w/2, h/2), angle, 1.0)
-                augmented = cv2.warpAffine(augmented, M, (w, h))
-            
-            # Desplazamiento aleatorio
-            if shift_range > 0:
-                h, w = augmented.shape[:2]
-                dx = int(w * np.random.uniform(-shift_range, shift_range))
-                dy = int(h * np.random.uniform(-shift_range, shift_range))
-                M = np.float32([[1, 0, dx], [0, 1, dy]])
+            # Rotación y desplazamiento en un solo warp
+            if rotation_range > 0 or shift_range > 0:
+                M = self.augmentation_matrix(rng, w, h, rotation_range, shift_range)
                 augmented = cv2.warpAffine(augmented, M, (w, h))
             
             # Cambio de brillo
             if brightness_range > 0:
-                delta = int(255 * np.random.uniform(-brightness_range, brightness_range))
+                delta = int(255 * rng.uniform(-brightness_range, brightness_range))
                 augmented = cv2.convertScaleAbs(augmented, alpha=1, beta=delta)
             
-            yield augmented
+            yield augmented.copy() if augmented is image else augmented
+    
+    def augment_batch(self, image, num_augmentations=8, rotation_range=10,
+                      shift_range=0.05, brightness_range=0.1, seed=0):
+        """
+        Genera un lote de aumentos de una imagen ya procesada
+        
+        Cada aumento es un solo warpAffine (rotación + desplazamiento) que
+        escribe directamente en su posición del tensor del lote. Con la
+        misma semilla el lote es siempre el mismo.
+        
+        Args:
+            image (np.array): Imagen procesada (H, W, C) float32
+            num_augmentations (int): Número de aumentos (K)
+            rotation_range (int): Rango de rotación en grados
+            shift_range (float): Rango de desplazamiento (0-1)
+            brightness_range (float): Rango de cambio de brillo (0-1)
+            seed (int): Semilla del generador
+        
+        Returns:
+            np.array: Lote (K, H, W, C) float32
+        """
+        
+        image = np.ascontiguousarray(image, dtype=np.float32)
+        h, w = image.shape[:2]
+        rng = np.random.default_rng(seed)
+        batch = np.empty((num_augmentations,) + image.shape, dtype=np.float32)
+        max_value = 1.0 if self.normalize else 255.0
+        
+        for i in range(num_augmentations):
+            M = self.augmentation_matrix(rng, w, h, rotation_range, shift_range)
+            cv2.warpAffine(image, M, (w, h), dst=batch[i], borderMode=cv2.BORDER_REPLICATE)
+            
+            if brightness_range > 0:
+                batch[i] += max_value * rng.uniform(-brightness_range, brightness_range)
+        
+        if brightness_range > 0:
+            np.clip(batch, 0.0, max_value, out=batch)
+        
+        return batch
     
     def convert_to_input_shape(self, image):
         """
@@ -171,7 +234,8 @@ class ImageProcessor:
         
         return image
     
-    def resize_preserve_aspect(self, image, target_size, pad_color=(128, 128, 128)):
+    def resize_preserve_aspect(self, image, target_size, pad_color=(128, 128, 128),
+                               return_transform=False):
         """
         Redimensiona preservando aspecto ratio, rellena con padding si es necesario
         
@@ -179,9 +243,11 @@ class ImageProcessor:
             image (np.array): Imagen a redimensionar
             target_size (tuple): Tamaño objetivo
             pad_color (tuple): Color de relleno (BGR)
+            return_transform (bool): Si retornar también (escala, x_offset, y_offset)
+                                     para mapear coordenadas al canvas
         
         Returns:
-            np.array: Imagen redimensionada
+            np.array: Imagen redimensionada (o tupla con la transformación)
         """
         
         h, w = image.shape[:2]
@@ -203,6 +269,9 @@ class ImageProcessor:
         x_offset = (target_w - new_w) // 2
         canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
         
+        if return_transform:
+            return canvas, (scale, x_offset, y_offset)
+        
         return canvas
     
     def __repr__(self):
@@ -0,0 +1,243 @@
+"""
+Inference Daemon - Servidor residente de inferencia sobre socket Unix
+
+Mantiene un detector con el modelo cargado en memoria para que las
+invocaciones repetidas de detect_image.py no paguen el costo de arranque
+(importar OpenCV/NumPy, cargar el modelo) en cada archivo.
+
+Protocolo: una línea JSON por petición y una línea JSON por respuesta.
+    -> {"paths": ["/abs/img.jpg"], "all_probs": false, "confidence": 0.5}
+    <- {"success": true, "results": [...]}
+
+Este módulo solo usa la biblioteca estándar para que el cliente arranque
+rápido; el detector se inyecta desde quien levanta el servidor.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+SOCKET_ENV_VAR = 'AUTODOCVISION_SOCKET'
+
+
+class DaemonError(RuntimeError):
+    """
+    El daemon aceptó la petición pero reportó un error o no respondió
+
+    A diferencia de un OSError al conectar, el trabajo pudo haberse
+    ejecutado: repetirlo en proceso lo duplicaría.
+    """
+
+
+def default_socket_path():
+    """
+    Ruta por defecto del socket del daemon
+
+    Returns:
+        str: Valor de AUTODOCVISION_SOCKET o un socket por usuario en el
+             directorio temporal
+    """
+    if os.environ.get(SOCKET_ENV_VAR):
+        return os.environ[SOCKET_ENV_VAR]
+    uid = os.getuid() if hasattr(os, 'getuid') else 'user'
+    return os.path.join(tempfile.gettempdir(), f"autodocvision-{uid}.sock")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Atiende peticiones línea por línea en una conexión"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                response = self.server.daemon.handle_request(request)
+            except Exception as e:
+                logger.error(f"Error atendiendo petición: {e}")
+                response = {'success': False, 'error': str(e)}
+
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceDaemon:
+    """
+    Servidor residente de inferencia
+
+    El detector debe exponer detect_batch(paths, return_all_probs,
+    confidence_threshold) como ImageDetector de detect_image.py.
+    """
+
+    def __init__(self, detector, socket_path=None):
+        """
+        Inicializa el daemon
+
+        Args:
+            detector: Detector con el modelo ya cargado
+            socket_path (str): Ruta del socket Unix
+        """
+        self.detector = detector
+        self.socket_path = socket_path or default_socket_path()
+        self.requests_served = 0
+        self._server = None
+
+    def handle_request(self, request):
+        """
+        Procesa una petición decodificada
+
+        Args:
+            request (dict): Petición con 'paths' y opcionalmente 'all_probs',
+                            'confidence' o 'ping'
+
+        Returns:
+            dict: Respuesta serializable
+        """
+        if request.get('ping'):
+            return {'success': True, 'pid': os.getpid(), 'requests_served': self.requests_served}
+
+        paths = request.get('paths')
+        if not isinstance(paths, list) or not paths:
+            return {'success': False, 'error': "Se requiere 'paths' como lista no vacía"}
+
+        results = self.detector.detect_batch(
+            paths,
+            bool(request.get('all_probs', False)),
+            confidence_threshold=request.get('confidence')
+        )
+        self.requests_served += 1
+        return {'success': True, 'results': results}
+
+    def _remove_stale_socket(self):
+        """Elimina un socket huérfano o falla si otro daemon lo está usando"""
+        if not os.path.exists(self.socket_path):
+            return
+        if DaemonClient(self.socket_path, timeout=1.0).is_available():
+            raise RuntimeError(f"Ya hay un daemon escuchando en {self.socket_path}")
+        os.unlink(self.socket_path)
+        logger.info(f"Socket huérfano eliminado: {self.socket_path}")
+
+    def serve_forever(self):
+        """Escucha en el socket hasta recibir shutdown() o una interrupción"""
+        self._remove_stale_socket()
+
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.daemon = self
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Daemon de inferencia escuchando en {self.socket_path} (pid {os.getpid()})")
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("Daemon de inferencia detenido")
+
+    def shutdown(self):
+        """Detiene el servidor (llamar desde otro hilo)"""
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class DaemonClient:
+    """Cliente ligero del daemon de inferencia"""
+
+    def __init__(self, socket_path=None, timeout=60.0, timeout_per_image=5.0):
+        """
+        Inicializa el cliente
+
+        Args:
+            socket_path (str): Ruta del socket Unix
+            timeout (float): Timeout de conexión y base de la respuesta en segundos
+            timeout_per_image (float): Segundos de respuesta adicionales por imagen
+                                       (None = esperar la respuesta sin límite)
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self.timeout_per_image = timeout_per_image
+
+    def _call(self, request, response_timeout=None):
+        """
+        Envía una petición y espera la respuesta
+
+        Args:
+            request (dict): Petición
+            response_timeout (float): Segundos de espera de la respuesta
+                                      (None = sin límite)
+
+        Raises:
+            OSError: Si no hay daemon escuchando (falla la conexión)
+            DaemonError: Si la conexión se perdió o venció tras enviar la petición
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            try:
+                sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+                sock.settimeout(response_timeout)
+                with sock.makefile('rb') as stream:
+                    line = stream.readline()
+            except OSError as e:
+                raise DaemonError(f"El daemon no respondió: {e}") from e
+
+        if not line:
+            raise DaemonError("El daemon cerró la conexión sin responder")
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            raise DaemonError(f"Respuesta inválida del daemon: {e}") from e
+
+    def is_available(self):
+        """
+        Verifica si hay un daemon respondiendo
+
+        Returns:
+            bool: True si el daemon respondió al ping
+        """
+        if not hasattr(socket, 'AF_UNIX') or not os.path.exists(self.socket_path):
+            return False
+        try:
+            return bool(self._call({'ping': True}, self.timeout).get('success'))
+        except (OSError, DaemonError):
+            return False
+
+    def detect(self, paths, all_probs=False, confidence=None):
+        """
+        Clasifica imágenes usando el daemon
+
+        Args:
+            paths (list): Rutas de imágenes (se envían como absolutas)
+            all_probs (bool): Retornar probabilidades de todas las clases
+            confidence (float): Umbral de confianza para 'above_threshold'
+
+        Returns:
+            list: Resultados en el mismo formato que ImageDetector.detect
+
+        Raises:
+            OSError: Si no hay daemon disponible (se puede ejecutar en proceso)
+            DaemonError: Si el daemon reporta error o no responde a tiempo
+        """
+        response_timeout = None
+        if self.timeout_per_image is not None:
+            response_timeout = self.timeout + self.timeout_per_image * len(paths)
+        response = self._call({
+            'paths': [os.path.abspath(path) for path in paths],
+            'all_probs': all_probs,
+            'confidence': confidence
+        }, response_timeout)
+        if not response.get('success'):
+            raise DaemonError(response.get('error', 'Error desconocido en el daemon'))
+        return response['results']
+
+    def __repr__(self):
+        return f"DaemonClient(socket='{self.socket_path}')"
@@ -0,0 +1,257 @@
+"""
+Inference Scheduler - Carriles de prioridad para inferencia
+
+Reparte los lugares de inferencia de un worker entre dos carriles:
+
+- interactive: cuadros de la cámara del kiosco. Pasan antes que el trabajo
+  masivo y, por sesión, solo importa el cuadro más reciente: si llega uno
+  nuevo mientras el anterior sigue esperando, el anterior se descarta.
+- bulk: cargas masivas de /api/detect. Tienen garantizada una fracción
+  mínima de los lugares aunque haya tráfico interactivo constante.
+
+La latencia (espera en cola y total) se reporta por carril.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+
+
+class TicketCancelled(Exception):
+    """Turno cancelado antes de obtener lugar"""
+
+    def __init__(self, reason):
+        """
+        Args:
+            reason (str): 'superseded' (hay un cuadro más nuevo de la misma
+                          sesión) o 'expired_in_queue' (venció el plazo)
+        """
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Ticket:
+    """Turno de una petición en espera"""
+
+    __slots__ = ('lane', 'session_id', 'deadline', 'enqueued_at', 'state')
+
+    def __init__(self, lane, session_id, deadline):
+        self.lane = lane
+        self.session_id = session_id
+        self.deadline = deadline
+        self.enqueued_at = time.time()
+        self.state = 'waiting'
+
+
+class _LaneStats:
+    """Contadores y ventana de latencias de un carril"""
+
+    def __init__(self, window):
+        self.served = 0
+        self.superseded = 0
+        self.expired = 0
+        self.waits = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+
+    @staticmethod
+    def _percentiles(samples):
+        if not samples:
+            return {'p50_ms': None, 'p95_ms': None}
+        p50, p95 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95])
+        return {'p50_ms': round(p50 * 1000, 2), 'p95_ms': round(p95 * 1000, 2)}
+
+    def to_dict(self, depth):
+        return {
+            'queue_depth': depth,
+            'served': self.served,
+            'superseded': self.superseded,
+            'expired_in_queue': self.expired,
+            'queue_wait': self._percentiles(self.waits),
+            'latency': self._percentiles(self.latencies)
+        }
+
+
+class InferenceScheduler:
+    """
+    Planificador de lugares de inferencia con carriles de prioridad
+    """
+
+    def __init__(self, max_concurrent=2, bulk_min_share=0.2, window=500):
+        """
+        Inicializa el planificador
+
+        Args:
+            max_concurrent (int): Inferencias simultáneas
+            bulk_min_share (float): Fracción mínima de lugares para el carril
+                                    bulk cuando ambos carriles tienen espera
+            window (int): Muestras de latencia conservadas por carril
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.bulk_min_share = min(max(bulk_min_share, 0.01), 1.0)
+        # Lugares interactivos seguidos antes de ceder uno a bulk
+        self._streak_limit = max(0, round((1 - self.bulk_min_share) / self.bulk_min_share))
+        self._interactive_streak = 0
+
+        self.in_flight = 0
+        self._queues = {lane: deque() for lane in LANES}
+        self._sessions = {}
+        self._stats = {lane: _LaneStats(window) for lane in LANES}
+        self._condition = threading.Condition()
+
+    def depth(self, lane=None):
+        """
+        Peticiones en espera
+
+        Args:
+            lane (str): Carril, o None para la suma de ambos
+
+        Returns:
+            int: Tamaño de la cola
+        """
+        if lane is not None:
+            return len(self._queues[lane])
+        return sum(len(queue) for queue in self._queues.values())
+
+    def estimate_wait(self, lane, service_time):
+        """
+        Segundos estimados de espera para una petición nueva del carril
+
+        Args:
+            lane (str): Carril de la petición
+            service_time (float): Segundos estimados por inferencia
+
+        Returns:
+            float: 0 si hay un lugar libre
+        """
+        with self._condition:
+            if self.in_flight < self.max_concurrent and self.depth() == 0:
+                return 0.0
+            interactive = len(self._queues[INTERACTIVE])
+            bulk = len(self._queues[BULK])
+            if lane == INTERACTIVE:
+                ahead = interactive
+            else:
+                # Entre cada lugar bulk pasan a lo sumo _streak_limit interactivos
+                ahead = bulk + min(interactive, (bulk + 1) * self._streak_limit)
+        rounds = ahead // self.max_concurrent + 1
+        return rounds * service_time
+
+    def _next_ticket(self):
+        """Elige el siguiente turno respetando la fracción mínima de bulk"""
+        interactive = self._queues[INTERACTIVE]
+        bulk = self._queues[BULK]
+        if interactive and (not bulk or self._interactive_streak < self._streak_limit):
+            self._interactive_streak += 1
+            return interactive.popleft()
+        if bulk:
+            self._interactive_streak = 0
+            return bulk.popleft()
+        return None
+
+    def _dispatch(self):
+        """Asigna los lugares libres (con el lock tomado)"""
+        granted = False
+        while self.in_flight < self.max_concurrent:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.state = 'granted'
+            self.in_flight += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    def _remove(self, ticket):
+        try:
+            self._queues[ticket.lane].remove(ticket)
+        except ValueError:
+            pass
+
+    @contextmanager
+    def slot(self, lane=BULK, session_id=None, deadline=None):
+        """
+        Espera un lugar de inferencia en el carril indicado
+
+        Args:
+            lane (str): 'interactive' o 'bulk'
+            session_id (str): Sesión de la cámara; un turno interactivo nuevo
+                              reemplaza al que la misma sesión tenga en espera
+            deadline (float): Plazo absoluto (time.time()) o None
+
+        Yields:
+            float: Segundos de espera en la cola
+
+        Raises:
+            TicketCancelled: Si el turno fue reemplazado o el plazo venció
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Carril desconocido: {lane}")
+
+        ticket = _Ticket(lane, session_id, deadline)
+        stats = self._stats[lane]
+        with self._condition:
+            if lane == INTERACTIVE and session_id is not None:
+                previous = self._sessions.get(session_id)
+                if previous is not None and previous.state == 'waiting':
+                    previous.state = 'superseded'
+                    self._remove(previous)
+                    stats.superseded += 1
+                    self._condition.notify_all()
+                self._sessions[session_id] = ticket
+
+            self._queues[lane].append(ticket)
+            self._dispatch()
+
+            try:
+                while ticket.state == 'waiting':
+                    timeout = None if deadline is None else deadline - time.time()
+                    if timeout is not None and timeout <= 0:
+                        ticket.state = 'expired'
+                        self._remove(ticket)
+                        stats.expired += 1
+                        break
+                    self._condition.wait(timeout)
+            finally:
+                if session_id is not None and self._sessions.get(session_id) is ticket:
+                    del self._sessions[session_id]
+
+        if ticket.state == 'superseded':
+            raise TicketCancelled('superseded')
+        if ticket.state == 'expired':
+            raise TicketCancelled('expired_in_queue')
+
+        granted_at = time.time()
+        try:
+            yield granted_at - ticket.enqueued_at
+        finally:
+            finished_at = time.time()
+            with self._condition:
+                self.in_flight -= 1
+                stats.served += 1
+                stats.waits.append(granted_at - ticket.enqueued_at)
+                stats.latencies.append(finished_at - ticket.enqueued_at)
+                self._dispatch()
+
+    def stats(self):
+        """Estado de los carriles"""
+        with self._condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'bulk_min_share': self.bulk_min_share,
+                'in_flight': self.in_flight,
+                'lanes': {lane: self._stats[lane].to_dict(self.depth(lane)) for lane in LANES}
+            }
+
+    def __repr__(self):
+        return (f"InferenceScheduler(max_concurrent={self.max_concurrent}, "
+                f"bulk_min_share={self.bulk_min_share})")
@@ -2,6 +2,7 @@
 Model Loader - Carga y gestión del modelo de IA
 """
 
+import hashlib
 import json
 import os
 import logging
@@ -33,6 +34,8 @@ class ModelLoader:
         self.metadata = None
         self.weights = None
         self.class_names = None
+        self.fingerprint = None
+        self.backbone_hash = None
         
         logger.info(f"Inicializando ModelLoader con ruta: {model_path}")
         self._load()
@@ -68,6 +71,19 @@ class ModelLoader:
         if not os.path.exists(weights_path):
             logger.warning(f"Archivo weights.bin no encontrado en {self.model_path}")
         
+        self.fingerprint = self.compute_fingerprint(self.model_path)
+        
+        # Construir motor de inferencia (BatchNorm plegado, activaciones fusionadas)
+        if os.path.exists(model_json_path) and os.path.exists(weights_path):
+            try:
+                from .tfjs_model import TFJSModel
+                self.model = TFJSModel.from_files(model_json_path)
+                self.backbone_hash = self.model.backbone_hash
+                logger.info(f"Modelo cargado: {self.model} (huella {self.fingerprint[:12]})")
+            except Exception as e:
+                logger.warning(f"No se pudo construir el modelo, se usará modo simulado: {e}")
+                self.model = None
+        
         # Extraer clases del metadata
         if 'labels' in self.metadata:
             self.class_names = self.metadata['labels']
@@ -81,7 +97,7 @@ class ModelLoader:
         Obtiene el modelo cargado
         
         Returns:
-            dict: Diccionario con información del modelo
+            TFJSModel: Modelo listo para inferencia (None si no se pudo construir)
         """
         if self.model is None:
             logger.warning("Modelo aún no inicializado")
@@ -117,24 +133,108 @@ class ModelLoader:
             'name': self.metadata.get('name', 'Desconocido') if self.metadata else 'N/A',
             'classes': self.class_names,
             'num_classes': len(self.class_names) if self.class_names else 0,
+            'model_loaded': self.model is not None,
+            'fingerprint': self.fingerprint,
+            'backbone_hash': self.backbone_hash,
             'metadata': self.metadata if self.metadata else {}
         }
     
+    @staticmethod
+    def compute_fingerprint(model_path):
+        """
+        Calcula la huella SHA-256 de los archivos del modelo
+        
+        Args:
+            model_path (str): Ruta a la carpeta del modelo
+        
+        Returns:
+            str: Hash hexadecimal de metadata.json, model.json y weights.bin
+        """
+        digest = hashlib.sha256()
+        for filename in ('metadata.json', 'model.json', 'weights.bin'):
+            file_path = os.path.join(model_path, filename)
+            if not os.path.exists(file_path):
+                continue
+            digest.update(filename.encode('utf-8'))
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def fingerprint_contents(contents):
+        """
+        Huella de archivos del modelo ya leídos (igual a compute_fingerprint)
+        
+        Args:
+            contents (dict): Nombre de archivo -> bytes (los que existan)
+        
+        Returns:
+            str: Hash hexadecimal
+        """
+        digest = hashlib.sha256()
+        for filename in ('metadata.json', 'model.json', 'weights.bin'):
+            if filename in contents:
+                digest.update(filename.encode('utf-8'))
+                digest.update(contents[filename])
+        return digest.hexdigest()
+    
     @classmethod
-    def get_cached_model(cls, model_path):
+    def get_cached_model(cls, model_path, fingerprint=None):
         """
         Obtiene modelo del caché o lo carga si no existe
         
         Args:
             model_path (str): Ruta del modelo
+            fingerprint (str): Huella de la versión (ver compute_fingerprint);
+                               permite tener varias versiones de la misma ruta
         
         Returns:
             ModelLoader: Instancia del cargador
         """
-        if model_path not in cls._model_cache:
-            cls._model_cache[model_path] = ModelLoader(model_path)
+        key = (model_path, fingerprint)
+        if key not in cls._model_cache:
+            cls._model_cache[key] = ModelLoader(model_path)
             logger.info(f"Modelo cacheado para: {model_path}")
-        return cls._model_cache[model_path]
+        return cls._model_cache[key]
+    
+    @classmethod
+    def load_multiple(cls, model_paths):
+        """
+        Carga varias carpetas de modelo compartiendo backbones idénticos
+        
+        Los modelos cuyo backbone tiene el mismo hash pasan a usar los pesos
+        del primero, así que cada clasificador adicional solo ocupa su cabeza.
+        
+        Args:
+            model_paths (list): Rutas de las carpetas de modelo
+        
+        Returns:
+            list: Instancias de ModelLoader en el mismo orden
+        """
+        loaders = []
+        owners = {}
+        for model_path in model_paths:
+            loader = cls.get_cached_model(model_path, cls.compute_fingerprint(model_path))
+            if loader.model is not None:
+                owner = owners.setdefault(loader.backbone_hash, loader)
+                if owner is not loader:
+                    loader.model.share_backbone(owner.model)
+                    logger.info(f"{model_path} comparte backbone con {owner.model_path}")
+            loaders.append(loader)
+        return loaders
+    
+    @classmethod
+    def evict_cached_model(cls, model_path, fingerprint=None):
+        """
+        Elimina una versión del caché
+        
+        Args:
+            model_path (str): Ruta del modelo
+            fingerprint (str): Huella de la versión
+        """
+        if cls._model_cache.pop((model_path, fingerprint), None) is not None:
+            logger.info(f"Modelo eliminado del caché: {model_path} ({str(fingerprint)[:12]})")
     
     @classmethod
     def clear_cache(cls):
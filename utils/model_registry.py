@@ -0,0 +1,408 @@
+"""
+Model Registry - Versiones de modelo con recarga en caliente
+
+Mantiene la versión activa del modelo y permite reemplazarla sin reiniciar
+el servidor: la nueva versión se carga y calienta en segundo plano y luego
+se intercambia de forma atómica. Las peticiones en curso terminan con la
+versión con la que empezaron.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from .model_loader import ModelLoader
+from .image_processor import ImageProcessor
+from .predictor import Predictor
+from .multi_head import MultiHeadPredictor
+from .backends import create_backend, select_backend
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ('metadata.json', 'model.json', 'weights.bin')
+
+
+def combine_fingerprints(fingerprints):
+    """
+    Huella de una versión compuesta por uno o varios modelos
+
+    Args:
+        fingerprints (list): Huellas individuales (la primera es la principal)
+
+    Returns:
+        str: La huella principal si es un solo modelo, o el hash de todas
+    """
+    if len(fingerprints) == 1:
+        return fingerprints[0]
+    return hashlib.sha256('|'.join(str(f) for f in fingerprints).encode('utf-8')).hexdigest()
+
+
+class ModelVersion:
+    """Una versión cargada del modelo con sus componentes"""
+
+    def __init__(self, loader, predictor, image_processor, multi_head=None, extra_loaders=()):
+        """
+        Inicializa la versión
+
+        Args:
+            loader (ModelLoader): Cargador con metadatos y modelo
+            predictor (Predictor): Predictor construido sobre el cargador
+            image_processor (ImageProcessor): Procesador con el tamaño del modelo
+            multi_head (MultiHeadPredictor): Cabezas adicionales (opcional)
+            extra_loaders (iterable): Cargadores de las cabezas adicionales
+        """
+        self.loader = loader
+        self.predictor = predictor
+        self.image_processor = image_processor
+        self.multi_head = multi_head
+        self.cache_keys = [(l.model_path, l.fingerprint) for l in (loader,) + tuple(extra_loaders)]
+        self.fingerprint = combine_fingerprints([key[1] for key in self.cache_keys])
+        self.version = self.fingerprint[:12] if self.fingerprint else 'desconocida'
+        self.loaded_at = datetime.now().isoformat()
+        self.in_flight = 0
+        self._files = None
+        self._files_lock = threading.Lock()
+
+    def model_file(self, filename):
+        """
+        Contenido de un archivo del modelo principal tal como es en esta versión
+
+        La primera llamada lee los archivos de disco y solo los conserva si su
+        huella coincide con la de la versión; así una URL versionada nunca
+        entrega pesos de otra versión aunque los archivos cambien sin recarga.
+
+        Args:
+            filename (str): Uno de MODEL_FILES
+
+        Returns:
+            bytes: Contenido, o None si el archivo no existe o los archivos en
+                   disco ya no corresponden a esta versión
+        """
+        with self._files_lock:
+            if self._files is None:
+                contents = {}
+                for name in MODEL_FILES:
+                    file_path = os.path.join(self.loader.model_path, name)
+                    if os.path.exists(file_path):
+                        with open(file_path, 'rb') as f:
+                            contents[name] = f.read()
+                if ModelLoader.fingerprint_contents(contents) != self.loader.fingerprint:
+                    logger.warning(f"Los archivos de {self.loader.model_path} ya no "
+                                   f"corresponden a la versión {self.version}")
+                    return None
+                self._files = contents
+        return self._files.get(filename)
+
+    def warmup(self, batch_sizes=(1,)):
+        """Calienta el predictor principal y las cabezas adicionales"""
+        if self.multi_head is not None:
+            self.multi_head.warmup(batch_sizes)
+        else:
+            self.predictor.warmup(batch_sizes)
+
+    def to_dict(self):
+        """Resumen serializable de la versión"""
+        return {
+            'version': self.version,
+            'fingerprint': self.fingerprint,
+            'loaded_at': self.loaded_at,
+            'in_flight': self.in_flight,
+            'model_mode': 'simulated' if self.predictor.is_simulated else 'real',
+            'warmed_up': self.predictor.warmed_up,
+            'backend': getattr(self.predictor.backend, 'name', 'numpy'),
+            'heads': list(self.multi_head.heads) if self.multi_head is not None else []
+        }
+
+    def __repr__(self):
+        return f"ModelVersion(version='{self.version}', in_flight={self.in_flight})"
+
+
+class ModelRegistry:
+    """
+    Registro de la versión activa del modelo
+
+    Cada proceso (worker) tiene su propio registro. Para que todos los
+    workers de gunicorn converjan a la nueva versión se recomienda activar el
+    observador de la carpeta; la llamada de administración solo recarga el
+    worker que la recibe.
+    """
+
+    def __init__(self, model_path='RECONOCIMIENTO DE DOCUMENTOS', confidence_threshold=0.7,
+                 warmup_batch_sizes=(1,), extra_model_paths=(), backend='numpy',
+                 backend_cache_dir='model_cache'):
+        """
+        Inicializa el registro cargando la versión actual (sin calentar)
+
+        Args:
+            model_path (str): Carpeta del modelo exportado
+            confidence_threshold (float): Umbral por defecto del predictor
+            warmup_batch_sizes (iterable): Tamaños de lote para calentar versiones nuevas
+            extra_model_paths (iterable): Carpetas de clasificadores adicionales
+                                          (cabezas sobre el mismo backbone)
+            backend (str): Motor de inferencia: 'numpy', 'onnxruntime', 'opencv' o
+                           'auto' (medir los disponibles al cargar cada versión)
+            backend_cache_dir (str): Carpeta de los modelos ONNX convertidos
+        """
+        self.model_path = model_path
+        self.extra_model_paths = tuple(extra_model_paths)
+        self.confidence_threshold = confidence_threshold
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.backend = backend
+        self.backend_cache_dir = backend_cache_dir
+
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._retired = []
+        self._watcher = None
+        self._stop_event = threading.Event()
+
+        self.reload_count = 0
+        self.last_reload = None
+        self.last_error = None
+        self.reloading = False
+
+        self._current = self._load_version(warm=False)
+        self._signature = self._files_signature()
+
+    @property
+    def current(self):
+        """Versión activa (referencia estable para quien la lea)"""
+        return self._current
+
+    @contextmanager
+    def acquire(self):
+        """
+        Obtiene la versión activa durante una petición
+
+        La versión entregada no cambia aunque ocurra un intercambio mientras
+        la petición está en curso.
+
+        Yields:
+            ModelVersion: Versión a usar en toda la petición
+        """
+        with self._lock:
+            version = self._current
+            version.in_flight += 1
+        try:
+            yield version
+        finally:
+            with self._lock:
+                version.in_flight -= 1
+            self._release_retired()
+
+    def _model_paths(self):
+        return (self.model_path,) + self.extra_model_paths
+
+    def _disk_fingerprint(self):
+        """Huella de los archivos actualmente en disco"""
+        return combine_fingerprints([ModelLoader.compute_fingerprint(path)
+                                     for path in self._model_paths()])
+
+    def _load_version(self, warm=True):
+        """Carga (o toma del caché) y opcionalmente calienta una versión"""
+        multi_head = None
+        extra_loaders = ()
+        if self.extra_model_paths:
+            loaders = ModelLoader.load_multiple(self._model_paths())
+            loader, extra_loaders = loaders[0], tuple(loaders[1:])
+            multi_head = MultiHeadPredictor(loaders, self.confidence_threshold)
+            predictor = multi_head.heads[multi_head.primary]
+        else:
+            fingerprint = ModelLoader.compute_fingerprint(self.model_path)
+            loader = ModelLoader.get_cached_model(self.model_path, fingerprint)
+            predictor = Predictor(loader, self.confidence_threshold)
+            self._attach_backend(loader, predictor)
+
+        image_size = loader.get_metadata().get('imageSize', 224)
+        version = ModelVersion(
+            loader,
+            predictor,
+            ImageProcessor(target_size=(image_size, image_size)),
+            multi_head,
+            extra_loaders
+        )
+        if warm:
+            version.warmup(self.warmup_batch_sizes)
+        return version
+
+    def _attach_backend(self, loader, predictor):
+        """
+        Asigna el backend configurado al predictor de una versión nueva
+
+        Con 'auto' se miden los backends disponibles; si el elegido falla al
+        construirse, la versión se queda con el motor NumPy.
+        """
+        if self.backend == 'numpy' or predictor.is_simulated:
+            return
+        try:
+            if self.backend == 'auto':
+                batch_sizes = sorted(set(self.warmup_batch_sizes) | {1})
+                backend, report = select_backend(predictor.model, predictor.input_shape,
+                                                 self.backend_cache_dir, loader.fingerprint,
+                                                 batch_sizes=batch_sizes)
+            else:
+                backend = create_backend(self.backend, predictor.model,
+                                         self.backend_cache_dir, loader.fingerprint)
+                report = {'selected': backend.name, 'candidates': {}}
+            predictor.set_backend(backend if backend.name != 'numpy' else None, report)
+        except Exception as e:
+            logger.error(f"No se pudo usar el backend {self.backend}, se usa NumPy: {e}")
+            predictor.set_backend(None, {'selected': 'numpy', 'error': str(e), 'candidates': {}})
+
+    def _release_retired(self):
+        """Libera del caché las versiones retiradas sin peticiones en curso"""
+        with self._lock:
+            drained = [version for version in self._retired if version.in_flight == 0]
+            self._retired = [version for version in self._retired if version.in_flight > 0]
+
+        for version in drained:
+            for key in version.cache_keys:
+                if key not in self._current.cache_keys:
+                    ModelLoader.evict_cached_model(*key)
+            logger.info(f"Versión de modelo {version.version} liberada")
+
+    def reload(self, force=False):
+        """
+        Carga la versión en disco y la activa si es distinta
+
+        Args:
+            force (bool): Recargar aunque la huella no haya cambiado
+
+        Returns:
+            bool: True si se activó una versión nueva
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            logger.info("Recarga de modelo ya en curso")
+            return False
+
+        self.reloading = True
+        try:
+            fingerprint = self._disk_fingerprint()
+            if fingerprint == self._current.fingerprint and not force:
+                logger.info("El modelo en disco no cambió; no se recarga")
+                return False
+
+            if force:
+                for model_path in self._model_paths():
+                    ModelLoader.evict_cached_model(model_path,
+                                                   ModelLoader.compute_fingerprint(model_path))
+
+            start_time = time.time()
+            new_version = self._load_version(warm=True)
+
+            # Si los archivos cambiaron durante la carga, esperar a que se estabilicen
+            if self._disk_fingerprint() != new_version.fingerprint:
+                raise RuntimeError("Los archivos del modelo cambiaron durante la carga")
+
+            with self._lock:
+                old_version = self._current
+                self._current = new_version
+                if old_version is not new_version:
+                    self._retired.append(old_version)
+
+            self.reload_count += 1
+            self.last_reload = datetime.now().isoformat()
+            self.last_error = None
+            logger.info(f"Modelo intercambiado: {old_version.version} -> {new_version.version} "
+                        f"({time.time() - start_time:.2f}s)")
+            self._release_retired()
+            return True
+
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Error al recargar modelo, se mantiene la versión actual: {e}")
+            return False
+
+        finally:
+            self.reloading = False
+            self._reload_lock.release()
+
+    def reload_async(self, force=False):
+        """
+        Lanza la recarga en un hilo de fondo
+
+        Returns:
+            threading.Thread: Hilo de la recarga
+        """
+        thread = threading.Thread(target=self.reload, kwargs={'force': force},
+                                  name='model-reload', daemon=True)
+        thread.start()
+        return thread
+
+    def _files_signature(self):
+        """Firma barata (tamaño y mtime) de los archivos del modelo"""
+        signature = []
+        for model_path in self._model_paths():
+            for filename in MODEL_FILES:
+                file_path = os.path.join(model_path, filename)
+                try:
+                    stat = os.stat(file_path)
+                    signature.append((file_path, stat.st_size, stat.st_mtime_ns))
+                except FileNotFoundError:
+                    signature.append((file_path, None, None))
+        return tuple(signature)
+
+    def start_watcher(self, interval=5.0):
+        """
+        Observa la carpeta del modelo y recarga cuando cambia
+
+        Un cambio se aplica cuando la firma se mantiene estable durante dos
+        sondeos seguidos, para no cargar archivos a medio copiar. Si la
+        recarga falla (o había otra en curso) y el modelo activo no coincide
+        con el disco, se reintenta en el siguiente sondeo.
+
+        Args:
+            interval (float): Segundos entre sondeos
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def watch():
+            pending = None
+            while not self._stop_event.wait(interval):
+                signature = self._files_signature()
+                if signature == self._signature:
+                    pending = None
+                    continue
+                if signature != pending:
+                    pending = signature
+                    continue
+                logger.info("Cambio detectado en la carpeta del modelo")
+                if self.reload() or self._disk_fingerprint() == self.current.fingerprint:
+                    self._signature = signature
+                    pending = None
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+        self._watcher.start()
+        logger.info(f"Observando {self.model_path} cada {interval}s")
+
+    def stop_watcher(self):
+        """Detiene el observador de la carpeta"""
+        self._stop_event.set()
+
+    def status(self):
+        """
+        Estado del registro
+
+        Returns:
+            dict: Versión activa, versiones retiradas y datos de recargas
+        """
+        with self._lock:
+            retired = [version.to_dict() for version in self._retired]
+        return {
+            'current': self._current.to_dict(),
+            'retired': retired,
+            'reloading': self.reloading,
+            'reload_count': self.reload_count,
+            'last_reload': self.last_reload,
+            'last_error': self.last_error,
+            'watching': self._watcher is not None and self._watcher.is_alive()
+        }
+
+    def __repr__(self):
+        return f"ModelRegistry(path='{self.model_path}', version='{self._current.version}')"
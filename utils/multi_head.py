@@ -0,0 +1,170 @@
+"""
+Multi Head - Varios clasificadores sobre un backbone compartido
+
+Los modelos de Teachable Machine comparten el mismo MobileNetV2; solo cambia
+la cabeza Dense. MultiHeadPredictor ejecuta el backbone una vez por imagen
+(por cada backbone distinto) y aplica todas las cabezas a los embeddings.
+"""
+
+import logging
+import os
+import time
+
+import numpy as np
+
+from .predictor import Predictor
+
+logger = logging.getLogger(__name__)
+
+
+class MultiHeadPredictor:
+    """
+    Predictor de varios clasificadores con backbone compartido
+    """
+
+    def __init__(self, model_loaders, confidence_threshold=0.7):
+        """
+        Inicializa el predictor multi-cabeza
+
+        Args:
+            model_loaders (list): Cargadores (ver ModelLoader.load_multiple);
+                                  el primero es la cabeza principal
+            confidence_threshold (float): Umbral de confianza
+
+        Raises:
+            ValueError: Si no hay cargadores
+        """
+        if not model_loaders:
+            raise ValueError("Se requiere al menos un modelo")
+
+        self.heads = {}
+        for loader in model_loaders:
+            name = self._head_name(loader, self.heads)
+            self.heads[name] = Predictor(loader, confidence_threshold)
+
+        self.primary = next(iter(self.heads))
+
+        # Agrupar cabezas por backbone; las simuladas van aparte
+        self.groups = {}
+        for name, predictor in self.heads.items():
+            key = predictor.model.backbone_hash if predictor.model is not None else None
+            self.groups.setdefault(key, []).append(name)
+
+        shared = sum(len(names) - 1 for key, names in self.groups.items() if key is not None)
+        logger.info(f"MultiHeadPredictor: {len(self.heads)} cabezas, "
+                    f"{len([k for k in self.groups if k is not None])} backbones, "
+                    f"{shared} pasadas de backbone ahorradas por imagen")
+
+    @staticmethod
+    def _head_name(loader, taken):
+        """
+        Nombre de la cabeza: modelName de metadata o nombre de la carpeta
+
+        Teachable Machine exporta todos los modelos como "tm-my-image-model"
+        salvo que se renombren; si el nombre ya existe se usa el de la carpeta
+        y, si también existe, un sufijo numérico.
+
+        Args:
+            loader (ModelLoader): Cargador del modelo
+            taken (dict): Cabezas ya registradas
+
+        Returns:
+            str: Nombre único
+        """
+        folder = os.path.basename(os.path.normpath(loader.model_path))
+        name = loader.get_metadata().get('modelName') or folder
+        if name not in taken:
+            return name
+
+        candidate = folder
+        suffix = 2
+        while candidate in taken:
+            candidate = f"{name}-{suffix}"
+            suffix += 1
+        logger.warning(f"Nombre de cabeza repetido '{name}' ({loader.model_path}): "
+                       f"se usa '{candidate}'")
+        return candidate
+
+    def predict_batch(self, images, return_all_probabilities=False):
+        """
+        Clasifica un lote con todas las cabezas
+
+        Args:
+            images (np.array): Lote (N, H, W, C) o imagen (H, W, C) procesada
+            return_all_probabilities (bool): Si incluir todas las probabilidades
+
+        Returns:
+            list: Por imagen, dict nombre de cabeza -> resultado de predicción
+        """
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+
+        results = [{} for _ in range(images.shape[0])]
+        for backbone_hash, names in self.groups.items():
+            start_time = time.time()
+
+            if backbone_hash is None:
+                outputs = {name: self.heads[name]._forward(images) for name in names}
+            else:
+                owner = self.heads[names[0]].model
+                features = owner.extract_features(images)
+                outputs = {name: self.heads[name].model.classify_features(features)
+                           for name in names}
+
+            elapsed_time = (time.time() - start_time) / images.shape[0]
+            for name, probabilities in outputs.items():
+                for i, row in enumerate(probabilities):
+                    result = self.heads[name]._build_result(row, return_all_probabilities)
+                    result['processing_time'] = elapsed_time
+                    result['model_version'] = (self.heads[name].fingerprint or '')[:12]
+                    results[i][name] = result
+
+        return results
+
+    def predict(self, image, return_all_probabilities=False):
+        """
+        Clasifica una imagen con todas las cabezas
+
+        Args:
+            image (np.array): Imagen procesada (H, W, C) o (1, H, W, C)
+            return_all_probabilities (bool): Si incluir todas las probabilidades
+
+        Returns:
+            dict: Nombre de cabeza -> resultado de predicción
+        """
+        return self.predict_batch(image, return_all_probabilities)[0]
+
+    def warmup(self, batch_sizes=(1,)):
+        """
+        Calienta backbone y cabezas en los tamaños de lote indicados
+
+        Args:
+            batch_sizes (iterable): Tamaños de lote a calentar
+        """
+        primary = self.heads[self.primary]
+        primary.warmup(batch_sizes)
+        for batch_size in batch_sizes:
+            self.predict_batch(np.full((batch_size,) + primary.input_shape, 0.5, dtype=np.float32))
+        for predictor in self.heads.values():
+            predictor.warmed_up = True
+
+    def get_heads_info(self):
+        """
+        Información de las cabezas cargadas
+
+        Returns:
+            dict: Nombre -> clases, versión y hash de backbone
+        """
+        return {
+            name: {
+                'classes': predictor.class_names,
+                'model_version': (predictor.fingerprint or '')[:12],
+                'backbone_hash': predictor.model.backbone_hash[:12] if predictor.model else None,
+                'primary': name == self.primary
+            }
+            for name, predictor in self.heads.items()
+        }
+
+    def __repr__(self):
+        return f"MultiHeadPredictor(heads={list(self.heads)}, backbones={len(self.groups)})"
@@ -0,0 +1,274 @@
+"""
+ONNX Export - Conversión de modelos TF.js Layers a ONNX
+
+Traduce el grafo optimizado de TFJSModel (BatchNorm plegado, activaciones y
+rellenos fusionados) a un modelo ONNX equivalente, para ejecutarlo con ONNX
+Runtime u OpenCV DNN. La entrada conserva el contrato de TFJSModel: lote
+NHWC en [0, 1]; la normalización a [-1, 1] y el paso a NCHW van dentro del
+grafo. Requiere el paquete opcional `onnx`.
+"""
+
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+except ImportError:
+    onnx = None
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAME = 'input'
+OUTPUT_NAME = 'probabilities'
+DEFAULT_OPSET = 13
+
+
+def onnx_available():
+    """True si el paquete onnx está instalado"""
+    return onnx is not None
+
+
+class _GraphBuilder:
+    """Acumula nodos e inicializadores con nombres únicos"""
+
+    def __init__(self):
+        self.nodes = []
+        self.initializers = []
+        self._count = 0
+
+    def name(self, base):
+        self._count += 1
+        return f"{base}:{self._count}"
+
+    def constant(self, base, value, dtype=np.float32):
+        name = self.name(base)
+        self.initializers.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), name))
+        return name
+
+    def op(self, op_type, inputs, base, **attributes):
+        output = self.name(base)
+        self.nodes.append(helper.make_node(op_type, inputs, [output], name=output, **attributes))
+        return output
+
+    def activation(self, x, activation, base):
+        """Agrega la activación de una capa (sin efecto para 'linear')"""
+        if activation in (None, 'linear'):
+            return x
+        if activation == 'relu':
+            return self.op('Relu', [x], f"{base}/relu")
+        if activation == 'relu6':
+            low = self.constant(f"{base}/min", 0.0)
+            high = self.constant(f"{base}/max", 6.0)
+            return self.op('Clip', [x, low, high], f"{base}/relu6")
+        if activation == 'softmax':
+            return self.op('Softmax', [x], f"{base}/softmax", axis=-1)
+        if activation == 'sigmoid':
+            return self.op('Sigmoid', [x], f"{base}/sigmoid")
+        if activation == 'tanh':
+            return self.op('Tanh', [x], f"{base}/tanh")
+        raise ValueError(f"Activación no soportada en ONNX: {activation}")
+
+
+def _conv_attributes(node, kernel_shape):
+    """Atributos de Conv equivalentes al relleno de TF ('same' = SAME_UPPER)"""
+    params = node.params
+    attributes = {'kernel_shape': list(kernel_shape), 'strides': list(params['strides'])}
+    if params['padding'] == 'same':
+        attributes['auto_pad'] = 'SAME_UPPER'
+    else:
+        (top, bottom), (left, right) = params['pad']
+        attributes['pads'] = [top, left, bottom, right]
+    return attributes
+
+
+def _explicit_pad(builder, x, node):
+    """Relleno explícito previo cuando además hay padding='same'"""
+    (top, bottom), (left, right) = node.params['pad']
+    if node.params['padding'] != 'same' or not (top or bottom or left or right):
+        return x
+    pads = builder.constant(f"{node.name}/pads", [0, 0, top, left, 0, 0, bottom, right], np.int64)
+    return builder.op('Pad', [x, pads], f"{node.name}/pad")
+
+
+def build_onnx(model, image_size=None, opset=DEFAULT_OPSET):
+    """
+    Construye el modelo ONNX equivalente a un TFJSModel
+
+    Args:
+        model (TFJSModel): Modelo cargado
+        image_size (int): Lado fijo de la entrada (None = alto y ancho dinámicos;
+                          el lote siempre es dinámico)
+        opset (int): Versión del opset de ONNX
+
+    Returns:
+        onnx.ModelProto: Modelo verificado con onnx.checker
+
+    Raises:
+        ImportError: Si el paquete onnx no está instalado
+        ValueError: Si el grafo tiene operaciones sin equivalente
+    """
+    if onnx is None:
+        raise ImportError("Se requiere el paquete 'onnx' para convertir el modelo")
+
+    builder = _GraphBuilder()
+    channels = model.input_shape[-1]
+    height = image_size or 'height'
+    width = image_size or 'width'
+
+    x = builder.op('Mul', [INPUT_NAME, builder.constant('input/scale', model.input_scale)],
+                   'input/scaled')
+    x = builder.op('Add', [x, builder.constant('input/offset', model.input_offset)],
+                   'input/normalized')
+    x = builder.op('Transpose', [x], 'input/nchw', perm=[0, 3, 1, 2])
+
+    # Tensores 4D en NCHW; tras el pooling global todo es 2D (N, C)
+    values = {'input': x}
+    spatial = {x}
+    nodes, output = model.graph()
+
+    for node in nodes:
+        args = [values[name] for name in node.inputs]
+        params = node.params
+        kind = node.kind
+
+        if kind in ('conv', 'dwconv'):
+            kernel_shape = params['kernel_shape']
+            if kind == 'conv':
+                # Matriz (kh*kw*cin, cout) -> HWIO -> OIHW
+                weight = params['matrix'].reshape(kernel_shape).transpose(3, 2, 0, 1)
+                group = 1
+            else:
+                # Taps (kh, kw, C) -> (C, 1, kh, kw)
+                weight = params['taps'].transpose(2, 0, 1)[:, None]
+                group = weight.shape[0]
+            inputs = [_explicit_pad(builder, args[0], node),
+                      builder.constant(f"{node.name}/weight", weight)]
+            if params['bias'] is not None:
+                inputs.append(builder.constant(f"{node.name}/bias", params['bias']))
+            result = builder.op('Conv', inputs, node.name, group=group,
+                                **_conv_attributes(node, kernel_shape[:2]))
+            result = builder.activation(result, params['activation'], node.name)
+
+        elif kind == 'bn':
+            shape = (1, -1, 1, 1) if args[0] in spatial else (1, -1)
+            scale = builder.constant(f"{node.name}/scale", params['scale'].reshape(shape))
+            shift = builder.constant(f"{node.name}/shift", params['shift'].reshape(shape))
+            result = builder.op('Add', [builder.op('Mul', [args[0], scale], f"{node.name}/mul"),
+                                        shift], node.name)
+
+        elif kind == 'act':
+            result = builder.activation(args[0], params['activation'], node.name)
+
+        elif kind == 'add':
+            result = args[0]
+            for extra in args[1:]:
+                result = builder.op('Add', [result, extra], node.name)
+
+        elif kind == 'pad':
+            (top, bottom), (left, right) = params['pad']
+            pads = builder.constant(f"{node.name}/pads", [0, 0, top, left, 0, 0, bottom, right],
+                                    np.int64)
+            result = builder.op('Pad', [args[0], pads], node.name)
+
+        elif kind == 'gap':
+            pooled = builder.op('GlobalAveragePool', [args[0]], f"{node.name}/pool")
+            result = builder.op('Flatten', [pooled], node.name, axis=1)
+
+        elif kind == 'flatten':
+            x = args[0]
+            if x in spatial:
+                # Flatten de Keras recorre NHWC
+                x = builder.op('Transpose', [x], f"{node.name}/nhwc", perm=[0, 2, 3, 1])
+            result = builder.op('Flatten', [x], node.name, axis=1)
+
+        elif kind == 'dense':
+            inputs = [args[0], builder.constant(f"{node.name}/kernel", params['kernel'])]
+            if params['bias'] is not None:
+                inputs.append(builder.constant(f"{node.name}/bias", params['bias']))
+            result = builder.op('Gemm', inputs, node.name)
+            result = builder.activation(result, params['activation'], node.name)
+
+        else:
+            raise ValueError(f"Operación sin equivalente ONNX: {kind} ({node.name})")
+
+        values[node.name] = result
+        if kind in ('conv', 'dwconv', 'pad') or (kind in ('bn', 'act', 'add') and args[0] in spatial):
+            spatial.add(result)
+
+    builder.nodes.append(helper.make_node('Identity', [values[output]], [OUTPUT_NAME],
+                                          name=OUTPUT_NAME))
+
+    graph = helper.make_graph(
+        builder.nodes,
+        'autodocvision',
+        [helper.make_tensor_value_info(INPUT_NAME, TensorProto.FLOAT,
+                                       ['batch', height, width, channels])],
+        [helper.make_tensor_value_info(OUTPUT_NAME, TensorProto.FLOAT,
+                                       ['batch', model.num_classes])],
+        builder.initializers
+    )
+    onnx_model = helper.make_model(graph, producer_name='autodocvision',
+                                   opset_imports=[helper.make_opsetid('', opset)])
+    # Compatibilidad con runtimes que no leen la IR más reciente
+    onnx_model.ir_version = min(onnx_model.ir_version, 8)
+    helper.set_model_props(onnx_model, {'backbone_hash': model.backbone_hash})
+    onnx.checker.check_model(onnx_model)
+    return onnx_model
+
+
+def export_onnx(model, output_path, image_size=None, opset=DEFAULT_OPSET):
+    """
+    Convierte y guarda el modelo de forma atómica
+
+    Varios procesos pueden exportar a la misma ruta a la vez: cada uno
+    escribe un temporal y lo renombra.
+
+    Args:
+        model (TFJSModel): Modelo cargado
+        output_path (str): Archivo .onnx de salida
+        image_size (int): Lado fijo de la entrada (None = dinámico)
+        opset (int): Versión del opset
+
+    Returns:
+        str: output_path
+    """
+    onnx_model = build_onnx(model, image_size, opset)
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(suffix='.onnx', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(onnx_model.SerializeToString())
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    logger.info(f"Modelo ONNX exportado: {output_path} "
+                f"({os.path.getsize(output_path) / 1e6:.1f} MB, "
+                f"entrada {'dinámica' if image_size is None else f'{image_size}x{image_size}'})")
+    return output_path
+
+
+def cached_onnx_path(model, cache_dir, fingerprint, image_size=None):
+    """
+    Ruta del ONNX convertido para una versión del modelo (lo exporta si falta)
+
+    Args:
+        model (TFJSModel): Modelo cargado
+        cache_dir (str): Carpeta de modelos convertidos
+        fingerprint (str): Huella de la versión (ver ModelLoader.compute_fingerprint)
+        image_size (int): Lado fijo de la entrada (None = dinámico)
+
+    Returns:
+        str: Ruta del archivo .onnx
+    """
+    suffix = f"-{image_size}" if image_size else ''
+    path = os.path.join(cache_dir, f"{fingerprint[:16]}{suffix}.onnx")
+    if not os.path.exists(path):
+        export_onnx(model, path, image_size)
+    return path
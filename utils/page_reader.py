@@ -0,0 +1,139 @@
+"""
+Page Reader - Lectura de TIFF multipágina y GIF animados
+
+cv2.imdecode solo devuelve el primer cuadro de un archivo multipágina.
+PageReader usa Pillow para decodificar las páginas de una en una (seek), las
+reduce al tamaño de trabajo y las entrega como arrays BGR, de modo que nunca
+hay más de una página a resolución completa en memoria.
+"""
+
+import io
+import logging
+
+import numpy as np
+from PIL import Image
+
+from .upload_reader import ImageTooLarge
+
+logger = logging.getLogger(__name__)
+
+MULTIPAGE_EXTENSIONS = {'tif', 'tiff', 'gif'}
+
+
+def is_multipage_candidate(filename):
+    """
+    Indica si la extensión del archivo admite varias páginas
+
+    Args:
+        filename (str): Nombre o ruta del archivo
+
+    Returns:
+        bool: True para TIFF y GIF
+    """
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in MULTIPAGE_EXTENSIONS
+
+
+class PageReader:
+    """
+    Lector perezoso de páginas
+    """
+
+    def __init__(self, source, max_pages=20, work_size=224, max_pixels=None):
+        """
+        Abre el archivo sin decodificar las páginas
+
+        Args:
+            source (bytes o str): Contenido del archivo o ruta
+            max_pages (int): Máximo de páginas a leer
+            work_size (int): Lado menor aproximado de las páginas reducidas
+            max_pixels (int): Píxeles máximos declarados por página (None = sin límite)
+
+        Raises:
+            ValueError: Si Pillow no reconoce el formato
+        """
+        self.max_pages = max_pages
+        self.work_size = work_size
+        self.max_pixels = max_pixels
+        try:
+            self._image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        except Exception as e:
+            raise ValueError(f"No se pudo leer el archivo: {e}")
+
+        self.page_count = getattr(self._image, 'n_frames', 1)
+        self.truncated = self.page_count > max_pages
+
+    @property
+    def is_multipage(self):
+        return self.page_count > 1
+
+    def iter_pages(self):
+        """
+        Decodifica las páginas de una en una
+
+        Yields:
+            tuple: (índice de página, np.array BGR uint8 reducido)
+
+        Raises:
+            ImageTooLarge: Si una página declara más de max_pixels (se
+                           comprueba tras seek, antes de decodificarla)
+        """
+        for index in range(min(self.page_count, self.max_pages)):
+            self._image.seek(index)
+            width, height = self._image.size
+            if self.max_pixels and width * height > self.max_pixels:
+                raise ImageTooLarge(width, height, self.max_pixels)
+            page = self._image.convert('RGB')
+
+            # Reducir por un factor entero antes de pasar a NumPy
+            factor = min(page.size) // (2 * self.work_size)
+            if factor > 1:
+                page = page.reduce(factor)
+
+            yield index, np.ascontiguousarray(np.asarray(page)[:, :, ::-1])
+            del page
+
+    def close(self):
+        self._image.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"PageReader(pages={self.page_count}, max_pages={self.max_pages})"
+
+
+def summarize_pages(results, class_names):
+    """
+    Resumen a nivel documento de las predicciones por página
+
+    La clase del documento es la de mayor probabilidad promedio entre
+    páginas.
+
+    Args:
+        results (list): Resultados de Predictor.predict_batch con all_probabilities
+        class_names (list): Nombres de clase
+
+    Returns:
+        dict: Clase del documento, confianza promedio y conteo de páginas por clase
+    """
+    valid = [result for result in results if 'all_probabilities' in result]
+    if not valid:
+        return {'class': None, 'confidence': 0.0, 'class_counts': {}}
+
+    mean_probabilities = np.mean([result['all_probabilities'] for result in valid], axis=0)
+    index = int(np.argmax(mean_probabilities))
+
+    class_counts = {}
+    for result in valid:
+        class_counts[result['class']] = class_counts.get(result['class'], 0) + 1
+
+    return {
+        'class': class_names[index] if index < len(class_names) else f"Clase {index}",
+        'class_index': index,
+        'confidence': float(mean_probabilities[index]),
+        'class_counts': class_counts,
+        'consistent': len(class_counts) == 1
+    }
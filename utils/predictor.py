@@ -2,6 +2,7 @@
 Predictor - Motor de predicción usando modelo cargado
 """
 
+import cv2
 import numpy as np
 import logging
 import time
@@ -34,6 +35,22 @@ class Predictor:
         self.metadata = model_loader.get_metadata()
         self.class_names = model_loader.get_class_names()
         self.confidence_threshold = confidence_threshold
+        self.fingerprint = getattr(model_loader, 'fingerprint', None)
+        
+        # Tamaño de entrada del modelo (imageSize de Teachable Machine)
+        image_size = self.metadata.get('imageSize', 224) if self.metadata else 224
+        self.input_shape = (image_size, image_size, 3)
+        
+        # Estado de calentamiento
+        self.warmed_up = False
+        self.warmup_times = {}
+        
+        # Motor de la predicción completa (None = self.model, ver set_backend)
+        self.backend = None
+        self.backend_report = None
+        
+        if self.model is None:
+            logger.warning("Predictor en modo simulado: las predicciones no son reales")
         
         logger.info(f"Predictor inicializado con threshold={confidence_threshold}")
         logger.info(f"Clases disponibles: {self.class_names}")
@@ -81,18 +98,11 @@ class Predictor:
         
         try:
             # Realizar predicción
-            # Nota: La implementación exacta depende del formato del modelo
-            # (TFLite, ONNX, TensorFlow, etc.)
-            # Esta es una estructura genérica
-            
             if self.model is None:
                 # Fallback: predicción simulada para demostración
                 logger.warning("Modelo no disponible, usando predicción simulada")
-                probabilities = self._simulate_prediction(image.shape[0])
-            else:
-                # Predicción real con el modelo
-                predictions = self.model.predict(image)
-                probabilities = predictions[0].numpy() if hasattr(predictions[0], 'numpy') else predictions[0]
+            
+            probabilities = self._forward(image)
             
             # Asegurar que es un array numpy
             if not isinstance(probabilities, np.ndarray):
@@ -107,26 +117,7 @@ class Predictor:
             if verbose:
                 logger.info(f"Probabilidades: {probabilities}")
             
-            # Encontrar clase con máxima probabilidad
-            max_index = int(np.argmax(probabilities))
-            max_confidence = float(probabilities[max_index])
-            
-            # Validar índice
-            if max_index >= len(self.class_names):
-                max_index = 0
-            
-            class_name = self.class_names[max_index] if self.class_names else f"Clase {max_index}"
-            
-            # Construir resultado
-            result = {
-                'class': class_name,
-                'class_index': max_index,
-                'confidence': max_confidence,
-                'above_threshold': max_confidence >= self.confidence_threshold
-            }
-            
-            if return_all_probabilities:
-                result['all_probabilities'] = probabilities.tolist()
+            result = self._build_result(probabilities, return_all_probabilities)
             
             # Tiempo de procesamiento
             elapsed_time = time.time() - start_time
@@ -134,7 +125,7 @@ class Predictor:
             
             if verbose:
                 logger.info(f"Predicción completada en {elapsed_time:.3f}s")
-                logger.info(f"Resultado: {class_name} ({max_confidence:.1%})")
+                logger.info(f"Resultado: {result['class']} ({result['confidence']:.1%})")
             
             return result
             
@@ -142,38 +133,399 @@ class Predictor:
             logger.error(f"Error en predicción: {e}")
             raise
     
-    def predict_batch(self, images, return_all_probabilities=False, verbose=False):
+    def predict_batch(self, images, return_all_probabilities=False, verbose=False, batch_size=32):
         """
         Realiza predicción en lote
         
+        Las imágenes válidas con la misma forma se apilan y se ejecutan en
+        una sola pasada del modelo (en trozos de batch_size).
+        
         Args:
             images (list): Lista de arrays de imagen
             return_all_probabilities (bool): Si retornar todas las probabilidades
             verbose (bool): Si mostrar logs detallados
+            batch_size (int): Máximo de imágenes por pasada
         
         Returns:
             list: Lista de resultados de predicción
         """
         
-        results = []
+        results = [None] * len(images)
+        groups = {}
         
+        # Validar y agrupar por forma
         for i, image in enumerate(images):
-            try:
+            if not isinstance(image, np.ndarray) or image.size == 0 or image.ndim not in (3, 4):
+                results[i] = self._error_result('Imagen debe ser un array de numpy no vacío')
+                continue
+            if image.ndim == 4:
+                if image.shape[0] != 1:
+                    results[i] = self._error_result('Se esperaba una sola imagen por elemento')
+                    continue
+                image = image[0]
+            groups.setdefault(image.shape, []).append((i, image))
+        
+        for shape, members in groups.items():
+            for start in range(0, len(members), batch_size):
+                chunk = members[start:start + batch_size]
                 if verbose:
-                    logger.info(f"Prediciendo imagen {i+1}/{len(images)}")
+                    logger.info(f"Prediciendo lote de {len(chunk)} imágenes {shape}")
                 
-                result = self.predict(image, return_all_probabilities, verbose=False)
-                results.append(result)
+                start_time = time.time()
+                try:
+                    probabilities = self._forward(np.stack([image for _, image in chunk]))
+                except Exception as e:
+                    logger.error(f"Error prediciendo lote: {e}")
+                    for i, _ in chunk:
+                        results[i] = self._error_result(str(e))
+                    continue
                 
-            except Exception as e:
-                logger.error(f"Error prediciendo imagen {i}: {e}")
-                results.append({
-                    'class': 'Error',
-                    'confidence': 0.0,
-                    'error': str(e)
-                })
+                elapsed_time = (time.time() - start_time) / len(chunk)
+                for (i, _), row in zip(chunk, probabilities):
+                    result = self._build_result(row, return_all_probabilities)
+                    result['processing_time'] = elapsed_time
+                    results[i] = result
+        
+        return results
+    
+    def predict_cascade_batch(self, images, low_resolution=160, escalation_confidence=0.9,
+                              return_all_probabilities=False):
+        """
+        Predicción en cascada: primero a baja resolución, luego completa
+        
+        El backbone es convolucional hasta GlobalAveragePooling2D, así que
+        acepta entradas más pequeñas. Cada lote se evalúa primero a
+        low_resolution y solo las imágenes con confianza menor a
+        escalation_confidence se re-evalúan al imageSize del modelo.
+        
+        Args:
+            images (np.array): Lote (N, H, W, C) o imagen (H, W, C) procesada
+                               al tamaño completo del modelo
+            low_resolution (int): Lado de la primera etapa (ej. 128 o 160)
+            escalation_confidence (float): Confianza mínima para no escalar
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+        
+        Returns:
+            list: Resultados con 'cascade_stage' ('low' o 'full') y 'resolution'
+        """
+        
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        
+        full_resolution = images.shape[1]
+        if low_resolution >= full_resolution:
+            results = self.predict_batch(list(images), return_all_probabilities)
+            for result in results:
+                result['cascade_stage'] = 'full'
+                result['resolution'] = full_resolution
+            return results
+        
+        start_time = time.time()
+        low_images = np.stack([
+            cv2.resize(image, (low_resolution, low_resolution), interpolation=cv2.INTER_AREA)
+            for image in images
+        ])
+        probabilities = np.array(self._forward(low_images), dtype=np.float64)
+        low_time = (time.time() - start_time) / len(images)
+        
+        stages = np.full(len(images), 'low', dtype=object)
+        escalate = np.nonzero(probabilities.max(axis=1) < escalation_confidence)[0]
+        full_time = 0.0
+        if len(escalate):
+            start_time = time.time()
+            probabilities[escalate] = self._forward(images[escalate])
+            full_time = (time.time() - start_time) / len(escalate)
+            stages[escalate] = 'full'
+        
+        results = []
+        for row, stage in zip(probabilities, stages):
+            result = self._build_result(row, return_all_probabilities)
+            result['processing_time'] = low_time + (full_time if stage == 'full' else 0.0)
+            result['cascade_stage'] = stage
+            result['resolution'] = full_resolution if stage == 'full' else low_resolution
+            results.append(result)
+        return results
+    
+    def predict_cascade(self, image, low_resolution=160, escalation_confidence=0.9,
+                        return_all_probabilities=False):
+        """
+        Predicción en cascada de una imagen (ver predict_cascade_batch)
+        
+        Returns:
+            dict: Resultado de predicción con 'cascade_stage' y 'resolution'
+        """
+        return self.predict_cascade_batch(image, low_resolution, escalation_confidence,
+                                          return_all_probabilities)[0]
+
+    def predict_regions(self, image, boxes, return_all_probabilities=False):
+        """
+        Clasifica varias regiones con una sola pasada del backbone
+        
+        El backbone se ejecuta una vez sobre la imagen completa (de cualquier
+        tamaño) y cada región se clasifica promediando las celdas del mapa de
+        características que cubre, en lugar de recortar y re-ejecutar.
+        
+        Args:
+            image (np.array): Imagen procesada (H, W, C) en [0, 1]
+            boxes (list): Regiones (x, y, ancho, alto) en píxeles de la imagen
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+        
+        Returns:
+            tuple: (resultado de la imagen completa, lista de resultados por región)
+        """
+        
+        start_time = time.time()
+        
+        if self.model is None:
+            probabilities = self._simulate_prediction(len(boxes) + 1)
+        else:
+            feature_map = self.model.extract_feature_map(image[None])[0]
+            cells_h, cells_w = feature_map.shape[:2]
+            cell_h = image.shape[0] / cells_h
+            cell_w = image.shape[1] / cells_w
+            
+            embeddings = [feature_map.mean(axis=(0, 1))]
+            for x, y, w, h in boxes:
+                # Celdas cuyo centro cae dentro de la región (al menos una)
+                col0 = min(int(round(x / cell_w)), cells_w - 1)
+                row0 = min(int(round(y / cell_h)), cells_h - 1)
+                col1 = max(int(round((x + w) / cell_w)), col0 + 1)
+                row1 = max(int(round((y + h) / cell_h)), row0 + 1)
+                embeddings.append(feature_map[row0:row1, col0:col1].mean(axis=(0, 1)))
+            
+            probabilities = self.model.classify_features(np.stack(embeddings))
+        
+        elapsed_time = time.time() - start_time
+        results = []
+        for row in probabilities:
+            result = self._build_result(row, return_all_probabilities)
+            result['processing_time'] = elapsed_time
+            results.append(result)
+        
+        return results[0], results[1:]
+
+    def predict_tta(self, image, image_processor, confidence_threshold=None,
+                    num_augmentations=8, seed=0, return_all_probabilities=False,
+                    first_pass=None):
+        """
+        Predicción con aumentos en tiempo de prueba (TTA) solo si hace falta
+        
+        Si la confianza de la primera pasada supera el umbral se devuelve tal
+        cual. Si no, se generan K aumentos deterministas en un solo lote, se
+        ejecuta una pasada del modelo y se promedian las probabilidades con
+        las de la primera pasada.
+        
+        Args:
+            image (np.array): Imagen procesada (H, W, C)
+            image_processor (ImageProcessor): Procesador que genera los aumentos
+            confidence_threshold (float): Umbral que dispara TTA (default: el del predictor)
+            num_augmentations (int): Número de aumentos (K)
+            seed (int): Semilla de los aumentos
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+            first_pass (dict): Resultado ya calculado con 'all_probabilities' (opcional)
+        
+        Returns:
+            dict: Resultado de predicción con 'tta_applied' y 'first_pass_confidence'
+        """
+        
+        if confidence_threshold is None:
+            confidence_threshold = self.confidence_threshold
+        if image.ndim == 4:
+            image = image[0]
+        
+        start_time = time.time()
+        if first_pass is None or 'all_probabilities' not in first_pass:
+            first_pass = self.predict(image, return_all_probabilities=True)
+        
+        if first_pass['confidence'] >= confidence_threshold or num_augmentations <= 0:
+            result = dict(first_pass)
+            if not return_all_probabilities:
+                result.pop('all_probabilities', None)
+            result['tta_applied'] = False
+            result['first_pass_confidence'] = first_pass['confidence']
+            return result
+        
+        batch = image_processor.augment_batch(image, num_augmentations, seed=seed)
+        probabilities = self._forward(batch)
+        probabilities = np.vstack([np.asarray(first_pass['all_probabilities'])[None], probabilities])
+        
+        result = self._build_result(probabilities.mean(axis=0), return_all_probabilities)
+        result['processing_time'] = first_pass.get('processing_time', 0.0) + time.time() - start_time
+        result['tta_applied'] = True
+        result['tta_augmentations'] = num_augmentations
+        result['first_pass_confidence'] = first_pass['confidence']
+        return result
+
+    def extract_embeddings(self, images):
+        """
+        Embeddings del backbone (salida de GlobalAveragePooling2D)
+        
+        Args:
+            images (np.array): Lote (N, H, W, C) o imagen (H, W, C) procesada
+        
+        Returns:
+            np.array: Embeddings (N, feature_dim) float32
         
+        Raises:
+            RuntimeError: Si el predictor está en modo simulado
+        """
+        if self.model is None:
+            raise RuntimeError("Embeddings no disponibles en modo simulado")
+        
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        return self.model.extract_features(images)
+    
+    def predict_with_embedding(self, image, return_all_probabilities=False):
+        """
+        Predice y devuelve el embedding con una sola pasada del backbone
+
+        Args:
+            image (np.array): Imagen procesada (H, W, C) o (1, H, W, C)
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+
+        Returns:
+            tuple: (resultado de predicción, embedding (feature_dim,) float32)
+        """
+        start_time = time.time()
+        embedding = self.extract_embeddings(image)[0]
+        result = self.predict_from_embeddings(embedding, return_all_probabilities)[0]
+        result['processing_time'] = time.time() - start_time
+        return result, embedding
+
+    def predict_from_embeddings(self, embeddings, return_all_probabilities=False):
+        """
+        Aplica la cabeza a embeddings ya calculados
+        
+        Args:
+            embeddings (np.array): Embeddings (N, feature_dim) o (feature_dim,)
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+        
+        Returns:
+            list: Resultados de predicción, uno por embedding
+        """
+        if self.model is None:
+            raise RuntimeError("Embeddings no disponibles en modo simulado")
+        
+        start_time = time.time()
+        probabilities = self.model.classify_features(embeddings)
+        elapsed_time = (time.time() - start_time) / len(probabilities)
+        
+        results = []
+        for row in probabilities:
+            result = self._build_result(row, return_all_probabilities)
+            result['processing_time'] = elapsed_time
+            results.append(result)
         return results
+
+    @property
+    def is_simulated(self):
+        """True si no hay modelo real y las predicciones son simuladas"""
+        return self.model is None
+    
+    def warmup(self, batch_sizes=(1,), rounds=1):
+        """
+        Ejecuta inferencias de calentamiento
+        
+        Reserva la memoria de las activaciones y calienta las cachés de
+        BLAS para que las primeras peticiones reales no paguen el arranque.
+        
+        Args:
+            batch_sizes (iterable): Tamaños de lote a calentar
+            rounds (int): Pasadas por tamaño de lote
+        
+        Returns:
+            dict: Tamaño de lote -> segundos de la última pasada
+        """
+        
+        for batch_size in batch_sizes:
+            sample = np.full((batch_size,) + self.input_shape, 0.5, dtype=np.float32)
+            for _ in range(max(1, rounds)):
+                start_time = time.time()
+                self._forward(sample)
+                self.warmup_times[batch_size] = time.time() - start_time
+        
+        self.warmed_up = True
+        logger.info(f"Calentamiento completado: {self.warmup_times}")
+        return dict(self.warmup_times)
+    
+    def set_backend(self, backend, report=None):
+        """
+        Usa otro motor para la predicción completa
+        
+        Args:
+            backend (InferenceBackend): Backend (ver utils/backends.py); None = motor NumPy
+            report (dict): Resultado de la medición que lo eligió (para /api/model-info)
+        """
+        self.backend = backend
+        self.backend_report = report
+        logger.info(f"Backend de inferencia: {backend.name if backend is not None else 'numpy'}")
+    
+    def _forward(self, batch):
+        """
+        Ejecuta el modelo (o la simulación) sobre un lote
+        
+        Args:
+            batch (np.array): Lote (N, H, W, C)
+        
+        Returns:
+            np.array: Probabilidades (N, num_classes)
+        """
+        if self.model is None:
+            return self._simulate_prediction(batch.shape[0])
+        
+        if self.backend is not None and self.backend.supports(batch.shape):
+            predictions = self.backend.predict(batch)
+        else:
+            predictions = self.model.predict(batch)
+        if hasattr(predictions, 'numpy'):
+            predictions = predictions.numpy()
+        return np.asarray(predictions)
+    
+    def _build_result(self, probabilities, return_all_probabilities=False):
+        """
+        Construye el diccionario de resultado a partir de las probabilidades
+        
+        Args:
+            probabilities (np.array): Probabilidades de una imagen
+            return_all_probabilities (bool): Si incluir todas las probabilidades
+        
+        Returns:
+            dict: Resultado sin 'processing_time'
+        """
+        
+        # Encontrar clase con máxima probabilidad
+        max_index = int(np.argmax(probabilities))
+        max_confidence = float(probabilities[max_index])
+        
+        # Validar índice
+        if max_index >= len(self.class_names):
+            max_index = 0
+        
+        class_name = self.class_names[max_index] if self.class_names else f"Clase {max_index}"
+        
+        result = {
+            'class': class_name,
+            'class_index': max_index,
+            'confidence': max_confidence,
+            'above_threshold': max_confidence >= self.confidence_threshold
+        }
+        
+        if return_all_probabilities:
+            result['all_probabilities'] = np.asarray(probabilities).tolist()
+        
+        return result
+    
+    @staticmethod
+    def _error_result(message):
+        """Resultado de error para predict_batch"""
+        return {
+            'class': 'Error',
+            'confidence': 0.0,
+            'error': message
+        }
     
     def set_threshold(self, threshold):
         """
@@ -0,0 +1,309 @@
+"""
+Profiler - Muestreo de pilas bajo demanda en un worker en producción
+
+Cada `interval` segundos lee la pila de Python de todos los hilos del
+proceso (sys._current_frames) y cuenta las pilas repetidas. No instrumenta
+las funciones, así que el costo no depende de cuánto código se ejecute: unos
+microsegundos por muestra y por hilo. El tiempo dentro de código nativo
+(NumPy, OpenCV, ONNX Runtime) se atribuye a la función de Python que lo
+llamó, que es lo que interesa para ubicar decodificación, ImageProcessor o
+Predictor.
+
+La salida "collapsed" (una línea `marco;marco;marco cuenta` por pila) es la
+que consumen flamegraph.pl, speedscope e Inferno. Opcionalmente se toma un
+snapshot de tracemalloc al inicio y otro al final para ver qué líneas
+retuvieron memoria durante la ventana.
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Hojas que solo indican un hilo esperando (se omiten salvo include_idle)
+IDLE_LEAVES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('queue.py', 'get'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('socketserver.py', 'serve_forever'),
+    ('ssl.py', 'read'),
+}
+
+
+def _thread_label(name):
+    """Nombre de hilo sin contadores (Thread-12 y Thread-13 se agrupan)"""
+    return re.sub(r'[-_ ]?\d+', '', name) or 'thread'
+
+
+class Profile:
+    """
+    Resultado de un muestreo
+    """
+
+    def __init__(self, stacks, samples, duration, interval, memory=None):
+        """
+        Args:
+            stacks (Counter): Pila colapsada -> número de muestras
+            samples (int): Rondas de muestreo realizadas
+            duration (float): Segundos reales de la ventana
+            interval (float): Intervalo configurado entre muestras
+            memory (list): Diferencias de tracemalloc (o None)
+        """
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+        self.interval = interval
+        self.memory = memory
+        self.created_at = datetime.now().isoformat()
+
+    def collapsed(self):
+        """Texto en formato collapsed (flamegraph.pl / speedscope)"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, top=20):
+        """
+        Funciones con más muestras
+
+        Returns:
+            dict: 'self' (la función era la hoja) y 'total' (aparecía en la pila),
+                  cada uno una lista de {'function', 'samples', 'percent'}
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        busy = sum(self.stacks.values()) or 1
+
+        def rank(counter):
+            return [{'function': frame, 'samples': count,
+                     'percent': round(count * 100 / busy, 2)}
+                    for frame, count in counter.most_common(top)]
+
+        return {'self': rank(own), 'total': rank(total)}
+
+    def to_dict(self, top=20):
+        """Resumen serializable con las pilas completas"""
+        return {
+            'created_at': self.created_at,
+            'pid': os.getpid(),
+            'duration_s': round(self.duration, 3),
+            'interval_ms': round(self.interval * 1000, 3),
+            'samples': self.samples,
+            'stack_samples': sum(self.stacks.values()),
+            'top_functions': self.top_functions(top),
+            'stacks': dict(self.stacks.most_common()),
+            'memory': self.memory
+        }
+
+    def save(self, path, output_format='collapsed'):
+        """Escribe el resultado en formato 'collapsed' o 'json'"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if output_format == 'json':
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.collapsed())
+
+
+class StackSampler:
+    """
+    Muestreador de pilas de todos los hilos del proceso
+    """
+
+    def __init__(self, interval=0.01, include_idle=False, line_numbers=False, max_depth=128):
+        """
+        Args:
+            interval (float): Segundos entre muestras
+            include_idle (bool): Incluir hilos bloqueados esperando trabajo
+            line_numbers (bool): Distinguir la línea en ejecución (si no, cada
+                                 marco se identifica por la línea donde empieza
+                                 la función)
+            max_depth (int): Marcos máximos por pila
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.line_numbers = line_numbers
+        self.max_depth = max_depth
+
+    def _frame_label(self, frame):
+        code = frame.f_code
+        line = frame.f_lineno if self.line_numbers else code.co_firstlineno
+        # Carpeta y archivo: distingue flask/app.py del app.py del proyecto
+        directory, filename = os.path.split(code.co_filename)
+        return f"{code.co_name} ({os.path.basename(directory)}/{filename}:{line})"
+
+    def sample(self, stacks, exclude=()):
+        """
+        Agrega una muestra de cada hilo a stacks
+
+        Args:
+            stacks (Counter): Acumulador de pilas colapsadas
+            exclude (iterable): Identificadores de hilo a ignorar
+        """
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id in exclude:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename),
+                                          code.co_name) in IDLE_LEAVES:
+                continue
+
+            labels = []
+            while frame is not None and len(labels) < self.max_depth:
+                labels.append(self._frame_label(frame))
+                frame = frame.f_back
+            labels.append(_thread_label(names.get(thread_id, 'thread')))
+            stacks[';'.join(reversed(labels))] += 1
+
+    def run(self, seconds, stop_event=None):
+        """
+        Muestrea durante una ventana (bloquea el hilo que llama)
+
+        Args:
+            seconds (float): Duración de la ventana
+            stop_event (threading.Event): Permite terminar antes
+
+        Returns:
+            tuple: (Counter de pilas, muestras, duración real)
+        """
+        stacks = Counter()
+        exclude = {threading.get_ident()}
+        samples = 0
+        start = time.perf_counter()
+        next_sample = start
+        end = start + seconds
+        while True:
+            now = time.perf_counter()
+            if now >= end or (stop_event is not None and stop_event.is_set()):
+                break
+            if now < next_sample:
+                time.sleep(next_sample - now)
+                continue
+            self.sample(stacks, exclude)
+            samples += 1
+            # Sin ráfagas de recuperación si una muestra se atrasó
+            next_sample = max(next_sample + self.interval, time.perf_counter())
+        return stacks, samples, time.perf_counter() - start
+
+
+def _memory_diff(before, after, top, key_type='lineno'):
+    """Líneas que más memoria retuvieron entre dos snapshots"""
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, __file__)]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    return [{
+        'location': str(stat.traceback[0]) if stat.traceback else '?',
+        'size_diff_kb': round(stat.size_diff / 1024, 1),
+        'size_kb': round(stat.size / 1024, 1),
+        'count_diff': stat.count_diff
+    } for stat in after.compare_to(before, key_type)[:top]]
+
+
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Ya hay un muestreo en curso en este proceso"""
+
+
+def profile(seconds, interval=0.01, memory=False, memory_top=25, include_idle=False,
+            line_numbers=False):
+    """
+    Muestrea las pilas del proceso (y opcionalmente la memoria) durante una ventana
+
+    Solo se permite un muestreo a la vez por proceso. Con memory=True se
+    activa tracemalloc durante la ventana (si no estaba activo), lo que
+    encarece cada asignación de memoria mientras dura.
+
+    Args:
+        seconds (float): Duración de la ventana
+        interval (float): Segundos entre muestras
+        memory (bool): Comparar snapshots de tracemalloc al inicio y al final
+        memory_top (int): Líneas a reportar en la comparación
+        include_idle (bool): Incluir hilos bloqueados esperando trabajo
+        line_numbers (bool): Distinguir la línea en ejecución
+
+    Returns:
+        Profile: Resultado
+
+    Raises:
+        ProfilerBusy: Si ya hay un muestreo en curso
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("Ya hay un muestreo en curso en este worker")
+    started_tracing = False
+    try:
+        before = None
+        if memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        sampler = StackSampler(interval, include_idle, line_numbers)
+        stacks, samples, duration = sampler.run(seconds)
+
+        memory_stats = None
+        if memory:
+            memory_stats = _memory_diff(before, tracemalloc.take_snapshot(), memory_top)
+
+        logger.info(f"Perfil de {duration:.1f}s: {samples} muestras, "
+                    f"{sum(stacks.values())} pilas, {len(stacks)} distintas")
+        return Profile(stacks, samples, duration, interval, memory_stats)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+
+def profile_in_background(path, seconds, output_format='collapsed', **kwargs):
+    """
+    Lanza profile() en un hilo y guarda el resultado en un archivo
+
+    Para workers de un solo hilo: la petición que lo inicia termina de
+    inmediato y el worker sigue atendiendo tráfico durante la ventana.
+
+    Args:
+        path (str): Archivo de salida (se escribe al terminar)
+        seconds (float): Duración de la ventana
+        output_format (str): 'collapsed' o 'json'
+        **kwargs: Argumentos de profile()
+
+    Returns:
+        threading.Thread: Hilo del muestreo
+
+    Raises:
+        ProfilerBusy: Si ya hay un muestreo en curso
+    """
+    if _profile_lock.locked():
+        raise ProfilerBusy("Ya hay un muestreo en curso en este worker")
+
+    def run():
+        try:
+            result = profile(seconds, **kwargs)
+            temp_path = f"{path}.tmp"
+            result.save(temp_path, output_format)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.error(f"Error en el muestreo en segundo plano: {e}")
+
+    thread = threading.Thread(target=run, name='profiler', daemon=True)
+    thread.start()
+    return thread
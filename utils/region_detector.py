@@ -0,0 +1,200 @@
+"""
+Region Detector - Clasificación de varios documentos en una misma foto
+
+Cuando en una foto aparecen varios documentos (por ejemplo, un título y una
+INE lado a lado) se localizan regiones candidatas con un detector barato de
+contornos (o una rejilla) y se clasifican todas a partir de un único mapa de
+características del backbone (ver Predictor.predict_regions).
+"""
+
+import logging
+import math
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# El mapa de características de MobileNetV2 reduce la entrada 32 veces
+FEATURE_STRIDE = 32
+
+
+def grid_boxes(width, height, rows=2, cols=2, overlap=0.25):
+    """
+    Regiones de una rejilla con traslape
+
+    Args:
+        width (int): Ancho de la imagen
+        height (int): Alto de la imagen
+        rows (int): Filas de la rejilla
+        cols (int): Columnas de la rejilla
+        overlap (float): Traslape entre celdas vecinas (0-1)
+
+    Returns:
+        list: Regiones (x, y, ancho, alto)
+    """
+    box_w = width / (cols - (cols - 1) * overlap)
+    box_h = height / (rows - (rows - 1) * overlap)
+    boxes = []
+    for row in range(rows):
+        for col in range(cols):
+            x = col * box_w * (1 - overlap)
+            y = row * box_h * (1 - overlap)
+            boxes.append((int(x), int(y), int(round(box_w)), int(round(box_h))))
+    return boxes
+
+
+def _overlap_ratio(a, b):
+    """Intersección sobre el área de la región más pequeña"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    return inter_w * inter_h / min(aw * ah, bw * bh)
+
+
+class DocumentLocalizer:
+    """
+    Localizador de documentos por contornos
+
+    Busca rectángulos grandes de bordes (hojas, credenciales) sobre una
+    versión reducida de la imagen. No es un detector entrenado: solo propone
+    candidatos baratos para clasificar.
+    """
+
+    def __init__(self, max_regions=6, min_area_ratio=0.04, max_area_ratio=0.9, work_size=512):
+        """
+        Inicializa el localizador
+
+        Args:
+            max_regions (int): Máximo de regiones devueltas
+            min_area_ratio (float): Área mínima de una región (fracción de la imagen)
+            max_area_ratio (float): Área máxima (regiones mayores equivalen a la imagen completa)
+            work_size (int): Lado mayor de la imagen reducida usada para buscar bordes
+        """
+        self.max_regions = max_regions
+        self.min_area_ratio = min_area_ratio
+        self.max_area_ratio = max_area_ratio
+        self.work_size = work_size
+
+    def find(self, image):
+        """
+        Propone regiones candidatas
+
+        Args:
+            image (np.array): Imagen BGR original
+
+        Returns:
+            list: Regiones (x, y, ancho, alto) en píxeles de la imagen original,
+                  de mayor a menor área
+        """
+        h, w = image.shape[:2]
+        scale = min(1.0, self.work_size / max(h, w))
+        small = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        edges = cv2.Canny(gray, 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8), iterations=2)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        image_area = small.shape[0] * small.shape[1]
+        candidates = []
+        for contour in contours:
+            x, y, bw, bh = cv2.boundingRect(contour)
+            area_ratio = bw * bh / image_area
+            aspect = bw / bh
+            if self.min_area_ratio <= area_ratio <= self.max_area_ratio and 0.25 <= aspect <= 4.0:
+                candidates.append((x, y, bw, bh))
+
+        # Descartar regiones contenidas casi por completo en otra mayor
+        candidates.sort(key=lambda box: box[2] * box[3], reverse=True)
+        selected = []
+        for box in candidates:
+            if all(_overlap_ratio(box, other) < 0.8 for other in selected):
+                selected.append(box)
+            if len(selected) >= self.max_regions:
+                break
+
+        return [(int(x / scale), int(y / scale), int(bw / scale), int(bh / scale))
+                for x, y, bw, bh in selected]
+
+
+class RegionDetector:
+    """
+    Clasificación por regiones con un solo mapa de características
+    """
+
+    def __init__(self, predictor, image_processor, localizer=None, long_side=448):
+        """
+        Inicializa el detector por regiones
+
+        Args:
+            predictor (Predictor): Predictor con el modelo
+            image_processor (ImageProcessor): Procesador de imágenes
+            localizer (DocumentLocalizer): Localizador (default: uno nuevo)
+            long_side (int): Lado mayor de la entrada al backbone (múltiplo de 32)
+        """
+        self.predictor = predictor
+        self.image_processor = image_processor
+        self.localizer = localizer or DocumentLocalizer()
+        self.long_side = long_side
+
+    def _input_size(self, width, height):
+        """Tamaño de entrada que preserva el aspecto, redondeado a múltiplos de 32"""
+        scale = self.long_side / max(width, height)
+        input_w = max(FEATURE_STRIDE, math.ceil(width * scale / FEATURE_STRIDE) * FEATURE_STRIDE)
+        input_h = max(FEATURE_STRIDE, math.ceil(height * scale / FEATURE_STRIDE) * FEATURE_STRIDE)
+        return input_w, input_h
+
+    def detect(self, image, source='auto', grid=(2, 2), return_all_probabilities=False):
+        """
+        Clasifica la imagen completa y cada región candidata
+
+        Args:
+            image (np.array): Imagen BGR original
+            source (str): 'contours', 'grid' o 'auto' (contornos y, si no
+                          encuentra regiones, rejilla)
+            grid (tuple): Filas y columnas de la rejilla
+            return_all_probabilities (bool): Si retornar todas las probabilidades
+
+        Returns:
+            dict: {'image': resultado completo, 'regions': [resultado + 'box'],
+                   'source': origen de las regiones, 'input_size': (ancho, alto)}
+        """
+        h, w = image.shape[:2]
+
+        boxes = []
+        used_source = source
+        if source in ('auto', 'contours'):
+            boxes = self.localizer.find(image)
+            used_source = 'contours'
+        if source == 'grid' or (source == 'auto' and not boxes):
+            boxes = grid_boxes(w, h, *grid)
+            used_source = 'grid'
+
+        input_size = self._input_size(w, h)
+        canvas, (scale, x_offset, y_offset) = self.image_processor.resize_preserve_aspect(
+            image, input_size, return_transform=True)
+        canvas = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+
+        canvas_boxes = [(x * scale + x_offset, y * scale + y_offset, bw * scale, bh * scale)
+                        for x, y, bw, bh in boxes]
+        whole, regions = self.predictor.predict_regions(canvas, canvas_boxes,
+                                                        return_all_probabilities)
+
+        for result, (x, y, bw, bh) in zip(regions, boxes):
+            result['box'] = {'x': x, 'y': y, 'width': bw, 'height': bh}
+
+        return {
+            'image': whole,
+            'regions': regions,
+            'source': used_source,
+            'input_size': input_size
+        }
+
+    def __repr__(self):
+        return f"RegionDetector(long_side={self.long_side})"
@@ -0,0 +1,812 @@
+"""
+Similarity Index - Búsqueda de documentos casi duplicados
+
+Índice de similitud coseno sobre los embeddings del backbone. Con pocos
+vectores se usa búsqueda exacta (una multiplicación de matrices); al superar
+un umbral el índice se convierte a particiones k-means con vectores
+cuantizados a int8 (IVF), que solo revisa las particiones más cercanas a la
+consulta.
+
+Estructura de la carpeta persistida:
+    index.json      tipo, dimensión, parámetros y hash del backbone
+    ids.json        identificador de cada vector (en orden de inserción)
+    vectors.npy     (flat) vectores normalizados float32
+    centroids.npy   (ivf) centroides de las particiones
+    codes.npy       (ivf) vectores cuantizados int8
+    scales.npy      (ivf) escala de cada vector cuantizado
+    lists.npy       (ivf) partición de cada vector
+
+Junto a la carpeta viven <carpeta>.lock (bloqueo entre procesos) y, con
+SharedSimilarityIndex, <carpeta>.journal (inserciones aún no consolidadas) y
+<carpeta>.ivf.lock (un solo proceso entrena las particiones IVF).
+"""
+
+import glob
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+from .file_lock import file_lock as _file_lock
+
+logger = logging.getLogger(__name__)
+
+_RECORD_HEADER = struct.Struct('<I')
+# Cada diario empieza con su generación: la consolidación N crea el diario N
+_JOURNAL_HEADER = struct.Struct('<Q')
+
+
+def _lock_path(directory):
+    return directory.rstrip(os.sep) + '.lock'
+
+
+def _remove_stale(directory):
+    """Borra temporales de guardados interrumpidos (requiere el bloqueo exclusivo)"""
+    base = directory.rstrip(os.sep)
+    for pattern in ('.tmp', '.old', '.tmp-*', '.old-*', '.journal-*'):
+        for path in glob.glob(glob.escape(base) + pattern):
+            logger.warning(f"Eliminando temporal de un guardado interrumpido: {path}")
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+def normalize(vectors):
+    """
+    Normaliza vectores a norma 1 (similitud coseno = producto punto)
+
+    Args:
+        vectors (np.array): Matriz (N, D) o vector (D,)
+
+    Returns:
+        np.array: Matriz (N, D) float32 normalizada
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores, k):
+    """Índices de los k mayores puntajes por fila, ordenados de mayor a menor"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+class _Buffer:
+    """Arreglo que crece duplicando su capacidad (inserciones amortizadas O(1))"""
+
+    def __init__(self, shape_tail, dtype, capacity=64):
+        self.data = np.empty((capacity,) + tuple(shape_tail), dtype=dtype)
+        self.size = 0
+
+    def extend(self, rows):
+        needed = self.size + len(rows)
+        if needed > len(self.data):
+            capacity = max(needed, 2 * len(self.data))
+            grown = np.empty((capacity,) + self.data.shape[1:], dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = rows
+        self.size = needed
+
+    @property
+    def view(self):
+        return self.data[:self.size]
+
+
+class FlatIndex:
+    """Búsqueda exacta por fuerza bruta"""
+
+    kind = 'flat'
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._vectors = _Buffer((dim,), np.float32)
+
+    def __len__(self):
+        return self._vectors.size
+
+    def add(self, vectors):
+        """Agrega vectores ya normalizados"""
+        self._vectors.extend(vectors)
+
+    def search(self, queries, k):
+        """
+        Busca los k vecinos más similares
+
+        Args:
+            queries (np.array): Consultas normalizadas (Q, D)
+            k (int): Número de vecinos
+
+        Returns:
+            tuple: (puntajes (Q, k), filas (Q, k))
+        """
+        scores = queries @ self._vectors.view.T
+        rows = _top_k(scores, k)
+        return np.take_along_axis(scores, rows, axis=1), rows
+
+    def vectors(self):
+        """Vectores almacenados en orden de inserción"""
+        return self._vectors.view
+
+    def save(self, directory):
+        np.save(os.path.join(directory, 'vectors.npy'), self._vectors.view)
+
+    @classmethod
+    def load(cls, directory, dim, params):
+        index = cls(dim)
+        index.add(np.load(os.path.join(directory, 'vectors.npy')))
+        return index
+
+
+class IVFIndex:
+    """
+    Índice de archivo invertido con cuantización escalar int8
+
+    Los vectores se asignan a la partición de su centroide más cercano y se
+    guardan como int8 con una escala por vector (4 veces menos memoria que
+    float32). Una consulta solo revisa las n_probe particiones más cercanas.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, centroids, n_probe=8):
+        """
+        Args:
+            centroids (np.array): Centroides normalizados (n_lists, D)
+            n_probe (int): Particiones revisadas por consulta
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.n_probe = n_probe
+        self._lists = [self._new_list() for _ in range(len(self.centroids))]
+        self._count = 0
+
+    def _new_list(self):
+        return {
+            'codes': _Buffer((self.dim,), np.int8),
+            'scales': _Buffer((), np.float32),
+            'rows': _Buffer((), np.int64)
+        }
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def train(vectors, n_lists, iterations=10, seed=0):
+        """
+        Entrena centroides con k-means esférico
+
+        Args:
+            vectors (np.array): Muestra de vectores normalizados (N, D)
+            n_lists (int): Número de particiones
+            iterations (int): Iteraciones de k-means
+            seed (int): Semilla de la inicialización
+
+        Returns:
+            np.array: Centroides normalizados (n_lists, D)
+        """
+        rng = np.random.default_rng(seed)
+        n_lists = min(n_lists, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = (vectors @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            # Particiones vacías: reiniciar con un vector al azar
+            empty = counts == 0
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids
+
+    @staticmethod
+    def quantize(vectors):
+        """
+        Cuantiza vectores a int8 con una escala por vector
+
+        Returns:
+            tuple: (códigos (N, D) int8, escalas (N,) float32)
+        """
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.maximum(scales, 1e-12).astype(np.float32)
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+
+    def add(self, vectors, rows=None):
+        """
+        Agrega vectores ya normalizados
+
+        Args:
+            vectors (np.array): Vectores (N, D)
+            rows (np.array): Fila global de cada vector (default: consecutivas)
+        """
+        if rows is None:
+            rows = np.arange(self._count, self._count + len(vectors))
+        assignments = (vectors @ self.centroids.T).argmax(axis=1)
+        self._add_assigned(vectors, rows, assignments)
+
+    def _add_assigned(self, vectors, rows, assignments):
+        codes, scales = self.quantize(vectors)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._lists) + 1))
+        for list_id in range(len(self._lists)):
+            members = order[bounds[list_id]:bounds[list_id + 1]]
+            if len(members):
+                inverted = self._lists[list_id]
+                inverted['codes'].extend(codes[members])
+                inverted['scales'].extend(scales[members])
+                inverted['rows'].extend(np.asarray(rows)[members])
+        self._count += len(vectors)
+
+    def search(self, queries, k):
+        """
+        Busca los k vecinos aproximados
+
+        Las consultas que revisan la misma partición se evalúan juntas en una
+        sola multiplicación de matrices.
+
+        Args:
+            queries (np.array): Consultas normalizadas (Q, D)
+            k (int): Número de vecinos
+
+        Returns:
+            tuple: (puntajes (Q, k), filas (Q, k)); filas -1 si faltan candidatos
+        """
+        n_probe = min(self.n_probe, len(self._lists))
+        probes = _top_k(queries @ self.centroids.T, n_probe)
+
+        candidates = [[] for _ in range(len(queries))]
+        for list_id in np.unique(probes):
+            inverted = self._lists[list_id]
+            if inverted['rows'].size == 0:
+                continue
+            query_ids = np.nonzero((probes == list_id).any(axis=1))[0]
+            codes = inverted['codes'].view.astype(np.float32)
+            scores = (queries[query_ids] @ codes.T) * inverted['scales'].view
+            for position, query_id in enumerate(query_ids):
+                candidates[query_id].append((scores[position], inverted['rows'].view))
+
+        result_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        result_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for query_id, parts in enumerate(candidates):
+            if not parts:
+                continue
+            scores = np.concatenate([part[0] for part in parts])
+            rows = np.concatenate([part[1] for part in parts])
+            best = _top_k(scores[None], k)[0]
+            result_scores[query_id, :len(best)] = scores[best]
+            result_rows[query_id, :len(best)] = rows[best]
+        return result_scores, result_rows
+
+    def save(self, directory):
+        codes, scales, lists, rows = [], [], [], []
+        for list_id, inverted in enumerate(self._lists):
+            codes.append(inverted['codes'].view)
+            scales.append(inverted['scales'].view)
+            rows.append(inverted['rows'].view)
+            lists.append(np.full(inverted['rows'].size, list_id, dtype=np.int32))
+        order = np.argsort(np.concatenate(rows))
+        np.save(os.path.join(directory, 'centroids.npy'), self.centroids)
+        np.save(os.path.join(directory, 'codes.npy'), np.concatenate(codes)[order])
+        np.save(os.path.join(directory, 'scales.npy'), np.concatenate(scales)[order])
+        np.save(os.path.join(directory, 'lists.npy'), np.concatenate(lists)[order])
+
+    @classmethod
+    def load(cls, directory, dim, params):
+        index = cls(np.load(os.path.join(directory, 'centroids.npy')), params.get('n_probe', 8))
+        codes = np.load(os.path.join(directory, 'codes.npy'))
+        scales = np.load(os.path.join(directory, 'scales.npy'))
+        lists = np.load(os.path.join(directory, 'lists.npy'))
+        # Los vectores ya están cuantizados: se insertan directamente en su partición
+        order = np.argsort(lists, kind='stable')
+        bounds = np.searchsorted(lists[order], np.arange(len(index._lists) + 1))
+        for list_id, inverted in enumerate(index._lists):
+            members = order[bounds[list_id]:bounds[list_id + 1]]
+            inverted['codes'].extend(codes[members])
+            inverted['scales'].extend(scales[members])
+            inverted['rows'].extend(members)
+        index._count = len(codes)
+        return index
+
+
+class SimilarityIndex:
+    """
+    Índice de casi duplicados con identificadores y persistencia
+
+    Empieza con búsqueda exacta; build_ivf() la reemplaza por IVF cuando el
+    número de vectores supera ivf_threshold (needs_ivf). add() nunca entrena
+    particiones: eso lo decide quien usa el índice (la CLI antes de guardar,
+    SharedSimilarityIndex en segundo plano). Los identificadores repetidos
+    se ignoran.
+    """
+
+    def __init__(self, dim, backbone_hash=None, ivf_threshold=50000, n_probe=8):
+        """
+        Inicializa un índice vacío
+
+        Args:
+            dim (int): Dimensión de los embeddings
+            backbone_hash (str): Hash del backbone que produce los embeddings
+            ivf_threshold (int): Vectores a partir de los cuales se usa IVF (0 = nunca)
+            n_probe (int): Particiones revisadas por consulta en modo IVF
+        """
+        self.dim = dim
+        self.backbone_hash = backbone_hash
+        self.ivf_threshold = ivf_threshold
+        self.n_probe = n_probe
+        self.ids = []
+        self._rows = {}
+        self._index = FlatIndex(dim)
+        # Generación del diario que continúa este índice (SharedSimilarityIndex)
+        self.journal_generation = 0
+        self._lock = threading.RLock()
+
+    @property
+    def kind(self):
+        return self._index.kind
+
+    @property
+    def needs_ivf(self):
+        """True si la búsqueda exacta superó ivf_threshold"""
+        return (self._index.kind == 'flat' and bool(self.ivf_threshold)
+                and len(self._index) >= self.ivf_threshold)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    def add(self, ids, embeddings):
+        """
+        Agrega embeddings (inserción incremental)
+
+        Args:
+            ids (list): Identificadores (por ejemplo, hash de contenido)
+            embeddings (np.array): Embeddings (N, D) sin normalizar
+
+        Returns:
+            int: Número de vectores nuevos
+        """
+        vectors = normalize(embeddings)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Se esperaban embeddings de dimensión {self.dim}")
+
+        with self._lock:
+            keep = []
+            for i, item_id in enumerate(ids):
+                if item_id not in self._rows:
+                    self._rows[item_id] = len(self.ids)
+                    self.ids.append(item_id)
+                    keep.append(i)
+            if not keep:
+                return 0
+
+            self._index.add(vectors[keep])
+            return len(keep)
+
+    def build_ivf(self):
+        """
+        Entrena particiones con los vectores actuales y migra a IVF
+
+        El entrenamiento (segundos con decenas de miles de vectores) se hace
+        sin el bloqueo: las búsquedas y las inserciones siguen usando el
+        índice exacto, y las inserciones de ese intervalo se agregan al IVF
+        antes de reemplazarlo.
+
+        Returns:
+            bool: True si se migró (False si ya era IVF)
+        """
+        with self._lock:
+            if self._index.kind != 'flat' or len(self._index) == 0:
+                return False
+            flat = self._index
+            vectors = flat.vectors().copy()
+
+        n_lists = max(1, int(4 * np.sqrt(len(vectors))))
+        sample_size = min(len(vectors), 32 * n_lists)
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)]
+        logger.info(f"Convirtiendo índice a IVF ({len(vectors)} vectores, {n_lists} particiones)")
+        ivf = IVFIndex(IVFIndex.train(sample, n_lists), self.n_probe)
+        ivf.add(vectors)
+
+        with self._lock:
+            if self._index is not flat:
+                return False
+            pending = flat.vectors()[len(vectors):]
+            if len(pending):
+                ivf.add(pending)
+            self._index = ivf
+        logger.info(f"Índice convertido a IVF ({len(ivf)} vectores)")
+        return True
+
+    def search(self, embeddings, k=5):
+        """
+        Busca los k documentos más similares
+
+        Args:
+            embeddings (np.array): Embeddings de consulta (Q, D) o (D,)
+            k (int): Número de vecinos por consulta
+
+        Returns:
+            list: Por consulta, lista de {'id', 'score'} ordenada de mayor a menor
+        """
+        queries = normalize(embeddings)
+        with self._lock:
+            if len(self.ids) == 0:
+                return [[] for _ in range(len(queries))]
+            scores, rows = self._index.search(queries, k)
+            return [
+                [{'id': self.ids[row], 'score': round(float(score), 4)}
+                 for score, row in zip(query_scores, query_rows) if row >= 0]
+                for query_scores, query_rows in zip(scores, rows)
+            ]
+
+    def save(self, directory):
+        """
+        Guarda el índice en una carpeta
+
+        Se escribe en una carpeta temporal propia del proceso y se renombra
+        bajo el bloqueo exclusivo de <carpeta>.lock, de modo que un lector
+        nunca ve un índice a medias y dos procesos no chocan al guardar.
+
+        Args:
+            directory (str): Carpeta destino
+        """
+        with self._lock, _file_lock(_lock_path(directory), exclusive=True):
+            self._write(directory)
+
+    def _write(self, directory):
+        """Escribe el índice (el llamador tiene el bloqueo exclusivo)"""
+        directory = directory.rstrip(os.sep)
+        parent, base = os.path.split(os.path.abspath(directory))
+        _remove_stale(directory)
+
+        temp_dir = tempfile.mkdtemp(prefix=f"{base}.tmp-", dir=parent)
+        try:
+            self._index.save(temp_dir)
+            with open(os.path.join(temp_dir, 'ids.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.ids, f)
+            with open(os.path.join(temp_dir, 'index.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'kind': self._index.kind,
+                    'dim': self.dim,
+                    'count': len(self.ids),
+                    'backbone_hash': self.backbone_hash,
+                    'ivf_threshold': self.ivf_threshold,
+                    'n_probe': self.n_probe,
+                    'journal_generation': self.journal_generation
+                }, f, indent=2)
+
+            if os.path.isdir(directory):
+                old_dir = tempfile.mkdtemp(prefix=f"{base}.old-", dir=parent)
+                os.replace(directory, os.path.join(old_dir, base))
+                os.replace(temp_dir, directory)
+                shutil.rmtree(old_dir, ignore_errors=True)
+            else:
+                os.replace(temp_dir, directory)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        logger.info(f"Índice guardado en {directory} ({len(self.ids)} vectores, {self.kind})")
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Carga un índice guardado
+
+        Args:
+            directory (str): Carpeta del índice
+
+        Returns:
+            SimilarityIndex: Índice cargado
+
+        Raises:
+            FileNotFoundError: Si la carpeta no contiene un índice
+        """
+        with _file_lock(_lock_path(directory), exclusive=False):
+            return cls._read(directory)
+
+    @classmethod
+    def _read(cls, directory):
+        """Lee el índice (el llamador tiene el bloqueo)"""
+        meta_path = os.path.join(directory, 'index.json')
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Índice no encontrado: {directory}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, 'ids.json'), 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+
+        index = cls(meta['dim'], meta.get('backbone_hash'),
+                    meta.get('ivf_threshold', 50000), meta.get('n_probe', 8))
+        index_class = IVFIndex if meta['kind'] == 'ivf' else FlatIndex
+        index._index = index_class.load(directory, meta['dim'], meta)
+        index.ids = ids
+        index._rows = {item_id: row for row, item_id in enumerate(ids)}
+        index.journal_generation = meta.get('journal_generation', 0)
+        logger.info(f"Índice cargado: {directory} ({len(ids)} vectores, {meta['kind']})")
+        return index
+
+    def stats(self):
+        """
+        Resumen del índice
+
+        Returns:
+            dict: Tipo, número de vectores y parámetros
+        """
+        stats = {
+            'kind': self.kind,
+            'count': len(self.ids),
+            'dim': self.dim,
+            'backbone_hash': self.backbone_hash[:12] if self.backbone_hash else None
+        }
+        if self.kind == 'ivf':
+            stats['n_lists'] = len(self._index.centroids)
+            stats['n_probe'] = self._index.n_probe
+        return stats
+
+    @staticmethod
+    def stored_kind(directory):
+        """Tipo del índice guardado en una carpeta ('flat', 'ivf' o None)"""
+        try:
+            with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+                return json.load(f).get('kind')
+        except (OSError, ValueError):
+            return None
+
+    def __repr__(self):
+        return f"SimilarityIndex(kind='{self.kind}', count={len(self.ids)}, dim={self.dim})"
+
+
+class SharedSimilarityIndex:
+    """
+    SimilarityIndex compartido por varios procesos (workers de gunicorn)
+
+    Cada proceso tiene su copia en memoria. Las inserciones se agregan a un
+    diario (<carpeta>.journal) bajo el bloqueo exclusivo y cada proceso
+    aplica las de los demás antes de buscar, así un documento registrado en
+    un worker se detecta como duplicado en todos. compact() consolida el
+    diario en la carpeta del índice y empieza uno nuevo; los procesos
+    terminan de leer el anterior por su descriptor abierto. Un proceso que
+    se saltó una generación completa del diario recarga la carpeta.
+
+    Al superar ivf_threshold, el proceso que agregó los vectores entrena el
+    IVF en un hilo en segundo plano (uno a la vez entre procesos, con
+    <carpeta>.ivf.lock) y lo consolida; los demás siguen con búsqueda exacta
+    hasta que cargan esa carpeta al cambiar de diario.
+    """
+
+    def __init__(self, directory, dim=None, backbone_hash=None, ivf_threshold=50000):
+        """
+        Carga el índice de la carpeta y las inserciones del diario
+
+        Args:
+            directory (str): Carpeta del índice
+            dim (int): Dimensión de los embeddings (requerida si aún no hay índice)
+            backbone_hash (str): Hash del backbone (si aún no hay índice)
+            ivf_threshold (int): Vectores a partir de los cuales se usa IVF
+
+        Raises:
+            FileNotFoundError: Si no hay índice y no se indicó dim
+        """
+        self.directory = directory.rstrip(os.sep)
+        self.journal_path = self.directory + '.journal'
+        self.lock_path = _lock_path(self.directory)
+        self.ivf_lock_path = self.directory + '.ivf.lock'
+        self.journal_records = 0
+        self._journal = None
+        self._journal_inode = None
+        self._generation = None
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._ivf_thread = None
+
+        with self._lock, _file_lock(self.lock_path, exclusive=False):
+            if os.path.exists(os.path.join(self.directory, 'index.json')):
+                self.index = SimilarityIndex._read(self.directory)
+            elif dim is None:
+                raise FileNotFoundError(f"Índice no encontrado: {self.directory}")
+            else:
+                self.index = SimilarityIndex(dim, backbone_hash, ivf_threshold)
+            self._sync()
+
+    @property
+    def backbone_hash(self):
+        return self.index.backbone_hash
+
+    def __len__(self):
+        return len(self.index)
+
+    def _encode(self, item_id, vector):
+        encoded = item_id.encode('utf-8')
+        return _RECORD_HEADER.pack(len(encoded)) + encoded + vector.astype('<f4').tobytes()
+
+    def _read_journal(self):
+        """Aplica los registros completos desde la última posición leída"""
+        self._journal.seek(self._offset)
+        data = self._journal.read()
+        record_bytes = self.index.dim * 4
+        ids, vectors, position = [], [], 0
+        while position + _RECORD_HEADER.size <= len(data):
+            (length,) = _RECORD_HEADER.unpack_from(data, position)
+            end = position + _RECORD_HEADER.size + length + record_bytes
+            if end > len(data):
+                # Registro incompleto (escritura interrumpida)
+                break
+            start = position + _RECORD_HEADER.size
+            ids.append(data[start:start + length].decode('utf-8'))
+            vectors.append(np.frombuffer(data, '<f4', self.index.dim, start + length))
+            position = end
+        self._offset += position
+        self.journal_records += len(ids)
+        if ids:
+            self.index.add(ids, np.stack(vectors))
+
+    def _sync(self):
+        """Aplica el diario actual (el llamador tiene el bloqueo de archivo)"""
+        if self._journal is not None:
+            self._read_journal()
+            try:
+                inode = os.stat(self.journal_path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if inode == self._journal_inode:
+                return
+            # compact() empezó un diario nuevo: el anterior ya se leyó completo
+            self._journal.close()
+            self._journal = None
+        if not os.path.exists(self.journal_path):
+            return
+
+        journal = open(self.journal_path, 'rb')
+        header = journal.read(_JOURNAL_HEADER.size)
+        (generation,) = _JOURNAL_HEADER.unpack(header)
+        expected = (self.index.journal_generation if self._generation is None
+                    else self._generation + 1)
+        if generation != expected:
+            # Hubo consolidaciones intermedias: la carpeta ya incluye sus diarios
+            logger.info(f"Recargando el índice de {self.directory} "
+                        f"(diario {generation}, se esperaba {expected})")
+            self.index = SimilarityIndex._read(self.directory)
+        elif (self.index.kind == 'flat'
+              and SimilarityIndex.stored_kind(self.directory) == 'ivf'):
+            # Otro proceso consolidó el índice ya convertido a IVF
+            logger.info(f"Cargando el índice IVF de {self.directory}")
+            self.index = SimilarityIndex._read(self.directory)
+        self._journal = journal
+        self._journal_inode = os.fstat(journal.fileno()).st_ino
+        self._generation = generation
+        self._offset = _JOURNAL_HEADER.size
+        self.journal_records = 0
+        self._read_journal()
+
+    def _create_journal(self, generation):
+        """Reemplaza el diario por uno vacío de la generación indicada"""
+        parent, base = os.path.split(os.path.abspath(self.journal_path))
+        handle, temp_path = tempfile.mkstemp(prefix=f"{base}-", dir=parent)
+        with os.fdopen(handle, 'wb') as f:
+            f.write(_JOURNAL_HEADER.pack(generation))
+        os.replace(temp_path, self.journal_path)
+
+    def refresh(self):
+        """Aplica las inserciones de otros procesos (sin bloqueo si no hay nuevas)"""
+        try:
+            st = os.stat(self.journal_path)
+            if st.st_ino == self._journal_inode and st.st_size == self._offset:
+                return
+        except FileNotFoundError:
+            if self._journal is None:
+                return
+        with self._lock, _file_lock(self.lock_path, exclusive=False):
+            self._sync()
+
+    def search(self, embeddings, k=5):
+        """Igual que SimilarityIndex.search, con las inserciones de todos los procesos"""
+        self.refresh()
+        return self.index.search(embeddings, k)
+
+    def add(self, ids, embeddings):
+        """
+        Agrega embeddings al diario compartido y a la copia en memoria
+
+        Args:
+            ids (list): Identificadores (por ejemplo, hash de contenido)
+            embeddings (np.array): Embeddings (N, D) sin normalizar
+
+        Returns:
+            int: Número de vectores nuevos
+        """
+        vectors = normalize(embeddings)
+        if vectors.shape[1] != self.index.dim:
+            raise ValueError(f"Se esperaban embeddings de dimensión {self.index.dim}")
+
+        with self._lock, _file_lock(self.lock_path, exclusive=True):
+            self._sync()
+            records, seen = [], set()
+            for item_id, vector in zip(ids, vectors):
+                if item_id not in self.index and item_id not in seen:
+                    seen.add(item_id)
+                    records.append(self._encode(item_id, vector))
+            if not records:
+                return 0
+            if self._journal is None:
+                self._create_journal(self.index.journal_generation)
+                self._sync()
+            with open(self.journal_path, 'ab') as f:
+                if f.tell() > self._offset:
+                    # Descartar la cola de una escritura interrumpida
+                    f.truncate(self._offset)
+                f.write(b''.join(records))
+            # Leer de vuelta lo escrito: todos los procesos aplican el mismo orden
+            self._sync()
+            if self.index.needs_ivf:
+                self._start_ivf_build()
+            return len(records)
+
+    def _start_ivf_build(self):
+        """Lanza el entrenamiento del IVF en segundo plano (el llamador tiene _lock)"""
+        if self._ivf_thread is not None and self._ivf_thread.is_alive():
+            return
+        self._ivf_thread = threading.Thread(target=self._build_ivf, name='similarity-ivf',
+                                            daemon=True)
+        self._ivf_thread.start()
+
+    def _build_ivf(self):
+        """Entrena el IVF y lo consolida para que los demás procesos lo carguen"""
+        try:
+            with _file_lock(self.ivf_lock_path, exclusive=True, blocking=False):
+                # Puede que otro proceso acabe de consolidar su IVF
+                self.refresh()
+                if not self.index.needs_ivf:
+                    return
+                if self.index.build_ivf():
+                    self.compact(min_records=0)
+        except BlockingIOError:
+            logger.debug("Otro proceso está entrenando el IVF")
+        except Exception as e:
+            logger.error(f"No se pudo convertir el índice a IVF: {e}")
+
+    def compact(self, min_records=1):
+        """
+        Consolida el diario en la carpeta del índice
+
+        Args:
+            min_records (int): Registros mínimos en el diario para consolidar
+                (0 = consolidar siempre, p. ej. tras convertir a IVF)
+
+        Returns:
+            bool: True si se consolidó
+        """
+        with self._lock, _file_lock(self.lock_path, exclusive=True):
+            self._sync()
+            if self._journal is None or self.journal_records < min_records:
+                return False
+            # La carpeta incluye los diarios hasta el actual; el siguiente la continúa
+            self.index.journal_generation = self._generation + 1
+            self.index._write(self.directory)
+            self._create_journal(self.index.journal_generation)
+            self._sync()
+            return True
+
+    def stats(self):
+        """Resumen del índice con los registros pendientes de consolidar"""
+        stats = self.index.stats()
+        stats['journal_records'] = self.journal_records
+        return stats
+
+    def __repr__(self):
+        return f"SharedSimilarityIndex({self.directory!r}, count={len(self.index)})"
@@ -0,0 +1,280 @@
+"""
+Static Assets - Recursos estáticos con huella de contenido y precompresión
+
+build_assets() copia cada archivo de static/ a static/dist/ con los primeros
+caracteres de su SHA-256 en el nombre (css/style.css -> dist/css/style.<hash>.css),
+escribe junto a cada copia sus variantes .br (si está instalado `brotli`) y
+.gz, y guarda el manifiesto que relaciona ambos nombres. Como el contenido de
+un archivo de dist/ nunca cambia, el navegador puede guardarlo un año sin
+volver a preguntar; al cambiar el archivo cambia su URL.
+
+AssetManifest lo usa el servidor para construir esas URLs en las plantillas
+y elegir la variante comprimida según Accept-Encoding. Sin manifiesto (no se
+ejecutó build_assets.py) las URLs son las originales y se revalidan con ETag.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Variantes en orden de preferencia: (Content-Encoding, extensión)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = {'.css', '.js', '.json', '.svg', '.html', '.txt', '.map', '.xml'}
+
+
+def _write_atomic(path, data):
+    """Escribe un archivo completo o nada (temporal + rename)"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0: el mismo contenido produce siempre el mismo .gz
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build_assets(static_dir, output_dir=BUILD_DIR, min_compress_size=256, clean=False):
+    """
+    Genera las copias con huella, sus variantes comprimidas y el manifiesto
+
+    Las copias de compilaciones anteriores se conservan (salvo clean=True)
+    para que las páginas ya servidas con las URLs viejas sigan funcionando
+    durante un despliegue.
+
+    Args:
+        static_dir (str): Carpeta static/
+        output_dir (str): Subcarpeta de salida dentro de static_dir
+        min_compress_size (int): Bytes mínimos para generar variantes comprimidas
+        clean (bool): Borrar de la salida lo que no pertenezca a esta compilación
+
+    Returns:
+        dict: Manifiesto {'version', 'assets': {original: {'path', 'size', 'encodings'}}}
+    """
+    output_root = os.path.join(static_dir, output_dir)
+    encodings = [(name, ext) for name, ext in ENCODINGS if name != 'br' or brotli is not None]
+    if brotli is None:
+        logger.warning("Paquete 'brotli' no instalado: solo se generan variantes gzip")
+
+    assets = {}
+    produced = {os.path.join(output_root, MANIFEST_NAME)}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and output_dir in dirs:
+            dirs.remove(output_dir)
+        dirs.sort()
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            stem, extension = os.path.splitext(relative)
+            digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+            hashed = f"{output_dir}/{stem}.{digest}{extension}"
+            target = os.path.join(static_dir, *hashed.split('/'))
+            produced.add(target)
+            if not os.path.exists(target):
+                _write_atomic(target, data)
+
+            available = []
+            if extension.lower() in COMPRESSIBLE and len(data) >= min_compress_size:
+                for encoding, suffix in encodings:
+                    variant = target + suffix
+                    if not os.path.exists(variant):
+                        compressed = _compress(data, encoding)
+                        # Una variante que no ahorra bytes no se publica
+                        if len(compressed) >= len(data):
+                            continue
+                        _write_atomic(variant, compressed)
+                    produced.add(variant)
+                    available.append(encoding)
+
+            assets[relative] = {'path': hashed, 'size': len(data), 'encodings': available}
+            sizes = ', '.join(f"{encoding} {os.path.getsize(target + suffix)}"
+                              for encoding, suffix in encodings if encoding in available)
+            logger.info(f"{relative} -> {hashed} ({len(data)} bytes"
+                        f"{', ' + sizes if sizes else ''})")
+
+    manifest = {'version': 1, 'assets': assets}
+    _write_atomic(os.path.join(output_root, MANIFEST_NAME),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    if clean:
+        removed = 0
+        for root, _, files in os.walk(output_root):
+            for name in files:
+                path = os.path.join(root, name)
+                if path not in produced:
+                    os.remove(path)
+                    removed += 1
+        logger.info(f"Archivos de compilaciones anteriores eliminados: {removed}")
+
+    logger.info(f"Manifiesto con {len(assets)} recursos: "
+                f"{os.path.join(output_root, MANIFEST_NAME)}")
+    return manifest
+
+
+def accepted_encodings(header):
+    """
+    Codificaciones aceptadas según un header Accept-Encoding
+
+    Args:
+        header (str): Valor del header (p. ej. 'gzip, deflate, br;q=0.9')
+
+    Returns:
+        set: Codificaciones con q > 0
+    """
+    accepted = set()
+    for part in (header or '').split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(token)
+    if '*' in accepted:
+        accepted.update(name for name, _ in ENCODINGS)
+    return accepted
+
+
+class AssetManifest:
+    """
+    URLs con huella y variantes precomprimidas de static/
+    """
+
+    def __init__(self, static_dir, output_dir=BUILD_DIR):
+        """
+        Args:
+            static_dir (str): Carpeta static/ (ruta absoluta)
+            output_dir (str): Subcarpeta generada por build_assets()
+        """
+        self.static_dir = static_dir
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(static_dir, output_dir, MANIFEST_NAME)
+        self._assets = {}
+        self._mtime = None
+        # Variantes en disco de cada archivo de dist/ (inmutables, no caducan)
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recarga el manifiesto si cambió en disco (un nuevo build_assets.py)
+
+        Returns:
+            bool: True si se recargó
+        """
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+
+        assets = {}
+        if mtime is not None:
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    assets = json.load(f).get('assets', {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Manifiesto de recursos ilegible ({self.manifest_path}): {e}")
+                return False
+        with self._lock:
+            self._assets = assets
+            self._mtime = mtime
+        if assets:
+            logger.info(f"Manifiesto de recursos cargado: {len(assets)} archivos")
+        return True
+
+    def url_path(self, filename):
+        """
+        Ruta (relativa a static/) con la que se debe enlazar un recurso
+
+        Args:
+            filename (str): Ruta original, p. ej. 'css/style.css'
+
+        Returns:
+            str: Ruta con huella, o la original si no está en el manifiesto
+        """
+        self.refresh()
+        entry = self._assets.get(filename)
+        return entry['path'] if entry else filename
+
+    def is_fingerprinted(self, filename):
+        """True si la ruta pertenece a dist/ (contenido inmutable)"""
+        return filename.startswith(f"{self.output_dir}/")
+
+    def _available_variants(self, filename):
+        variants = self._variants.get(filename)
+        if variants is None:
+            base = os.path.join(self.static_dir, *filename.split('/'))
+            if not os.path.isfile(base):
+                return ()
+            variants = tuple(encoding for encoding, suffix in ENCODINGS
+                             if os.path.isfile(base + suffix))
+            with self._lock:
+                self._variants[filename] = variants
+        return variants
+
+    def negotiate(self, filename, accept_encoding):
+        """
+        Elige el archivo a enviar según Accept-Encoding
+
+        Solo los archivos con huella tienen variantes precomprimidas.
+
+        Args:
+            filename (str): Ruta pedida (relativa a static/)
+            accept_encoding (str): Header Accept-Encoding de la petición
+
+        Returns:
+            tuple: (ruta a enviar, Content-Encoding o None)
+        """
+        if not self.is_fingerprinted(filename) or '..' in filename.split('/'):
+            return filename, None
+        variants = self._available_variants(filename)
+        if not variants:
+            return filename, None
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, suffix in ENCODINGS:
+            if encoding in variants and encoding in accepted:
+                return filename + suffix, encoding
+        return filename, None
+
+    @staticmethod
+    def mimetype(filename):
+        """Tipo MIME del archivo original (no el de su variante .gz/.br)"""
+        return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -0,0 +1,628 @@
+"""
+TFJS Model - Ejecución en NumPy de modelos TF.js Layers (Teachable Machine)
+
+Interpreta model.json + weights.bin exportados por Teachable Machine
+(MobileNetV2 + GlobalAveragePooling2D + cabeza Dense) sin depender de
+TensorFlow. Al cargar se "optimiza" el grafo: BatchNormalization se pliega
+en la convolución anterior, ReLU/ReLU6 y ZeroPadding2D se fusionan con la
+convolución y los kernels 1x1 se guardan como matrices contiguas.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+logger = logging.getLogger(__name__)
+
+# Bytes por elemento de los dtypes de TF.js
+_DTYPE_SIZES = {'float32': 4, 'int32': 4, 'bool': 1, 'uint8': 1, 'uint16': 2, 'float16': 2}
+_NUMPY_DTYPES = {'float32': np.float32, 'int32': np.int32, 'bool': np.bool_,
+                 'uint8': np.uint8, 'uint16': np.uint16, 'float16': np.float16}
+
+_IDENTITY_LAYERS = {'InputLayer', 'Dropout', 'SpatialDropout2D', 'GaussianNoise'}
+
+
+def load_weights(model_json, weights_dir):
+    """
+    Lee los pesos descritos en weightsManifest
+
+    Args:
+        model_json (dict): Contenido de model.json
+        weights_dir (str): Carpeta donde están los archivos .bin
+
+    Returns:
+        dict: Nombre del peso -> np.array float32
+    """
+    weights = {}
+    for group in model_json.get('weightsManifest', []):
+        buffer = b''.join(
+            open(os.path.join(weights_dir, path), 'rb').read() for path in group['paths']
+        )
+        offset = 0
+        for spec in group['weights']:
+            quantization = spec.get('quantization')
+            stored_dtype = quantization['dtype'] if quantization else spec['dtype']
+            count = int(np.prod(spec['shape'])) if spec['shape'] else 1
+            size = count * _DTYPE_SIZES[stored_dtype]
+
+            values = np.frombuffer(buffer, dtype=_NUMPY_DTYPES[stored_dtype],
+                                   count=count, offset=offset)
+            if quantization and stored_dtype in ('uint8', 'uint16'):
+                values = values.astype(np.float32) * quantization['scale'] + quantization['min']
+
+            weights[spec['name']] = values.astype(np.float32).reshape(spec['shape'])
+            offset += size
+
+        if offset != len(buffer):
+            logger.warning(f"weightsManifest describe {offset} bytes pero hay {len(buffer)}")
+
+    return weights
+
+
+def _same_padding(size, kernel, stride):
+    """Relleno (antes, después) equivalente a padding='same' de TensorFlow"""
+    out = -(-size // stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+
+def _activate(x, activation):
+    """Aplica activación en sitio cuando es posible"""
+    if activation in (None, 'linear'):
+        return x
+    if activation == 'relu':
+        return np.maximum(x, 0, out=x)
+    if activation == 'relu6':
+        return np.clip(x, 0, 6, out=x)
+    if activation == 'softmax':
+        x = x - x.max(axis=-1, keepdims=True)
+        np.exp(x, out=x)
+        x /= x.sum(axis=-1, keepdims=True)
+        return x
+    if activation == 'sigmoid':
+        return 1.0 / (1.0 + np.exp(-x))
+    if activation == 'tanh':
+        return np.tanh(x, out=x)
+    raise ValueError(f"Activación no soportada: {activation}")
+
+
+class _Node:
+    """Nodo del grafo aplanado"""
+
+    __slots__ = ('name', 'kind', 'inputs', 'params')
+
+    def __init__(self, name, kind, inputs, params=None):
+        self.name = name
+        self.kind = kind
+        self.inputs = inputs
+        self.params = params or {}
+
+    def __repr__(self):
+        return f"_Node({self.name}, {self.kind})"
+
+
+class TFJSModel:
+    """
+    Modelo TF.js Layers ejecutado con NumPy
+
+    Las imágenes de entrada se esperan en [0, 1] (salida de ImageProcessor) y
+    se escalan a [-1, 1], que es la normalización de Teachable Machine.
+    """
+
+    def __init__(self, model_json, weights, input_scale=2.0, input_offset=-1.0, optimize=True):
+        """
+        Construye el modelo a partir de la topología y los pesos
+
+        Args:
+            model_json (dict): Contenido de model.json
+            weights (dict): Pesos por nombre (ver load_weights)
+            input_scale (float): Escala aplicada a la entrada
+            input_offset (float): Desplazamiento aplicado tras la escala
+            optimize (bool): Si plegar BatchNorm y fusionar activaciones
+
+        Raises:
+            ValueError: Si la topología contiene capas no soportadas
+        """
+        self.input_scale = input_scale
+        self.input_offset = input_offset
+        self._weights = weights
+        self._nodes = []
+
+        topology = model_json['modelTopology']
+        topology = topology.get('model_config', topology)
+        self.input_shape = self._find_input_shape(topology)
+        self._output = self._flatten(topology, 'input')
+
+        if optimize:
+            self._optimize()
+        for node in self._nodes:
+            self._prepare(node)
+
+        self._split_backbone()
+        self._weights = None
+
+        logger.info(f"TFJSModel construido: {len(self._nodes)} operaciones, "
+                     f"entrada {self.input_shape}, {self.num_classes} clases")
+
+    @classmethod
+    def from_files(cls, model_json_path, weights_dir=None, **kwargs):
+        """
+        Carga un modelo desde model.json y sus archivos de pesos
+
+        Args:
+            model_json_path (str): Ruta a model.json
+            weights_dir (str): Carpeta de los .bin (default: la de model.json)
+
+        Returns:
+            TFJSModel: Modelo listo para inferencia
+        """
+        with open(model_json_path, 'r', encoding='utf-8') as f:
+            model_json = json.load(f)
+        weights_dir = weights_dir or os.path.dirname(os.path.abspath(model_json_path))
+        return cls(model_json, load_weights(model_json, weights_dir), **kwargs)
+
+    # ------------------------------------------------------------------
+    # Construcción del grafo
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _find_input_shape(config):
+        """Busca batch_input_shape en la primera capa"""
+        layers = config['config']['layers'] if isinstance(config['config'], dict) else config['config']
+        first = layers[0]
+        shape = first['config'].get('batch_input_shape')
+        if shape:
+            return tuple(shape[1:])
+        return TFJSModel._find_input_shape(first)
+
+    def _weight(self, layer_name, weight_name):
+        key = f"{layer_name}/{weight_name}"
+        if key not in self._weights:
+            raise ValueError(f"Peso no encontrado: {key}")
+        return self._weights[key]
+
+    def _flatten(self, layer, input_name):
+        """
+        Agrega al grafo las operaciones de una capa (recursivo)
+
+        Returns:
+            str: Nombre del nodo de salida de la capa
+        """
+        class_name = layer['class_name']
+        config = layer['config']
+
+        if class_name == 'Sequential':
+            layers = config['layers'] if isinstance(config, dict) else config
+            current = input_name
+            for sublayer in layers:
+                current = self._flatten(sublayer, current)
+            return current
+
+        if class_name in ('Model', 'Functional'):
+            prefix = config['name']
+            aliases = {}
+            for sublayer in config['layers']:
+                name = sublayer['name']
+                if sublayer['class_name'] == 'InputLayer':
+                    aliases[name] = input_name
+                    continue
+                inbound = [aliases[node[0]] for node in sublayer['inbound_nodes'][0]]
+                inner = dict(sublayer)
+                inner['config'] = dict(sublayer['config'], name=name)
+                aliases[name] = self._flatten_single(inner, inbound, prefix)
+            return aliases[config['output_layers'][0][0]]
+
+        return self._flatten_single(layer, [input_name])
+
+    def _flatten_single(self, layer, inputs, prefix=None):
+        """Agrega al grafo una capa simple"""
+        class_name = layer['class_name']
+        config = layer['config']
+        name = config['name']
+        node_name = f"{prefix}/{name}" if prefix else name
+
+        if class_name in _IDENTITY_LAYERS:
+            return inputs[0]
+
+        if class_name == 'ZeroPadding2D':
+            (top, bottom), (left, right) = config['padding']
+            params = {'pad': ((top, bottom), (left, right))}
+            self._nodes.append(_Node(node_name, 'pad', inputs, params))
+
+        elif class_name in ('Conv2D', 'DepthwiseConv2D'):
+            kind = 'conv' if class_name == 'Conv2D' else 'dwconv'
+            kernel_name = 'kernel' if kind == 'conv' else 'depthwise_kernel'
+            params = {
+                'kernel': self._weight(name, kernel_name),
+                'bias': self._weight(name, 'bias') if config.get('use_bias') else None,
+                'strides': tuple(config.get('strides', (1, 1))),
+                'padding': config.get('padding', 'valid'),
+                'activation': config.get('activation', 'linear'),
+                'pad': ((0, 0), (0, 0))
+            }
+            if tuple(config.get('dilation_rate', (1, 1))) != (1, 1):
+                raise ValueError(f"Dilatación no soportada en {name}")
+            self._nodes.append(_Node(node_name, kind, inputs, params))
+
+        elif class_name == 'BatchNormalization':
+            channels = self._weight(name, 'moving_mean').shape[0]
+            gamma = self._weight(name, 'gamma') if config.get('scale', True) else np.ones(channels, np.float32)
+            beta = self._weight(name, 'beta') if config.get('center', True) else np.zeros(channels, np.float32)
+            scale = gamma / np.sqrt(self._weight(name, 'moving_variance') + config.get('epsilon', 1e-3))
+            shift = beta - self._weight(name, 'moving_mean') * scale
+            params = {'scale': scale.astype(np.float32), 'shift': shift.astype(np.float32)}
+            self._nodes.append(_Node(node_name, 'bn', inputs, params))
+
+        elif class_name in ('ReLU', 'Activation'):
+            if class_name == 'ReLU':
+                max_value = config.get('max_value')
+                activation = 'relu6' if max_value == 6 else 'relu'
+                if max_value not in (None, 6):
+                    raise ValueError(f"ReLU con max_value={max_value} no soportado")
+            else:
+                activation = config['activation']
+            self._nodes.append(_Node(node_name, 'act', inputs, {'activation': activation}))
+
+        elif class_name == 'Add':
+            self._nodes.append(_Node(node_name, 'add', inputs))
+
+        elif class_name == 'GlobalAveragePooling2D':
+            self._nodes.append(_Node(node_name, 'gap', inputs))
+
+        elif class_name == 'Flatten':
+            self._nodes.append(_Node(node_name, 'flatten', inputs))
+
+        elif class_name == 'Dense':
+            params = {
+                'kernel': self._weight(name, 'kernel'),
+                'bias': self._weight(name, 'bias') if config.get('use_bias', True) else None,
+                'activation': config.get('activation', 'linear')
+            }
+            self._nodes.append(_Node(node_name, 'dense', inputs, params))
+
+        else:
+            raise ValueError(f"Capa no soportada: {class_name} ({name})")
+
+        return node_name
+
+    def _consumers(self):
+        counts = {}
+        for node in self._nodes:
+            for name in node.inputs:
+                counts[name] = counts.get(name, 0) + 1
+        counts[self._output] = counts.get(self._output, 0) + 1
+        return counts
+
+    def _optimize(self):
+        """Pliega BatchNorm, fusiona activaciones y relleno en las convoluciones"""
+        by_name = {node.name: node for node in self._nodes}
+        consumers = self._consumers()
+        removed = {}
+
+        def resolve(name):
+            while name in removed:
+                name = removed[name]
+            return name
+
+        for node in self._nodes:
+            node.inputs = [resolve(name) for name in node.inputs]
+            producer = by_name.get(node.inputs[0]) if len(node.inputs) == 1 else None
+            if producer is None or consumers.get(producer.name) != 1:
+                continue
+
+            if node.kind == 'conv' or node.kind == 'dwconv':
+                # ZeroPadding2D seguido de convolución 'valid'
+                if producer.kind == 'pad' and node.params['padding'] == 'valid':
+                    node.params['pad'] = producer.params['pad']
+                    node.inputs = producer.inputs
+                    removed[producer.name] = producer.inputs[0]
+                continue
+
+            if producer.kind not in ('conv', 'dwconv'):
+                continue
+
+            if node.kind == 'bn' and producer.params['activation'] in (None, 'linear'):
+                scale, shift = node.params['scale'], node.params['shift']
+                if producer.kind == 'conv':
+                    producer.params['kernel'] = producer.params['kernel'] * scale
+                else:
+                    producer.params['kernel'] = producer.params['kernel'] * scale[:, None]
+                bias = producer.params['bias']
+                producer.params['bias'] = shift if bias is None else bias * scale + shift
+                removed[node.name] = producer.name
+                consumers[producer.name] = consumers.get(node.name, 0)
+
+            elif node.kind == 'act' and producer.params['activation'] in (None, 'linear'):
+                producer.params['activation'] = node.params['activation']
+                removed[node.name] = producer.name
+                consumers[producer.name] = consumers.get(node.name, 0)
+
+        self._nodes = [node for node in self._nodes if node.name not in removed]
+        self._output = resolve(self._output)
+        for node in self._nodes:
+            node.inputs = [resolve(name) for name in node.inputs]
+
+    @staticmethod
+    def _prepare(node):
+        """
+        Precalcula formas contiguas de los kernels
+
+        En las convoluciones el kernel original se descarta y solo se
+        conserva su forma ('kernel_shape') junto a la matriz o los taps.
+        """
+        params = node.params
+        if node.kind == 'conv':
+            kernel = params.pop('kernel')
+            kh, kw, cin, cout = params['kernel_shape'] = kernel.shape
+            params['matrix'] = np.ascontiguousarray(kernel.reshape(kh * kw * cin, cout),
+                                                    dtype=np.float32)
+        elif node.kind == 'dwconv':
+            kernel = params.pop('kernel')
+            params['kernel_shape'] = kernel.shape
+            params['taps'] = np.ascontiguousarray(kernel[:, :, :, 0], dtype=np.float32)
+        elif node.kind == 'dense':
+            params['kernel'] = np.ascontiguousarray(params['kernel'], dtype=np.float32)
+        if params.get('bias') is not None:
+            params['bias'] = np.ascontiguousarray(params['bias'], dtype=np.float32)
+
+    def _split_backbone(self):
+        """Ubica el GlobalAveragePooling2D que separa backbone y cabeza"""
+        gap_index = next((i for i, node in enumerate(self._nodes) if node.kind == 'gap'), None)
+        if gap_index is None:
+            raise ValueError("El modelo no tiene GlobalAveragePooling2D (backbone no separable)")
+
+        self.feature_map_node = self._nodes[gap_index].inputs[0]
+        self.features_node = self._nodes[gap_index].name
+        self._backbone_nodes = self._nodes[:gap_index]
+        self._head_nodes = self._nodes[gap_index + 1:]
+
+        last_dense = [node for node in self._head_nodes if node.kind == 'dense']
+        self.num_classes = last_dense[-1].params['kernel'].shape[1] if last_dense else 0
+        first_dense = next((node for node in self._head_nodes if node.kind == 'dense'), None)
+        self.feature_dim = first_dense.params['kernel'].shape[0] if first_dense else 0
+        self.backbone_hash = self._hash_backbone()
+
+    def _hash_backbone(self):
+        """
+        Hash SHA-256 de la estructura y pesos del backbone
+
+        No depende de los nombres de las capas, así que dos exportaciones de
+        Teachable Machine con el mismo MobileNet producen el mismo hash.
+        """
+        digest = hashlib.sha256()
+        digest.update(repr((self.input_scale, self.input_offset)).encode('utf-8'))
+        positions = {'input': -1}
+        for index, node in enumerate(self._backbone_nodes):
+            positions[node.name] = index
+            description = (node.kind, [positions.get(name) for name in node.inputs],
+                           node.params.get('strides'), node.params.get('padding'),
+                           node.params.get('pad'), node.params.get('activation'))
+            digest.update(repr(description).encode('utf-8'))
+            for key in ('matrix', 'taps', 'bias', 'scale', 'shift'):
+                value = node.params.get(key)
+                if value is not None:
+                    digest.update(np.ascontiguousarray(value).tobytes())
+        return digest.hexdigest()
+
+    def share_backbone(self, other):
+        """
+        Reutiliza el backbone de otro modelo idéntico y libera el propio
+
+        Después de la llamada ninguna lista de este modelo referencia sus
+        nodos de backbone, así que sus pesos se liberan; solo conserva la
+        cabeza.
+
+        Args:
+            other (TFJSModel): Modelo con el mismo backbone_hash
+
+        Raises:
+            ValueError: Si los backbones no son idénticos
+        """
+        if other.backbone_hash != self.backbone_hash:
+            raise ValueError("Los backbones no son idénticos")
+        self._backbone_nodes = other._backbone_nodes
+        # Los nombres de las capas pueden diferir entre exportaciones
+        self.feature_map_node = other.feature_map_node
+        gap = _Node(self.features_node, 'gap', [self.feature_map_node])
+        self._nodes = list(self._backbone_nodes) + [gap] + list(self._head_nodes)
+
+    def graph(self):
+        """
+        Operaciones del grafo optimizado en orden de ejecución
+
+        Lo usan los convertidores (ver onnx_export.py); los parámetros ya
+        tienen BatchNorm plegado y activaciones fusionadas.
+
+        Returns:
+            tuple: (lista de _Node con kind, inputs y params, nombre del nodo de salida)
+        """
+        gap = _Node(self.features_node, 'gap', [self.feature_map_node])
+        nodes = list(self._backbone_nodes) + [gap] + list(self._head_nodes)
+        return nodes, nodes[-1].name
+
+    # ------------------------------------------------------------------
+    # Operaciones
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _pad_input(x, node, kh, kw):
+        """Aplica el relleno explícito y el de padding='same'"""
+        (top, bottom), (left, right) = node.params['pad']
+        if node.params['padding'] == 'same':
+            sh, sw = node.params['strides']
+            pt, pb = _same_padding(x.shape[1] + top + bottom, kh, sh)
+            pl, pr = _same_padding(x.shape[2] + left + right, kw, sw)
+            top, bottom, left, right = top + pt, bottom + pb, left + pl, right + pr
+        if top or bottom or left or right:
+            x = np.pad(x, ((0, 0), (top, bottom), (left, right), (0, 0)))
+        return x
+
+    @staticmethod
+    def _conv(x, node):
+        params = node.params
+        kh, kw, cin, cout = params['kernel_shape']
+        sh, sw = params['strides']
+
+        if kh == 1 and kw == 1 and params['pad'] == ((0, 0), (0, 0)):
+            if sh > 1 or sw > 1:
+                x = x[:, ::sh, ::sw, :]
+            n, h, w, _ = x.shape
+            out = np.ascontiguousarray(x).reshape(-1, cin) @ params['matrix']
+            out = out.reshape(n, h, w, cout)
+        else:
+            x = np.ascontiguousarray(TFJSModel._pad_input(x, node, kh, kw))
+            n, h, w, _ = x.shape
+            oh = (h - kh) // sh + 1
+            ow = (w - kw) // sw + 1
+            s0, s1, s2, s3 = x.strides
+            patches = as_strided(x, shape=(n, oh, ow, kh, kw, cin),
+                                 strides=(s0, s1 * sh, s2 * sw, s1, s2, s3), writeable=False)
+            out = patches.reshape(n * oh * ow, kh * kw * cin) @ params['matrix']
+            out = out.reshape(n, oh, ow, cout)
+
+        if params['bias'] is not None:
+            out += params['bias']
+        return _activate(out, params['activation'])
+
+    @staticmethod
+    def _dwconv(x, node):
+        params = node.params
+        taps = params['taps']
+        kh, kw, _ = taps.shape
+        sh, sw = params['strides']
+
+        x = TFJSModel._pad_input(x, node, kh, kw)
+        n, h, w, c = x.shape
+        oh = (h - kh) // sh + 1
+        ow = (w - kw) // sw + 1
+
+        out = np.zeros((n, oh, ow, c), dtype=np.float32)
+        scratch = np.empty_like(out)
+        for i in range(kh):
+            for j in range(kw):
+                window = x[:, i:i + sh * (oh - 1) + 1:sh, j:j + sw * (ow - 1) + 1:sw, :]
+                np.multiply(window, taps[i, j], out=scratch)
+                out += scratch
+
+        if params['bias'] is not None:
+            out += params['bias']
+        return _activate(out, params['activation'])
+
+    def _execute(self, nodes, values):
+        """Ejecuta una lista de nodos liberando intermedios ya consumidos"""
+        remaining = {}
+        for node in nodes:
+            for name in node.inputs:
+                remaining[name] = remaining.get(name, 0) + 1
+
+        last = None
+        for node in nodes:
+            args = [values[name] for name in node.inputs]
+            kind = node.kind
+
+            if kind == 'conv':
+                result = self._conv(args[0], node)
+            elif kind == 'dwconv':
+                result = self._dwconv(args[0], node)
+            elif kind == 'bn':
+                result = args[0] * node.params['scale'] + node.params['shift']
+            elif kind == 'act':
+                result = _activate(args[0].copy(), node.params['activation'])
+            elif kind == 'add':
+                result = args[0] + args[1]
+                for extra in args[2:]:
+                    result += extra
+            elif kind == 'pad':
+                result = np.pad(args[0], ((0, 0),) + node.params['pad'] + ((0, 0),))
+            elif kind == 'gap':
+                result = args[0].mean(axis=(1, 2), dtype=np.float32)
+            elif kind == 'flatten':
+                result = args[0].reshape(args[0].shape[0], -1)
+            elif kind == 'dense':
+                result = args[0] @ node.params['kernel']
+                if node.params['bias'] is not None:
+                    result += node.params['bias']
+                result = _activate(result, node.params['activation'])
+            else:
+                raise ValueError(f"Operación desconocida: {kind}")
+
+            values[node.name] = result
+            last = node.name
+            for name in node.inputs:
+                remaining[name] -= 1
+                if remaining[name] == 0:
+                    values.pop(name, None)
+
+        return values[last] if last else None
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def _prepare_input(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        if images.ndim != 4 or images.shape[-1] != self.input_shape[-1]:
+            raise ValueError(f"Forma de entrada inválida: {images.shape}")
+        return images * np.float32(self.input_scale) + np.float32(self.input_offset)
+
+    def extract_feature_map(self, images):
+        """
+        Ejecuta el backbone convolucional sin el pooling final
+
+        Args:
+            images (np.array): Lote (N, H, W, 3) en [0, 1]; H y W pueden
+                               diferir del tamaño de entrenamiento
+
+        Returns:
+            np.array: Mapa de características (N, H/32, W/32, C)
+        """
+        return self._execute(self._backbone_nodes, {'input': self._prepare_input(images)})
+
+    def extract_features(self, images):
+        """
+        Ejecuta el backbone hasta GlobalAveragePooling2D
+
+        Args:
+            images (np.array): Lote (N, H, W, 3) en [0, 1]
+
+        Returns:
+            np.array: Embeddings (N, C)
+        """
+        return self.extract_feature_map(images).mean(axis=(1, 2), dtype=np.float32)
+
+    def classify_features(self, features):
+        """
+        Aplica la cabeza Dense a embeddings ya calculados
+
+        Args:
+            features (np.array): Embeddings (N, C)
+
+        Returns:
+            np.array: Probabilidades (N, num_classes)
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features[None]
+        return self._execute(self._head_nodes, {self.features_node: features})
+
+    def predict(self, images):
+        """
+        Predicción completa
+
+        Args:
+            images (np.array): Lote (N, H, W, 3) o imagen (H, W, 3) en [0, 1]
+
+        Returns:
+            np.array: Probabilidades (N, num_classes)
+        """
+        return self.classify_features(self.extract_features(images))
+
+    def __repr__(self):
+        return (f"TFJSModel(input={self.input_shape}, ops={len(self._nodes)}, "
+                f"classes={self.num_classes})")
@@ -0,0 +1,177 @@
+"""
+Upload Reader - Decodificación de cargas sin copias intermedias
+
+Werkzeug guarda cada archivo subido en un SpooledTemporaryFile: en memoria
+(BytesIO) hasta 500 KB y en un archivo temporal por encima. Leerlo con
+file.read() crea una copia completa en un objeto bytes antes de decodificar.
+Este módulo expone el contenido como un array de NumPy que apunta al mismo
+buffer (getbuffer del BytesIO o mmap del archivo temporal), revisa las
+dimensiones declaradas en el encabezado antes de decodificar y mide la
+memoria residente del proceso.
+"""
+
+import io
+import logging
+import mmap
+import sys
+from contextlib import contextmanager
+from tempfile import SpooledTemporaryFile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTooLarge(ValueError):
+    """La imagen declara más píxeles que el presupuesto permitido"""
+
+    def __init__(self, width, height, max_pixels):
+        if width is None:
+            message = f"La imagen excede el máximo de {max_pixels:,} píxeles"
+        else:
+            message = f"La imagen declara {width}x{height} píxeles (máximo {max_pixels:,})"
+        super().__init__(message)
+        self.width = width
+        self.height = height
+        self.max_pixels = max_pixels
+
+
+def _raw_stream(stream):
+    """Archivo real detrás de un SpooledTemporaryFile (sin forzar rollover)"""
+    if isinstance(stream, SpooledTemporaryFile):
+        return stream._file
+    return stream
+
+
+@contextmanager
+def upload_buffer(stream):
+    """
+    Contenido completo de un archivo subido como array uint8 sin copiarlo
+
+    El array solo es válido dentro del bloque with: no debe guardarse.
+
+    Args:
+        stream: Stream de la carga (FileStorage.stream)
+
+    Yields:
+        np.array: Vista uint8 (1D) sobre el contenido
+    """
+    raw = _raw_stream(stream)
+    view = None
+    mapped = None
+    try:
+        if isinstance(raw, io.BytesIO):
+            view = raw.getbuffer()
+        else:
+            try:
+                raw.flush()
+                mapped = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(mapped)
+            except (AttributeError, OSError, ValueError):
+                # Stream sin descriptor (o vacío): no queda más que leerlo
+                stream.seek(0)
+                view = memoryview(stream.read())
+        yield np.frombuffer(view, np.uint8)
+    finally:
+        if view is not None:
+            try:
+                view.release()
+            except BufferError:
+                logger.debug("Vista de la carga aún referenciada; se libera con el GC")
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                pass
+        stream.seek(0)
+
+
+def read_image_size(stream):
+    """
+    Dimensiones declaradas en el encabezado, sin decodificar los píxeles
+
+    Args:
+        stream: Stream posicionable con la imagen
+
+    Returns:
+        tuple: (ancho, alto) o None si Pillow no reconoce el formato
+
+    Raises:
+        Image.DecompressionBombError: Si supera el límite propio de Pillow
+    """
+    stream.seek(0)
+    try:
+        with Image.open(stream) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+    finally:
+        stream.seek(0)
+
+
+def decode_upload(stream, max_pixels=None, flags=cv2.IMREAD_COLOR):
+    """
+    Decodifica una imagen subida directamente desde su buffer
+
+    Args:
+        stream: Stream de la carga (FileStorage.stream)
+        max_pixels (int): Presupuesto de ancho x alto (None = sin límite)
+        flags (int): Flags de cv2.imdecode
+
+    Returns:
+        np.array: Imagen decodificada, o None si no se pudo decodificar
+
+    Raises:
+        ImageTooLarge: Si el encabezado declara más píxeles que max_pixels
+    """
+    if max_pixels:
+        try:
+            size = read_image_size(stream)
+        except Image.DecompressionBombError:
+            raise ImageTooLarge(None, None, max_pixels)
+        if size is not None and size[0] * size[1] > max_pixels:
+            raise ImageTooLarge(size[0], size[1], max_pixels)
+
+    with upload_buffer(stream) as buffer:
+        image = cv2.imdecode(buffer, flags) if buffer.size else None
+        # Soltar la vista antes de cerrar el buffer/mmap
+        del buffer
+    return image
+
+
+def current_rss_kb():
+    """
+    Memoria residente actual del proceso en KB
+
+    Returns:
+        int: RSS actual, o None si /proc no está disponible (no Linux)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * mmap.PAGESIZE // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_kb():
+    """
+    Pico de memoria residente en toda la vida del proceso en KB (ru_maxrss)
+
+    No sirve para medir una petición: solo crece. Returns None sin el
+    módulo resource.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta bytes, Linux KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
@@ -0,0 +1,341 @@
+"""
+Work Queue - Cola de trabajo con arrendamientos sobre SQLite
+
+Reparte una clasificación masiva entre procesos de varias máquinas sin
+servicios externos: la cola es un archivo SQLite en almacenamiento
+compartido. Los archivos se agrupan en bloques (chunks); cada worker toma un
+bloque en arriendo (lease) por un tiempo limitado, lo renueva mientras
+trabaja y entrega sus resultados. Si un worker muere, su arriendo vence y
+otro worker retoma el bloque.
+
+El archivo usa el journal clásico de SQLite (no WAL), que es el que funciona
+sobre sistemas de archivos de red con bloqueo POSIX (NFS, SMB).
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    chunk_id INTEGER NOT NULL REFERENCES chunks(id),
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT,
+    error TEXT,
+    worker TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_chunk ON tasks(chunk_id);
+CREATE INDEX IF NOT EXISTS chunks_status ON chunks(status, lease_expires);
+"""
+
+
+def default_worker_id():
+    """Identificador único del worker: máquina, proceso y sufijo aleatorio"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """
+    Cola de bloques de archivos con arrendamiento
+    """
+
+    def __init__(self, path, lease_seconds=120, max_attempts=3, timeout=60.0):
+        """
+        Abre (o crea) la cola
+
+        Args:
+            path (str): Archivo SQLite en almacenamiento compartido
+            lease_seconds (float): Duración de un arriendo sin renovar
+            max_attempts (int): Arriendos de un bloque antes de marcarlo fallido
+            timeout (float): Segundos de espera si otro proceso tiene el bloqueo
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        # executescript confirma por su cuenta: va fuera de _transaction
+        db = sqlite3.connect(path, timeout=timeout)
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Conexión de corta duración con una transacción de escritura
+
+        Cada operación abre su propia conexión: sirve desde cualquier hilo
+        (p. ej. el de renovación de arriendos) y no retiene bloqueos.
+        """
+        db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def set_meta(self, key, value):
+        """Guarda un valor JSON de configuración de la cola (p. ej. la carpeta raíz)"""
+        with self._transaction() as db:
+            db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                       (key, json.dumps(value)))
+
+    def get_meta(self, key, default=None):
+        """Lee un valor guardado con set_meta"""
+        with self._transaction() as db:
+            row = db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def enqueue(self, paths, chunk_size=64):
+        """
+        Agrega archivos a la cola en bloques nuevos
+
+        Los archivos ya encolados se omiten, así que enumerar de nuevo la
+        misma carpeta solo agrega los archivos nuevos.
+
+        Args:
+            paths (iterable): Rutas de los archivos
+            chunk_size (int): Archivos por bloque
+
+        Returns:
+            int: Archivos agregados
+        """
+        added = 0
+        now = time.time()
+        with self._transaction() as db:
+            existing = {row[0] for row in db.execute('SELECT path FROM tasks')}
+            batch = []
+            for path in paths:
+                if path in existing:
+                    continue
+                existing.add(path)
+                batch.append(path)
+                if len(batch) == chunk_size:
+                    added += self._insert_chunk(db, batch, now)
+                    batch = []
+            if batch:
+                added += self._insert_chunk(db, batch, now)
+        logger.info(f"{added} archivos encolados")
+        return added
+
+    def _insert_chunk(self, db, paths, now):
+        chunk_id = db.execute('INSERT INTO chunks (status, updated_at) VALUES (?, ?)',
+                              ('pending', now)).lastrowid
+        db.executemany('INSERT INTO tasks (path, chunk_id, updated_at) VALUES (?, ?, ?)',
+                       [(path, chunk_id, now) for path in paths])
+        return len(paths)
+
+    def lease(self, worker_id):
+        """
+        Toma en arriendo el siguiente bloque disponible
+
+        Disponible es un bloque pendiente o uno cuyo arriendo venció (su
+        worker murió o dejó de renovar). Un bloque arrendado max_attempts
+        veces sin completarse se marca como fallido.
+
+        Args:
+            worker_id (str): Identificador del worker
+
+        Returns:
+            tuple: (id del bloque, [(id de tarea, ruta)]) o None si no hay trabajo
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("""
+                UPDATE chunks SET status = 'failed', lease_owner = NULL, updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+            """, (now, now, self.max_attempts))
+
+            row = db.execute("""
+                SELECT id, status, lease_owner FROM chunks
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY id LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                return None
+
+            chunk_id, status, previous_owner = row
+            if status == 'leased':
+                logger.warning(f"Arriendo vencido del bloque {chunk_id} ({previous_owner}); "
+                               f"se reasigna a {worker_id}")
+            db.execute("""
+                UPDATE chunks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                  attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            """, (worker_id, now + self.lease_seconds, now, chunk_id))
+            tasks = db.execute("""
+                SELECT id, path FROM tasks WHERE chunk_id = ? AND status = 'pending' ORDER BY id
+            """, (chunk_id,)).fetchall()
+        return chunk_id, tasks
+
+    def renew(self, chunk_id, worker_id):
+        """
+        Extiende el arriendo de un bloque
+
+        Returns:
+            bool: False si el arriendo ya no pertenece al worker
+        """
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute("""
+                UPDATE chunks SET lease_expires = ?, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (now + self.lease_seconds, now, chunk_id, worker_id)).rowcount
+        return updated == 1
+
+    def complete(self, chunk_id, worker_id, results):
+        """
+        Entrega los resultados de un bloque
+
+        Si el arriendo venció y otro worker tomó el bloque, los resultados se
+        descartan: el nuevo dueño los producirá.
+
+        Args:
+            chunk_id (int): Bloque arrendado
+            worker_id (str): Identificador del worker
+            results (list): Tuplas (id de tarea, resultado dict o None, error o None)
+
+        Returns:
+            bool: True si los resultados se guardaron
+        """
+        now = time.time()
+        with self._transaction() as db:
+            owned = db.execute("""
+                SELECT 1 FROM chunks WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (chunk_id, worker_id)).fetchone()
+            if owned is None:
+                logger.warning(f"El bloque {chunk_id} ya no pertenece a {worker_id}; "
+                               f"resultados descartados")
+                return False
+
+            db.executemany("""
+                UPDATE tasks SET status = ?, result = ?, error = ?, worker = ?, updated_at = ?
+                WHERE id = ? AND chunk_id = ?
+            """, [('done' if error is None else 'failed',
+                   json.dumps(result, ensure_ascii=False) if result is not None else None,
+                   error, worker_id, now, task_id, chunk_id)
+                  for task_id, result, error in results])
+            db.execute("""
+                UPDATE chunks SET status = 'done', lease_owner = NULL, lease_expires = NULL,
+                                  updated_at = ?
+                WHERE id = ?
+            """, (now, chunk_id))
+        return True
+
+    def release(self, chunk_id, worker_id):
+        """Devuelve un bloque a la cola sin resultados (p. ej. al interrumpir un worker)"""
+        with self._transaction() as db:
+            db.execute("""
+                UPDATE chunks SET status = 'pending', lease_owner = NULL, lease_expires = NULL,
+                                  attempts = MAX(attempts - 1, 0), updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+            """, (time.time(), chunk_id, worker_id))
+
+    def retry_failed(self):
+        """
+        Vuelve a encolar los bloques fallidos y los que contienen tareas fallidas
+
+        Returns:
+            int: Bloques re-encolados
+        """
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("""
+                UPDATE chunks SET status = 'pending', attempts = 0, updated_at = ?
+                WHERE status = 'failed'
+                   OR id IN (SELECT DISTINCT chunk_id FROM tasks WHERE status = 'failed')
+            """, (now,))
+            count = db.execute('SELECT changes()').fetchone()[0]
+            db.execute("""
+                UPDATE tasks SET status = 'pending', error = NULL, updated_at = ?
+                WHERE status = 'failed'
+            """, (now,))
+        return count
+
+    def status(self):
+        """
+        Estado de la cola
+
+        Returns:
+            dict: Tareas y bloques por estado, arriendos vencidos y workers activos
+        """
+        now = time.time()
+        with self._transaction() as db:
+            tasks = dict(db.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status'))
+            chunks = dict(db.execute('SELECT status, COUNT(*) FROM chunks GROUP BY status'))
+            expired = db.execute("""
+                SELECT COUNT(*) FROM chunks WHERE status = 'leased' AND lease_expires < ?
+            """, (now,)).fetchone()[0]
+            workers = [row[0] for row in db.execute("""
+                SELECT DISTINCT lease_owner FROM chunks
+                WHERE status = 'leased' AND lease_expires >= ?
+            """, (now,))]
+        return {
+            'tasks': tasks,
+            'chunks': chunks,
+            'total_tasks': sum(tasks.values()),
+            'expired_leases': expired,
+            'active_workers': workers
+        }
+
+    def has_work(self):
+        """True si quedan bloques pendientes o arrendados"""
+        chunks = self.status()['chunks']
+        return chunks.get('pending', 0) + chunks.get('leased', 0) > 0
+
+    def iter_results(self, batch_size=1000):
+        """
+        Recorre los resultados de las tareas terminadas o fallidas
+
+        Yields:
+            dict: {'path', 'status', 'result', 'error', 'worker'}
+        """
+        last_id = 0
+        while True:
+            with self._transaction() as db:
+                rows = db.execute("""
+                    SELECT id, path, status, result, error, worker FROM tasks
+                    WHERE id > ? AND status IN ('done', 'failed') ORDER BY id LIMIT ?
+                """, (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for task_id, path, status, result, error, worker in rows:
+                yield {
+                    'path': path,
+                    'status': status,
+                    'result': json.loads(result) if result else None,
+                    'error': error,
+                    'worker': worker
+                }
+            last_id = rows[-1][0]
+
+    def __repr__(self):
+        return f"WorkQueue(path={self.path!r}, lease_seconds={self.lease_seconds})"